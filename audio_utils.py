@@ -1,10 +1,18 @@
+import asyncio
 import os
 import subprocess
 import json
 import sys
 import re
+import shutil
+import signal
 import urllib.request
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from cpu_allocation import CpuAllotment
+from logger import app_logger
+from process_stats import ProcessStats, monitor_process
+from profiler import span as profile_span
 
 
 def sanitize_filename(filename: str) -> str:
@@ -49,37 +57,134 @@ def sanitize_filename(filename: str) -> str:
     return filename
 
 
-def get_audio_duration(filepath: str) -> Optional[float]:
+async def _read_stream(stream: asyncio.StreamReader, chunks: List[bytes],
+                       on_line: Optional[Callable[[str], None]]) -> None:
+    """Collect a child's output and hand every complete line to on_line as it arrives."""
+    pending = b""
+    while True:
+        data = await stream.read(4096)
+        if not data:
+            break
+        chunks.append(data)
+        if on_line:
+            # Progress meters redraw with \r, so treat it as a line break too
+            *lines, pending = re.split(rb"[\r\n]", pending + data)
+            for line in lines:
+                if line:
+                    on_line(line.decode("utf-8", errors="replace"))
+    if on_line and pending:
+        on_line(pending.decode("utf-8", errors="replace"))
+
+
+def _command_name(cmd: List[str]) -> str:
+    """Short tool name of a command; `python -m module` is named after the module."""
+    if len(cmd) > 2 and cmd[1] == "-m":
+        return cmd[2]
+    return os.path.basename(cmd[0])
+
+
+async def run_command(cmd: List[str], timeout: Optional[float] = None, env: Optional[dict] = None,
+                      preexec_fn: Optional[Callable[[], None]] = None,
+                      on_stdout_line: Optional[Callable[[str], None]] = None,
+                      on_stderr_line: Optional[Callable[[str], None]] = None,
+                      stdin_fd: Optional[int] = None, stdout_fd: Optional[int] = None,
+                      stats: Optional[ProcessStats] = None) -> Tuple[int, str, str]:
+    """
+    Run a command as an asyncio subprocess, streaming its stdout/stderr.
+    stdin_fd/stdout_fd connect the child to a pipe (e.g. from os.pipe()) instead;
+    they are handed over to the child and closed here once it has started.
+    stats, if given, is sampled with the child's CPU and memory while it runs.
+    The child is killed if the timeout expires or the awaiting task is cancelled.
+    Returns: (returncode, stdout, stderr)
+    """
+    with profile_span(f"proc:{_command_name(cmd)}") as proc_span:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=subprocess.DEVNULL if stdin_fd is None else stdin_fd,
+                stdout=subprocess.PIPE if stdout_fd is None else stdout_fd,
+                stderr=subprocess.PIPE, env=env, preexec_fn=preexec_fn
+            )
+        finally:
+            # The child holds its own copies; ours would keep the pipe from reaching EOF
+            for fd in (stdin_fd, stdout_fd):
+                if fd is not None:
+                    os.close(fd)
+        # Only profiled tasks and callers that asked for stats pay for sampling the child's CPU and memory
+        sampled = stats is not None or proc_span is not None
+        stats = stats if stats is not None else ProcessStats()
+        monitor = asyncio.ensure_future(monitor_process(process.pid, stats)) if sampled else None
+        stdout_chunks: List[bytes] = []
+        stderr_chunks: List[bytes] = []
+        try:
+            readers = [_read_stream(process.stderr, stderr_chunks, on_stderr_line)]
+            if process.stdout:
+                readers.append(_read_stream(process.stdout, stdout_chunks, on_stdout_line))
+            await asyncio.wait_for(asyncio.gather(*readers, process.wait()), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        finally:
+            if monitor:
+                monitor.cancel()
+            if proc_span:
+                proc_span.attrs.update(stats.to_dict())
+                proc_span.attrs["returncode"] = process.returncode
+
+    stdout = b"".join(stdout_chunks).decode("utf-8", errors="replace")
+    stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+    return process.returncode, stdout, stderr
+
+
+async def get_audio_duration(filepath: str) -> Optional[float]:
     """Get audio duration in seconds using ffprobe."""
+    duration, _ = await get_audio_info(filepath)
+    return duration
+
+
+async def get_audio_info(filepath: str) -> Tuple[Optional[float], Optional[int]]:
+    """
+    Probe a file's duration and the channel count of its first audio stream with ffprobe.
+    Returns: (duration_seconds, channels), None for whatever could not be read
+    """
     try:
         cmd = [
-            "ffprobe", "-v", "error", 
-            "-show_entries", "format=duration", 
-            "-of", "default=noprint_wrappers=1:nokey=1", 
-            filepath
+            "ffprobe", "-v", "error", "-select_streams", "a:0",
+            "-show_entries", "format=duration:stream=channels",
+            "-of", "json", filepath
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
+        returncode, stdout, stderr = await run_command(cmd)
+        if returncode != 0:
+            app_logger.error("Error getting duration for %s: %s", filepath, stderr.strip())
+            return None, None
+        info = json.loads(stdout)
+        streams = info.get("streams") or [{}]
+        channels = streams[0].get("channels")
+        return float(info["format"]["duration"]), int(channels) if channels else None
     except FileNotFoundError:
-        print("Error: ffprobe command not found. Please ensure ffmpeg is installed and in your PATH.")
-        return None
-    except subprocess.CalledProcessError as e:
-        print(f"Error getting duration for {filepath}: {e.stderr}")
-        return None
-    except ValueError:
-        print(f"Could not parse duration for {filepath}")
-        return None
+        app_logger.error("ffprobe command not found. Please ensure ffmpeg is installed and in your PATH.")
+        return None, None
+    except (ValueError, KeyError, TypeError):
+        app_logger.error("Could not parse duration for %s", filepath)
+        return None, None
+
+
+def extract_youtube_video_id(url: str) -> Optional[str]:
+    """Extract the video ID from a youtu.be or watch?v= YouTube URL."""
+    if 'youtu.be/' in url:
+        return url.split('youtu.be/')[-1].split('?')[0]
+    elif 'watch?v=' in url:
+        return url.split('watch?v=')[-1].split('&')[0]
+    return None
 
 
 def get_youtube_title_from_web(url: str) -> Optional[str]:
     """Extract YouTube title by parsing the webpage HTML."""
     try:
         # Clean URL to standard format
-        video_id = None
-        if 'youtu.be/' in url:
-            video_id = url.split('youtu.be/')[-1].split('?')[0]
-        elif 'watch?v=' in url:
-            video_id = url.split('watch?v=')[-1].split('&')[0]
+        video_id = extract_youtube_video_id(url)
         
         if not video_id:
             return None
@@ -99,11 +204,11 @@ def get_youtube_title_from_web(url: str) -> Optional[str]:
                 title = data.get('title')
                 
                 if title and len(title) > 3:
-                    print(f"Got title from oEmbed: {title}")
+                    app_logger.info("Got title from oEmbed: %s", title)
                     return title
                     
         except Exception as e:
-            print(f"oEmbed failed: {e}")
+            app_logger.warning("oEmbed failed: %s", e)
         
         # HTML fallback
         try:
@@ -127,15 +232,15 @@ def get_youtube_title_from_web(url: str) -> Optional[str]:
         return None
         
     except Exception as e:
-        print(f"Failed to extract title from web: {e}")
+        app_logger.warning("Failed to extract title from web: %s", e)
         return None
 
 
-def get_youtube_video_info(url: str) -> Tuple[Optional[dict], Optional[str]]:
+async def get_youtube_video_info(url: str) -> Tuple[Optional[dict], Optional[str]]:
     """Get YouTube video information and return (info_dict, error_message)."""
     try:
-        # First try to get title from web (most reliable)
-        web_title = get_youtube_title_from_web(url)
+        # First try to get title from web (most reliable); urllib blocks, so keep it off the loop
+        web_title = await asyncio.get_running_loop().run_in_executor(None, get_youtube_title_from_web, url)
         
         # Try yt-dlp for duration and other metadata
         possible_commands = [
@@ -146,8 +251,10 @@ def get_youtube_video_info(url: str) -> Tuple[Optional[dict], Optional[str]]:
         
         for cmd in possible_commands:
             try:
-                proc_info = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=30)
-                video_info = json.loads(proc_info.stdout)
+                returncode, stdout, stderr = await run_command(cmd, timeout=30)
+                if returncode != 0:
+                    continue
+                video_info = json.loads(stdout)
                 
                 # Use web title if available, otherwise use yt-dlp title
                 if web_title:
@@ -155,7 +262,7 @@ def get_youtube_video_info(url: str) -> Tuple[Optional[dict], Optional[str]]:
                     
                 return video_info, None
                 
-            except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+            except (FileNotFoundError, asyncio.TimeoutError, json.JSONDecodeError):
                 continue
         
         # If yt-dlp failed but we have web title, create minimal info dict
@@ -173,24 +280,35 @@ def get_youtube_video_info(url: str) -> Tuple[Optional[dict], Optional[str]]:
         return None, f"YouTube URL 처리 중 오류: {e}"
 
 
-def download_youtube_audio(url: str, output_path: str) -> Optional[str]:
+YTDLP_PROGRESS_PATTERN = re.compile(r"\[download\]\s+([\d.]+)%")
+
+
+async def download_youtube_audio(url: str, output_path: str,
+                                 on_progress: Optional[Callable[[float], None]] = None) -> Optional[str]:
     """Download audio from YouTube URL and return error message if failed."""
     try:
         possible_commands = [
-            ["yt-dlp", "-x", "--audio-format", "mp3", "-o", output_path, url],
-            ["python", "-m", "yt_dlp", "-x", "--audio-format", "mp3", "-o", output_path, url],
-            [sys.executable, "-m", "yt_dlp", "-x", "--audio-format", "mp3", "-o", output_path, url]
+            ["yt-dlp", "--newline", "-x", "--audio-format", "mp3", "-o", output_path, url],
+            ["python", "-m", "yt_dlp", "--newline", "-x", "--audio-format", "mp3", "-o", output_path, url],
+            [sys.executable, "-m", "yt_dlp", "--newline", "-x", "--audio-format", "mp3", "-o", output_path, url]
         ]
         
+        def on_line(line: str) -> None:
+            match = YTDLP_PROGRESS_PATTERN.search(line)
+            if match and on_progress:
+                on_progress(min(float(match.group(1)) / 100, 1.0))
+        
         last_error = None
         
         for cmd in possible_commands:
             try:
-                subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=120)
-                return None
+                returncode, stdout, stderr = await run_command(cmd, timeout=120, on_stdout_line=on_line)
+                if returncode == 0:
+                    return None
+                last_error = stderr.strip() or f"exit code {returncode}"
                 
-            except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as e:
-                last_error = str(e)
+            except (FileNotFoundError, asyncio.TimeoutError) as e:
+                last_error = str(e) or type(e).__name__
                 continue
         
         return f"YouTube 오디오 다운로드 실패: {last_error}"
@@ -199,32 +317,207 @@ def download_youtube_audio(url: str, output_path: str) -> Optional[str]:
         return f"YouTube 다운로드 중 예상치 못한 오류: {e}"
 
 
-def separate_audio_with_spleeter(input_path: str, output_dir: str, model: str = "spleeter:2stems") -> Optional[str]:
-    """Separate audio using Spleeter and return error message if failed."""
+SILENCE_REPORT_PATTERN = re.compile(r"^silence (\{.*\})$")
+
+
+def parse_silence_report(line: str) -> Optional[Dict[str, Any]]:
+    """Parse the `silence {json}` summary line printed by inference_backend."""
+    match = SILENCE_REPORT_PATTERN.match(line.strip())
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+async def separate_audio_with_spleeter(input_path: str, output_dir: str, model: str = "spleeter:2stems",
+                                       cpu_allotment: Optional[CpuAllotment] = None,
+                                       backend: str = "spleeter", model_dir: Optional[str] = None,
+                                       silence_threshold_db: Optional[float] = None,
+                                       on_silence_report: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                       process_stats: Optional[ProcessStats] = None,
+                                       downmix: bool = False) -> Optional[str]:
+    """
+    Separate audio using Spleeter and return error message if failed.
+    backend "frozen" or "int8" runs the optimized export in model_dir instead of the stock checkpoint.
+    silence_threshold_db skips regions quieter than it and downmix separates a
+    mono mix into mono stems; the Spleeter CLI can do neither, so the stock
+    checkpoint then runs in-process through inference_backend too.
+    on_silence_report receives how much audio was skipped.
+    process_stats is sampled with the separator's CPU time and RSS while it runs.
+    """
     try:
         # Use `sys.executable` to ensure we're using the python from the current venv
-        cmd = [
-            sys.executable, "-m", "spleeter", "separate", 
-            "-o", output_dir, 
-            "-p", model, input_path
-        ]
-        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        if backend != "spleeter" or silence_threshold_db is not None or downmix:
+            cmd = [
+                sys.executable, "-m", "inference_backend", "separate",
+                "--backend", backend, "--model", model, "-o", output_dir
+            ]
+            if model_dir:
+                cmd += ["--model-dir", model_dir]
+            if silence_threshold_db is not None:
+                cmd += ["--silence-threshold-db", str(silence_threshold_db)]
+            if downmix:
+                cmd.append("--downmix")
+            cmd.append(input_path)
+        else:
+            cmd = [
+                sys.executable, "-m", "spleeter", "separate", 
+                "-o", output_dir, 
+                "-p", model, input_path
+            ]
+        if cpu_allotment:
+            # Cap TensorFlow thread pools to this worker slot's share of the cores
+            returncode, stdout, stderr = await run_command(
+                cmd, env=cpu_allotment.thread_env(), preexec_fn=cpu_allotment.preexec_fn(), stats=process_stats
+            )
+        else:
+            returncode, stdout, stderr = await run_command(cmd, stats=process_stats)
+        if returncode != 0:
+            return f"오디오 분리 중 오류: {stderr.strip() or f'exit code {returncode}'}"
+        if on_silence_report:
+            for line in stdout.splitlines():
+                report = parse_silence_report(line)
+                if report:
+                    on_silence_report(report)
         return None
     except FileNotFoundError:
         return "spleeter 실행 파일을 찾을 수 없습니다. 가상 환경에 spleeter가 올바르게 설치되었는지 확인하세요."
-    except subprocess.CalledProcessError as e:
-        return f"오디오 분리 중 오류: {e.stderr.strip() if e.stderr else e}"
 
 
-def convert_wav_to_mp3(wav_path: str, mp3_path: str) -> Optional[str]:
-    """Convert WAV file to MP3 and return error message if failed."""
+YTDLP_TOO_LARGE_PATTERN = re.compile(r"larger than max-filesize|File is larger than", re.IGNORECASE)
+SEPARATION_PROGRESS_PATTERN = re.compile(r"^progress ([\d.]+)$")
+BROKEN_PIPE_PATTERN = re.compile(r"Broken pipe|EPIPE|Errno 32", re.IGNORECASE)
+
+
+def is_broken_pipe(returncode: int, stderr: str) -> bool:
+    """Whether a pipeline stage died because the stage reading its output went away."""
+    return returncode in (-signal.SIGPIPE, 128 + signal.SIGPIPE) or bool(BROKEN_PIPE_PATTERN.search(stderr))
+
+
+async def stream_youtube_separation(url: str, original_path: str, result_dir: str, model: str = "spleeter:2stems",
+                                    cpu_allotment: Optional[CpuAllotment] = None,
+                                    backend: str = "spleeter", model_dir: Optional[str] = None,
+                                    max_size_mb: Optional[int] = None,
+                                    on_download_progress: Optional[Callable[[float], None]] = None,
+                                    on_separation_progress: Optional[Callable[[float], None]] = None,
+                                    silence_threshold_db: Optional[float] = None,
+                                    on_silence_report: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                    process_stats: Optional[ProcessStats] = None,
+                                    downmix: bool = False) -> Optional[str]:
+    """
+    Download, decode and separate a YouTube video's audio as one pipeline:
+    yt-dlp streams the audio to ffmpeg, which saves an MP3 copy to original_path
+    and feeds PCM to `inference_backend stream`, which separates it window by
+    window into result_dir/<instrument>.wav while the download is still running.
+    on_separation_progress receives the seconds of audio separated so far and
+    on_silence_report, at the end, how much of it was skipped as silence.
+    process_stats is sampled with the separator's CPU time and RSS while it runs.
+    Returns: error message if failed
+    """
+    ytdlp = ["yt-dlp"] if shutil.which("yt-dlp") else [sys.executable, "-m", "yt_dlp"]
+    download_cmd = ytdlp + ["--newline", "-f", "bestaudio/best", "-o", "-", url]
+    if max_size_mb:
+        download_cmd[-2:-2] = ["--max-filesize", f"{max_size_mb}M"]
+    decode_cmd = [
+        "ffmpeg", "-v", "error", "-i", "pipe:0",
+        "-map", "0:a:0", "-f", "f32le", "-ac", "2", "-ar", "44100", "pipe:1",
+        "-map", "0:a:0", "-c:a", "libmp3lame", "-q:a", "2", "-y", original_path
+    ]
+    separate_cmd = [
+        sys.executable, "-m", "inference_backend", "stream",
+        "--backend", backend, "--model", model, "-o", result_dir
+    ]
+    if model_dir:
+        separate_cmd += ["--model-dir", model_dir]
+    if silence_threshold_db is not None:
+        separate_cmd += ["--silence-threshold-db", str(silence_threshold_db)]
+    if downmix:
+        separate_cmd.append("--downmix")
+
+    def on_download_line(line: str) -> None:
+        match = YTDLP_PROGRESS_PATTERN.search(line)
+        if match and on_download_progress:
+            on_download_progress(min(float(match.group(1)) / 100, 1.0))
+
+    def on_separation_line(line: str) -> None:
+        match = SEPARATION_PROGRESS_PATTERN.match(line.strip())
+        if match and on_separation_progress:
+            on_separation_progress(float(match.group(1)))
+        report = parse_silence_report(line)
+        if report and on_silence_report:
+            on_silence_report(report)
+
+    separate_kwargs = {"stats": process_stats}
+    if cpu_allotment:
+        # Cap TensorFlow thread pools to this worker slot's share of the cores
+        separate_kwargs.update(env=cpu_allotment.thread_env(), preexec_fn=cpu_allotment.preexec_fn())
+
+    # yt-dlp -> ffmpeg -> separator; run_command hands each pipe end to its child
+    download_read, download_write = os.pipe()
+    pcm_read, pcm_write = os.pipe()
+    results = await asyncio.gather(
+        run_command(download_cmd, stdout_fd=download_write, on_stderr_line=on_download_line),
+        run_command(decode_cmd, stdin_fd=download_read, stdout_fd=pcm_write),
+        run_command(separate_cmd, stdin_fd=pcm_read, on_stdout_line=on_separation_line, **separate_kwargs),
+        return_exceptions=True
+    )
+
+    stages = (
+        ("yt-dlp", "yt-dlp를 찾을 수 없습니다. yt-dlp가 설치되어 있는지 확인하세요.", "YouTube 오디오 다운로드 실패"),
+        ("ffmpeg", "ffmpeg 실행 파일을 찾을 수 없습니다. ffmpeg가 시스템에 설치되어 있고 PATH에 추가되었는지 확인하세요.",
+         "오디오 디코딩 실패"),
+        ("separator", "spleeter 실행 파일을 찾을 수 없습니다. 가상 환경에 spleeter가 올바르게 설치되었는지 확인하세요.",
+         "오디오 분리 중 오류")
+    )
+    failures: List[str] = []
+    broken_pipes: List[str] = []
+    for (name, not_found, failed), result in zip(stages, results):
+        if isinstance(result, FileNotFoundError):
+            return not_found
+        if isinstance(result, BaseException):
+            raise result
+        returncode, stdout, stderr = result
+        if name == "yt-dlp" and YTDLP_TOO_LARGE_PATTERN.search(stderr):
+            return f"다운로드된 파일 크기가 너무 큽니다. 최대 {max_size_mb}MB까지 허용됩니다."
+        if returncode != 0:
+            message = f"{failed}: {stderr.strip() or f'exit code {returncode}'}"
+            # A stage that dies on EPIPE only lost its reader; the reader's own failure is the cause
+            (broken_pipes if name != "separator" and is_broken_pipe(returncode, stderr) else failures).append(message)
+    # Report the stage closest to the separator first: a crash downstream makes the stages before it fail too
+    reported = failures or broken_pipes
+    return reported[-1] if reported else None
+
+
+async def convert_wav_to_mp3(wav_path: str, mp3_path: str, threads: Optional[int] = None,
+                             duration: Optional[float] = None,
+                             on_progress: Optional[Callable[[float], None]] = None,
+                             encoder_args: Sequence[str] = ()) -> Optional[str]:
+    """Convert WAV file to MP3 (encoder_args: extra libmp3lame options) and return error message if failed."""
     try:
-        subprocess.run(["ffmpeg", "-i", wav_path, mp3_path], check=True)
+        # -y: a job resumed after a crash mid-encode finds its partial MP3s in place
+        cmd = ["ffmpeg", "-y", "-nostats", "-progress", "pipe:1"]
+        if threads:
+            cmd += ["-threads", str(threads), "-i", wav_path, "-threads", str(threads), *encoder_args, mp3_path]
+        else:
+            cmd += ["-i", wav_path, *encoder_args, mp3_path]
+        
+        def on_line(line: str) -> None:
+            # -progress reports out_time_us (and the misnamed out_time_ms) in microseconds
+            key, _, value = line.partition("=")
+            if key in ("out_time_us", "out_time_ms") and duration and on_progress:
+                try:
+                    on_progress(min(int(value) / 1_000_000 / duration, 1.0))
+                except ValueError:
+                    pass
+        
+        returncode, stdout, stderr = await run_command(cmd, on_stdout_line=on_line)
+        if returncode != 0:
+            return f"WAV to MP3 변환 실패: {stderr.strip() or f'exit code {returncode}'}"
         return None
     except FileNotFoundError:
         return "ffmpeg 실행 파일을 찾을 수 없습니다. ffmpeg가 시스템에 설치되어 있고 PATH에 추가되었는지 확인하세요."
-    except subprocess.CalledProcessError as e:
-        return f"WAV to MP3 변환 실패: {e.stderr.strip() if e.stderr else e}"
 
 
 def cleanup_file(filepath: str) -> None:
@@ -233,7 +526,7 @@ def cleanup_file(filepath: str) -> None:
         if filepath and os.path.exists(filepath):
             os.remove(filepath)
     except OSError as e:
-        print(f"Failed to remove file {filepath}: {e}")
+        app_logger.warning("Failed to remove file %s: %s", filepath, e)
 
 
 def cleanup_files(*filepaths: str) -> None:
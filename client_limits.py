@@ -0,0 +1,164 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any
+
+from config_manager import config_manager
+from logger import app_logger
+
+
+# error_message of a task rejected by a per-client limit (the API answers 429 rather than 503)
+CLIENT_LIMIT_ERROR = "Client limit exceeded"
+# Clients with nothing admitted are forgotten after this long
+CLIENT_IDLE_SECONDS = 3600
+
+
+@dataclass
+class TokenBucket:
+    """Allows `burst` submissions at once, refilled at `rate_per_minute`."""
+    rate_per_minute: float
+    burst: int
+    tokens: float = 0.0
+    updated_at: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        self.tokens = float(self.burst)
+
+    def take(self) -> Optional[float]:
+        """
+        Take one token.
+        Returns: None if allowed, else seconds until the next token
+        """
+        now = time.monotonic()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated_at) * self.rate_per_minute / 60)
+        self.updated_at = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return None
+        return (1.0 - self.tokens) * 60 / self.rate_per_minute
+
+
+@dataclass
+class ClientUsage:
+    client_id: str
+    weight: float
+    bucket: Optional[TokenBucket]
+    active: int = 0
+    submitted: int = 0
+    rate_limited: int = 0
+    capped: int = 0
+    last_seen: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "weight": self.weight,
+            "active_tasks": self.active,
+            "submitted": self.submitted,
+            "rate_limited": self.rate_limited,
+            "capped": self.capped,
+            "tokens": round(self.bucket.tokens, 2) if self.bucket else None
+        }
+
+
+class ClientRegistry:
+    """
+    Per-client identity, weights, submission token buckets and admitted-task caps.
+    Called from request handlers and the pipeline thread, so every method locks.
+    """
+
+    def __init__(self, submit_rate_per_minute: float, submit_burst: int, max_tasks_per_client: int,
+                 weights: Dict[str, float], trusted_proxy_hops: int):
+        self.submit_rate_per_minute = submit_rate_per_minute
+        self.submit_burst = max(1, submit_burst)
+        self.max_tasks_per_client = max_tasks_per_client
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self.lock = threading.Lock()
+        self.clients: Dict[str, ClientUsage] = {}
+        # Weights are configured by API key or IP; only configured keys identify a client
+        self.api_keys: Dict[str, str] = {}
+        self.weights: Dict[str, float] = {}
+        for name, weight in weights.items():
+            if "." in name or ":" in name:
+                self.weights[f"ip:{name}"] = weight
+            else:
+                client_id = f"key:{hashlib.sha256(name.encode()).hexdigest()[:12]}"
+                self.api_keys[name] = client_id
+                self.weights[client_id] = weight
+
+    def identify(self, host: Optional[str], api_key: Optional[str] = None, forwarded_for: Optional[str] = None) -> str:
+        """
+        Get the client ID of a request: a configured API key, else the address
+        the trusted proxies saw (X-Forwarded-For is client-controlled left of them).
+        """
+        if api_key and api_key in self.api_keys:
+            return self.api_keys[api_key]
+        if self.trusted_proxy_hops and forwarded_for:
+            hops: List[str] = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+            if hops:
+                return f"ip:{hops[-min(self.trusted_proxy_hops, len(hops))]}"
+        return f"ip:{host or 'unknown'}"
+
+    def weight(self, client_id: str) -> float:
+        return self.weights.get(client_id, 1.0)
+
+    def _usage(self, client_id: str) -> ClientUsage:
+        usage = self.clients.get(client_id)
+        if not usage:
+            bucket = TokenBucket(self.submit_rate_per_minute, self.submit_burst) if self.submit_rate_per_minute > 0 else None
+            usage = ClientUsage(client_id, self.weight(client_id), bucket)
+            self.clients[client_id] = usage
+        usage.last_seen = time.time()
+        return usage
+
+    def take_submission(self, client_id: str) -> Optional[str]:
+        """
+        Charge one submission to the client's token bucket.
+        Returns: error_message if the client is over its rate
+        """
+        with self.lock:
+            usage = self._usage(client_id)
+            retry_after = usage.bucket.take() if usage.bucket else None
+            if retry_after is None:
+                usage.submitted += 1
+                return None
+            usage.rate_limited += 1
+        app_logger.warning("Client %s rate limited (retry in %.1fs)", client_id, retry_after)
+        return f"요청이 너무 많습니다. {int(retry_after) + 1}초 후에 다시 시도해주세요."
+
+    def try_admit(self, client_id: str, enforce_cap: bool = True) -> bool:
+        """Count one more admitted task against the client's cap; False if it is at the cap."""
+        with self.lock:
+            usage = self._usage(client_id)
+            if enforce_cap and self.max_tasks_per_client and usage.active >= self.max_tasks_per_client:
+                usage.capped += 1
+                return False
+            usage.active += 1
+            return True
+
+    def release(self, client_id: str) -> None:
+        with self.lock:
+            usage = self.clients.get(client_id)
+            if usage and usage.active > 0:
+                usage.active -= 1
+            self._prune()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - CLIENT_IDLE_SECONDS
+        for client_id in [c for c, u in self.clients.items() if u.active == 0 and u.last_seen < cutoff]:
+            del self.clients[client_id]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            self._prune()
+            return {client_id: usage.to_dict() for client_id, usage in self.clients.items()}
+
+
+# Global client registry
+client_registry = ClientRegistry(
+    config_manager.get_client_submit_rate(),
+    config_manager.get_client_submit_burst(),
+    config_manager.get_max_tasks_per_client(),
+    config_manager.get_client_weights(),
+    config_manager.get_trusted_proxy_hops()
+)
@@ -1,6 +1,6 @@
 import os
 import configparser
-from typing import Optional
+from typing import Dict, Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -13,6 +13,7 @@ class ConfigManager:
     def __init__(self, config_file: str = 'config.ini'):
         self.config_file = config_file
         self.config = configparser.ConfigParser()
+        self.loaded_mtime = self._config_mtime()
         self._load_config()
     
     def _load_config(self) -> None:
@@ -29,6 +30,29 @@ class ConfigManager:
             print(f"Error reading {self.config_file}: {e}")
             self._use_defaults()
     
+    def _config_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.config_file)
+        except OSError:
+            return None
+    
+    def reload_if_changed(self) -> bool:
+        """Re-read the config file if it was modified since it was last loaded."""
+        mtime = self._config_mtime()
+        if mtime is None or mtime == self.loaded_mtime:
+            return False
+        
+        config = configparser.ConfigParser()
+        try:
+            config.read(self.config_file)
+        except Exception as e:
+            print(f"Error reloading {self.config_file}: {e}")
+            return False
+        # Swap in one assignment so readers never see a half-parsed config
+        self.config = config
+        self.loaded_mtime = mtime
+        return True
+    
     def _use_defaults(self) -> None:
         """Set default configuration values."""
         self.config.add_section('LIMITS')
@@ -65,6 +89,34 @@ class ConfigManager:
         except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
             return 600
     
+    def get_upload_session_ttl_seconds(self) -> int:
+        """Get how long an idle resumable upload session is kept before it is discarded."""
+        env_value = os.getenv('UPLOAD_SESSION_TTL_SECONDS')
+        if env_value:
+            try:
+                return int(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getint('LIMITS', 'UPLOAD_SESSION_TTL_SECONDS')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 3600
+    
+    def get_max_upload_sessions_per_client(self) -> int:
+        """Get how many unfinished resumable uploads one client may hold (0 disables the cap)."""
+        env_value = os.getenv('MAX_UPLOAD_SESSIONS_PER_CLIENT')
+        if env_value:
+            try:
+                return int(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getint('LIMITS', 'MAX_UPLOAD_SESSIONS_PER_CLIENT')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 2
+    
     def get_upload_dir(self) -> str:
         """Get upload directory path."""
         return os.getenv('UPLOAD_DIR', 'uploads')
@@ -73,10 +125,120 @@ class ConfigManager:
         """Get output directory path."""
         return os.getenv('OUTPUT_DIR', 'outputs')
     
+    def get_job_journal_path(self) -> str:
+        """Get the job journal path; empty disables the journal and warm restarts."""
+        env_value = os.getenv('JOB_JOURNAL_PATH')
+        if env_value is not None:
+            return env_value.strip()
+        
+        try:
+            return self.config.get('JOURNAL', 'JOB_JOURNAL_PATH').strip()
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            return os.path.join('journal', 'jobs.jsonl')
+    
     def get_spleeter_model(self) -> str:
         """Get spleeter model configuration."""
         return os.getenv('SPLEETER_MODEL', 'spleeter:2stems')
     
+    def get_model_dir(self, model: Optional[str] = None) -> str:
+        """Get directory of the pretrained model of a spleeter model (default: the configured one)."""
+        model_name = (model or self.get_spleeter_model()).split(':')[-1]
+        return os.path.join(os.getenv('MODEL_PATH', 'pretrained_models'), model_name)
+    
+    def get_separation_backend(self) -> str:
+        """Get the separation backend: spleeter (stock checkpoint), frozen or int8 (exports made by model_export.py)."""
+        env_value = os.getenv('SEPARATION_BACKEND')
+        if env_value:
+            return env_value.strip().lower()
+        
+        try:
+            return self.config.get('MODEL', 'SEPARATION_BACKEND').strip().lower()
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            return 'spleeter'
+    
+    def get_optimized_backends_enabled(self) -> bool:
+        """Get whether the frozen/int8 exports may be used (off until validated on this deployment)."""
+        env_value = os.getenv('ENABLE_OPTIMIZED_BACKENDS')
+        if env_value:
+            return env_value.strip().lower() in ('1', 'true', 'yes', 'on')
+        
+        try:
+            return self.config.getboolean('MODEL', 'ENABLE_OPTIMIZED_BACKENDS')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return False
+    
+    def get_skip_silence(self) -> bool:
+        """Get whether silent regions are skipped instead of going through the model."""
+        env_value = os.getenv('SKIP_SILENCE')
+        if env_value:
+            return env_value.strip().lower() in ('1', 'true', 'yes', 'on')
+        
+        try:
+            return self.config.getboolean('MODEL', 'SKIP_SILENCE')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return False
+    
+    def get_silence_threshold_db(self) -> float:
+        """Get the level (dBFS) below which audio counts as silence."""
+        env_value = os.getenv('SILENCE_THRESHOLD_DB')
+        if env_value:
+            try:
+                return float(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getfloat('MODEL', 'SILENCE_THRESHOLD_DB')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return -50.0
+    
+    def get_fast_tier_model(self) -> str:
+        """Get the spleeter model of the fast quality tier."""
+        env_value = os.getenv('FAST_TIER_MODEL')
+        if env_value:
+            return env_value.strip()
+        
+        try:
+            return self.config.get('QUALITY', 'FAST_TIER_MODEL').strip() or 'spleeter:2stems'
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            return 'spleeter:2stems'
+    
+    def get_fast_tier_backend(self) -> str:
+        """Get the separation backend of the fast quality tier (falls back to spleeter if not exported)."""
+        env_value = os.getenv('FAST_TIER_BACKEND')
+        if env_value:
+            return env_value.strip().lower()
+        
+        try:
+            return self.config.get('QUALITY', 'FAST_TIER_BACKEND').strip().lower() or 'int8'
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            return 'int8'
+    
+    def get_degrade_wait_seconds(self) -> int:
+        """Get the predicted queue wait above which new jobs run at the fast tier (0, the default, disables)."""
+        env_value = os.getenv('DEGRADE_WAIT_SECONDS')
+        if env_value:
+            try:
+                return int(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getint('QUALITY', 'DEGRADE_WAIT_SECONDS')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 0
+    
+    def get_warmup_enabled(self) -> bool:
+        """Get whether a warm-up inference runs before the service reports ready."""
+        env_value = os.getenv('WARMUP_ON_STARTUP')
+        if env_value:
+            return env_value.strip().lower() in ('1', 'true', 'yes', 'on')
+        
+        try:
+            return self.config.getboolean('STARTUP', 'WARMUP_ON_STARTUP')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return True
+    
     def get_max_concurrent_tasks(self) -> int:
         """Get maximum concurrent tasks."""
         env_value = os.getenv('MAX_CONCURRENT_TASKS')
@@ -91,6 +253,220 @@ class ConfigManager:
         except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
             return 3
     
+    def get_max_queued_tasks(self) -> int:
+        """Get maximum admitted jobs across all pipeline stages (download, separation, encoding)."""
+        env_value = os.getenv('MAX_QUEUED_TASKS')
+        if env_value:
+            try:
+                return int(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getint('CONCURRENCY', 'MAX_QUEUED_TASKS')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return self.get_max_concurrent_tasks() * 4
+    
+    def get_memory_budget_mb(self) -> int:
+        """Get the memory separations may use at once in MB (0: 75% of the container limit, negative: unlimited)."""
+        env_value = os.getenv('MEMORY_BUDGET_MB')
+        if env_value:
+            try:
+                return int(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getint('CONCURRENCY', 'MEMORY_BUDGET_MB')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 0
+    
+    def get_client_submit_rate(self) -> float:
+        """Get how many jobs one client may submit per minute on average (0 disables)."""
+        env_value = os.getenv('CLIENT_SUBMIT_RATE_PER_MINUTE')
+        if env_value:
+            try:
+                return float(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getfloat('CLIENTS', 'SUBMIT_RATE_PER_MINUTE')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 0.0
+    
+    def get_client_submit_burst(self) -> int:
+        """Get how many jobs one client may submit back to back."""
+        env_value = os.getenv('CLIENT_SUBMIT_BURST')
+        if env_value:
+            try:
+                return int(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getint('CLIENTS', 'SUBMIT_BURST')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 5
+    
+    def get_max_tasks_per_client(self) -> int:
+        """Get how many admitted (queued or running) tasks one client may have (0 = no cap)."""
+        env_value = os.getenv('MAX_TASKS_PER_CLIENT')
+        if env_value:
+            try:
+                return int(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getint('CLIENTS', 'MAX_TASKS_PER_CLIENT')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 0
+    
+    def get_client_weights(self) -> Dict[str, float]:
+        """Get fair-share weights as {API key or IP: weight} from "name=weight, ..." (default weight 1)."""
+        value = os.getenv('CLIENT_WEIGHTS')
+        if value is None:
+            try:
+                value = self.config.get('CLIENTS', 'CLIENT_WEIGHTS')
+            except (configparser.NoSectionError, configparser.NoOptionError):
+                value = ''
+        
+        weights = {}
+        for item in value.split(','):
+            name, _, weight = item.strip().rpartition('=')
+            try:
+                if name.strip() and float(weight) > 0:
+                    weights[name.strip()] = float(weight)
+            except ValueError:
+                pass
+        return weights
+    
+    def get_trusted_proxy_hops(self) -> int:
+        """Get how many reverse proxies append to X-Forwarded-For (0 = use the socket address)."""
+        env_value = os.getenv('TRUSTED_PROXY_HOPS')
+        if env_value:
+            try:
+                return int(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getint('CLIENTS', 'TRUSTED_PROXY_HOPS')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 0
+    
+    def get_cpu_pinning(self) -> bool:
+        """Get whether each worker slot is pinned to its own set of CPUs."""
+        env_value = os.getenv('CPU_PINNING')
+        if env_value:
+            return env_value.strip().lower() in ('1', 'true', 'yes', 'on')
+        
+        try:
+            return self.config.getboolean('CONCURRENCY', 'CPU_PINNING')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return False
+    
+    def get_progressive_ingest(self) -> bool:
+        """Get whether YouTube jobs separate the audio while it is still downloading."""
+        env_value = os.getenv('PROGRESSIVE_INGEST')
+        if env_value:
+            return env_value.strip().lower() in ('1', 'true', 'yes', 'on')
+        
+        try:
+            return self.config.getboolean('INGEST', 'PROGRESSIVE_INGEST')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return False
+    
+    def get_remote_separation(self) -> bool:
+        """Get whether separation is handed to remote workers (worker.py) instead of running here."""
+        env_value = os.getenv('REMOTE_SEPARATION')
+        if env_value:
+            return env_value.strip().lower() in ('1', 'true', 'yes', 'on')
+        
+        try:
+            return self.config.getboolean('WORKERS', 'REMOTE_SEPARATION')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return False
+    
+    def get_worker_token(self) -> str:
+        """Get the shared secret remote workers authenticate with (empty: Unix socket workers only)."""
+        env_value = os.getenv('WORKER_TOKEN')
+        if env_value:
+            return env_value.strip()
+        
+        try:
+            return self.config.get('WORKERS', 'WORKER_TOKEN').strip()
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            return ''
+    
+    def get_worker_lease_seconds(self) -> float:
+        """Get how long a worker's lease on a job lasts without a heartbeat."""
+        env_value = os.getenv('WORKER_LEASE_SECONDS')
+        if env_value:
+            try:
+                return float(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getfloat('WORKERS', 'LEASE_SECONDS')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 30.0
+    
+    def get_worker_max_deliveries(self) -> int:
+        """Get how many times a job is handed to a worker before it fails."""
+        env_value = os.getenv('WORKER_MAX_DELIVERIES')
+        if env_value:
+            try:
+                return int(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getint('WORKERS', 'MAX_DELIVERIES')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 3
+    
+    def get_profile_sample_rate(self) -> float:
+        """Get the fraction of tasks profiled without an explicit request (0.0-1.0)."""
+        env_value = os.getenv('PROFILE_SAMPLE_RATE')
+        if env_value:
+            try:
+                return float(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getfloat('PROFILING', 'PROFILE_SAMPLE_RATE')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 0.0
+    
+    def get_config_watch_seconds(self) -> float:
+        """Get how often the config file is checked for runtime changes (0 disables watching)."""
+        env_value = os.getenv('CONFIG_WATCH_SECONDS')
+        if env_value:
+            try:
+                return float(env_value)
+            except ValueError:
+                pass
+        
+        try:
+            return self.config.getfloat('RUNTIME', 'CONFIG_WATCH_SECONDS')
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            return 0.0
+    
+    def get_admin_token(self) -> str:
+        """Get the shared secret the admin endpoints require (empty: Unix socket clients only)."""
+        env_value = os.getenv('ADMIN_TOKEN')
+        if env_value:
+            return env_value.strip()
+        
+        try:
+            return self.config.get('RUNTIME', 'ADMIN_TOKEN').strip()
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            return ''
+    
     def get_task_timeout_seconds(self) -> int:
         """Get task timeout in seconds."""
         env_value = os.getenv('TASK_TIMEOUT_SECONDS')
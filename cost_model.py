@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, Optional, Tuple, Any
+
+from quality_tiers import FAST_TIER, FULL_TIER
+
+
+# Starting points per quality tier before any job has been measured: (fixed seconds,
+# seconds per audio second). "separate" holds a separation slot; "stream" is the
+# progressive YouTube download and separation, which hold the slot together;
+# "encode" is the MP3 encoding after it.
+STAGE_DEFAULTS = {
+    FULL_TIER: {
+        "separate": (5.0, 0.35),
+        "stream": (8.0, 0.4),
+        "encode": (1.0, 0.03)
+    },
+    FAST_TIER: {
+        "separate": (4.0, 0.15),
+        "stream": (8.0, 0.3),
+        "encode": (0.5, 0.015)
+    }
+}
+# Jobs of unknown length are predicted as this long
+FALLBACK_AUDIO_SECONDS = 210.0
+
+
+class StageCost:
+    """
+    Predicts one pipeline stage's wall time from the job's audio length: a
+    least-squares line through the recent measurements of that stage.
+    """
+
+    def __init__(self, base_seconds: float, seconds_per_audio_second: float, history: int = 50):
+        self.observations: Deque[Tuple[float, float]] = deque(maxlen=history)
+        self.base_seconds = base_seconds
+        self.rate = seconds_per_audio_second
+
+    def predict(self, audio_seconds: Optional[float]) -> float:
+        if audio_seconds is None:
+            audio_seconds = FALLBACK_AUDIO_SECONDS
+        return self.base_seconds + self.rate * audio_seconds
+
+    def observe(self, audio_seconds: float, seconds: float) -> None:
+        if audio_seconds <= 0 or seconds <= 0:
+            return
+        self.observations.append((audio_seconds, seconds))
+        count = len(self.observations)
+        mean_x = sum(x for x, _ in self.observations) / count
+        mean_y = sum(y for _, y in self.observations) / count
+        spread = sum((x - mean_x) ** 2 for x, _ in self.observations)
+        if count >= 3 and spread > 0:
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in self.observations) / spread
+            self.rate = max(slope, 0.0)
+        # With too few distinct lengths for a line only the intercept moves
+        self.base_seconds = max(mean_y - self.rate * mean_x, 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "observations": len(self.observations),
+            "base_seconds": round(self.base_seconds, 2),
+            "seconds_per_audio_second": round(self.rate, 4)
+        }
+
+
+class CostModel:
+    """Per-tier, per-stage time predictions, calibrated by every successful job. Thread-safe."""
+
+    def __init__(self):
+        self.tiers = {
+            tier: {stage: StageCost(*defaults) for stage, defaults in stages.items()}
+            for tier, stages in STAGE_DEFAULTS.items()
+        }
+        self.lock = threading.Lock()
+
+    def predict(self, stages: Iterable[str], audio_seconds: Optional[float], tier: str = FULL_TIER) -> Dict[str, float]:
+        """Predicted seconds for each of the stages at a quality tier, in order."""
+        with self.lock:
+            costs = self.tiers.get(tier, self.tiers[FULL_TIER])
+            return {stage: costs[stage].predict(audio_seconds) for stage in stages}
+
+    def observe(self, audio_seconds: Optional[float], measured: Dict[str, float], tier: str = FULL_TIER) -> None:
+        """Calibrate with a finished job's measured seconds per stage."""
+        if audio_seconds is None or tier not in self.tiers:
+            return
+        with self.lock:
+            for stage, seconds in measured.items():
+                if stage in self.tiers[tier]:
+                    self.tiers[tier][stage].observe(audio_seconds, seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {tier: {stage: cost.to_dict() for stage, cost in costs.items()}
+                    for tier, costs in self.tiers.items()}
+
+
+@dataclass
+class JobEstimate:
+    """A job's predicted stage times and how far through them it is."""
+    audio_seconds: Optional[float]
+    # Predicted seconds per remaining stage, in pipeline order
+    stages: Dict[str, float]
+    # Stage in progress; None while waiting for the separation slot
+    stage: Optional[str] = None
+    fraction: float = 0.0
+    stage_started: float = 0.0
+    measured: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def total(self) -> float:
+        return sum(self.stages.values())
+
+    def begin(self, stage: str) -> None:
+        self.stage, self.fraction, self.stage_started = stage, 0.0, time.monotonic()
+
+    def end(self) -> None:
+        if self.stage:
+            self.measured[self.stage] = time.monotonic() - self.stage_started
+
+    def report(self, stages: Tuple[str, ...], fraction: float) -> None:
+        """Progress of the running stage, if it is one of stages."""
+        if self.stage in stages:
+            self.fraction = fraction
+
+    def stage_remaining(self) -> float:
+        """Seconds left in the running stage: by reported progress if any, else by elapsed time."""
+        if self.stage is None:
+            return 0.0
+        predicted = self.stages[self.stage]
+        if self.fraction > 0:
+            return predicted * (1.0 - self.fraction)
+        return max(predicted - (time.monotonic() - self.stage_started), 0.0)
+
+    def remaining(self) -> float:
+        """Seconds left in the running stage and all later ones."""
+        if self.stage is None:
+            return self.total
+        order = list(self.stages)
+        later = order[order.index(self.stage) + 1:]
+        return self.stage_remaining() + sum(self.stages[stage] for stage in later)
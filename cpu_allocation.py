@@ -0,0 +1,206 @@
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Any, Callable
+
+from logger import app_logger
+
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def read_cgroup_cpu_quota() -> Optional[float]:
+    """Get the container CPU quota in cores from cgroup v2 or v1, None if unlimited."""
+    cpu_max = _read_first_line(CGROUP_V2_CPU_MAX)
+    if cpu_max:
+        parts = cpu_max.split()
+        if len(parts) == 2 and parts[0] != "max":
+            try:
+                return int(parts[0]) / int(parts[1])
+            except (ValueError, ZeroDivisionError):
+                return None
+        return None
+
+    quota = _read_first_line(CGROUP_V1_QUOTA)
+    period = _read_first_line(CGROUP_V1_PERIOD)
+    if quota and period:
+        try:
+            quota_us, period_us = int(quota), int(period)
+            if quota_us > 0 and period_us > 0:
+                return quota_us / period_us
+        except ValueError:
+            return None
+    return None
+
+
+def get_affinity_cpus() -> List[int]:
+    """Get the CPU ids this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def detect_effective_cpus() -> int:
+    """Get the number of cores actually usable, honoring affinity and cgroup quotas."""
+    cpu_count = len(get_affinity_cpus())
+    quota = read_cgroup_cpu_quota()
+    if quota is not None:
+        cpu_count = min(cpu_count, max(1, math.floor(quota)))
+    return max(1, cpu_count)
+
+
+@dataclass
+class CpuAllotment:
+    """The share of CPU given to one worker slot."""
+    slot: int
+    threads: int
+    cpus: List[int] = field(default_factory=list)
+
+    def thread_env(self) -> Dict[str, str]:
+        """Environment that caps TensorFlow/BLAS thread pools of a child process."""
+        env = os.environ.copy()
+        env.update({
+            "TF_NUM_INTRAOP_THREADS": str(self.threads),
+            "TF_NUM_INTEROP_THREADS": str(1 if self.threads <= 2 else 2),
+            "OMP_NUM_THREADS": str(self.threads),
+            "MKL_NUM_THREADS": str(self.threads),
+            "OPENBLAS_NUM_THREADS": str(self.threads),
+        })
+        return env
+
+    def preexec_fn(self) -> Optional[Callable[[], None]]:
+        """Function pinning a child process to this slot's CPUs, None when not pinned."""
+        if not self.cpus or not hasattr(os, "sched_setaffinity"):
+            return None
+        cpus = set(self.cpus)
+        return lambda: os.sched_setaffinity(0, cpus)
+
+
+class CpuAllocator:
+    """Split the available cores across worker slots."""
+
+    def __init__(self, slots: int, pinning: bool = False):
+        self.slots = max(1, slots)
+        self.pinning = pinning
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.start_child_cpu = self._child_cpu_seconds()
+        # Slot -> allotment; a busy slot keeps the allotment it was acquired with until released
+        self.allotments: Dict[int, CpuAllotment] = {}
+        self.busy: Set[int] = set()
+        self._configure()
+
+        app_logger.info(
+            f"CpuAllocator initialized - effective_cpus: {self.effective_cpus}, "
+            f"slots: {self.slots}, threads_per_slot: {self.threads_per_slot}, pinning: {self.pinning}"
+        )
+
+    def _configure(self) -> None:
+        self.affinity = get_affinity_cpus()
+        self.cgroup_quota = read_cgroup_cpu_quota()
+        self.effective_cpus = detect_effective_cpus()
+        self.threads_per_slot = max(1, self.effective_cpus // self.slots)
+        self.cpus_per_slot = len(self.affinity) // self.slots if self.pinning else 0
+        self._split()
+
+    def _split(self) -> None:
+        """
+        Give every idle slot its share of the CPUs no busy slot holds. While
+        draining slots still hold too many CPUs, the idle slots left without a
+        full share stay off the free list, so pinned jobs never overlap.
+        """
+        held = {cpu for slot in self.busy for cpu in self.allotments[slot].cpus}
+        available = [cpu for cpu in self.affinity if cpu not in held]
+        self.free_slots = []
+        for slot in range(self.slots):
+            if slot in self.busy:
+                continue
+            cpus: List[int] = []
+            if self.cpus_per_slot > 0:
+                cpus, available = available[:self.cpus_per_slot], available[self.cpus_per_slot:]
+                if len(cpus) < self.cpus_per_slot:
+                    self.allotments.pop(slot, None)
+                    continue
+            self.allotments[slot] = CpuAllotment(slot=slot, threads=self.threads_per_slot, cpus=cpus)
+            self.free_slots.append(slot)
+        for slot in [slot for slot in self.allotments if slot >= self.slots and slot not in self.busy]:
+            del self.allotments[slot]
+
+    def resize(self, slots: int) -> None:
+        """
+        Re-split the cores for a new slot count. Running jobs keep the allotment
+        they hold; slots beyond the new count are retired when released.
+        """
+        with self.lock:
+            self.slots = max(1, slots)
+            self._configure()
+        app_logger.info("CpuAllocator resized - slots: %s, threads_per_slot: %s", self.slots, self.threads_per_slot)
+
+    @staticmethod
+    def _child_cpu_seconds() -> float:
+        times = os.times()
+        return times.children_user + times.children_system
+
+    def has_free(self) -> bool:
+        with self.lock:
+            return bool(self.free_slots)
+
+    def free_count(self) -> int:
+        with self.lock:
+            return len(self.free_slots)
+
+    def busy_count(self) -> int:
+        with self.lock:
+            return len(self.busy)
+
+    def acquire(self) -> CpuAllotment:
+        """
+        Take a free slot's allotment. The scheduler never runs more jobs than
+        there are slots, so running out is a bug: sharing a slot would let it
+        be handed out twice once released.
+        """
+        with self.lock:
+            if not self.free_slots:
+                raise RuntimeError(f"No free CPU slot ({self.slots} slots, all busy)")
+            slot = self.free_slots.pop(0)
+            self.busy.add(slot)
+            return self.allotments[slot]
+
+    def release(self, allotment: CpuAllotment) -> None:
+        with self.lock:
+            if allotment.slot not in self.busy or self.allotments.get(allotment.slot) is not allotment:
+                return
+            self.busy.discard(allotment.slot)
+            # Its CPUs may complete the share of a slot that was waiting for them
+            self._split()
+
+    def report(self) -> Dict[str, Any]:
+        """CPU split and effective utilization of child processes since startup."""
+        wall_seconds = max(time.time() - self.started_at, 1e-6)
+        child_cpu = self._child_cpu_seconds() - self.start_child_cpu
+        with self.lock:
+            busy_slots = len(self.busy)
+            slot_cpus = {a.slot: a.cpus for a in self.allotments.values() if a.cpus}
+        return {
+            "effective_cpus": self.effective_cpus,
+            "cgroup_quota": self.cgroup_quota,
+            "slots": self.slots,
+            "busy_slots": busy_slots,
+            "threads_per_slot": self.threads_per_slot,
+            "pinning": self.pinning,
+            "slot_cpus": slot_cpus,
+            "child_cpu_seconds": round(child_cpu, 2),
+            "utilization": round(child_cpu / (wall_seconds * self.effective_cpus), 4)
+        }
@@ -1,201 +1,485 @@
+import asyncio
+import hashlib
 import os
 import time
 import uuid
-from typing import Optional, Tuple
+from dataclasses import dataclass
+from typing import Any, AsyncContextManager, Callable, Dict, Optional, Sequence, Tuple
 from fastapi import UploadFile
 from fastapi.templating import Jinja2Templates
 
 from audio_utils import (
-    get_audio_duration, get_youtube_video_info, download_youtube_audio,
+    get_audio_duration, get_audio_info, get_youtube_video_info, download_youtube_audio,
     sanitize_filename, cleanup_file, separate_audio_with_spleeter,
-    convert_wav_to_mp3
+    convert_wav_to_mp3, extract_youtube_video_id, stream_youtube_separation
 )
-from logger import app_logger
+from cpu_allocation import CpuAllotment
+from logger import app_logger, log_context
+from process_stats import ProcessStats
+from profiler import span as profile_span
+from waveform_peaks import PEAKS_FILENAME, write_peaks_from_stems
 
 
-def validate_file_upload(file: UploadFile, max_size_mb: int, max_duration: int, upload_dir: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Opens the separation stage for audio of the given (duration_seconds, channels), either possibly unknown
+SeparationSlot = Callable[[Optional[float], Optional[int]], AsyncContextManager[CpuAllotment]]
+
+
+@dataclass
+class SavedUpload:
+    """An uploaded file already persisted under upload_dir."""
+    input_path: str
+    basename: str
+    filename: str
+    size_mb: float
+    sha256: str
+
+
+def compute_job_key(upload: Optional[SavedUpload], youtube_url: Optional[str]) -> Optional[str]:
     """
-    Validate and save uploaded file.
-    Returns: (input_path, basename, error_message)
+    Compute the key identifying identical jobs: the video ID for YouTube URLs,
+    the SHA-256 of the content for uploaded files.
+    Returns: job key, or None if the input cannot be keyed
+    """
+    if upload:
+        return f"sha256:{upload.sha256}"
+    elif youtube_url:
+        video_id = extract_youtube_video_id(youtube_url)
+        return f"youtube:{video_id}" if video_id else f"youtube_url:{youtube_url.strip()}"
+    return None
+
+
+def make_upload_path(filename: str, upload_dir: str) -> Tuple[str, str]:
+    """
+    Build a collision-free path for an uploaded file, keeping its extension.
+    Returns: (input_path, basename)
     """
+    original_basename = os.path.splitext(filename)[0]
+    safe_basename = sanitize_filename(original_basename)
+    unique_id = uuid.uuid4().hex[:8]
+    basename = f"{safe_basename}_{unique_id}"
+    
+    # Use original extension
+    file_ext = os.path.splitext(filename)[1]
+    return os.path.join(upload_dir, f"{basename}{file_ext}"), basename
+
+
+async def save_upload(file: UploadFile, max_size_mb: int, upload_dir: str) -> Tuple[Optional[SavedUpload], Optional[str]]:
+    """
+    Stream an uploaded file to disk while hashing it.
+    Runs in the request handler: the framework closes UploadFile once the
+    endpoint returns, so the pipeline must only ever see the saved copy.
+    Returns: (saved_upload, error_message)
+    """
+    input_path = None
     try:
         # Check file size
-        file_size_mb = file.size / (1024 * 1024)
-        if file_size_mb > max_size_mb:
-            app_logger.warning(f"File size too large: {file_size_mb:.2f}MB > {max_size_mb}MB")
-            return None, None, f"파일 크기가 너무 큽니다. 최대 {max_size_mb}MB까지 허용됩니다."
+        if file.size is not None and file.size / (1024 * 1024) > max_size_mb:
+            app_logger.warning("File size too large: %.2fMB > %sMB", file.size / (1024 * 1024), max_size_mb)
+            return None, f"파일 크기가 너무 큽니다. 최대 {max_size_mb}MB까지 허용됩니다."
         
         # Save file with UUID to prevent conflicts
-        original_basename = os.path.splitext(file.filename)[0]
-        safe_basename = sanitize_filename(original_basename)
-        unique_id = uuid.uuid4().hex[:8]
-        basename = f"{safe_basename}_{unique_id}"
-        
-        # Use original extension
-        file_ext = os.path.splitext(file.filename)[1]
-        unique_filename = f"{basename}{file_ext}"
-        input_path = os.path.join(upload_dir, unique_filename)
+        input_path, basename = make_upload_path(file.filename, upload_dir)
         
+        digest = hashlib.sha256()
+        size_bytes = 0
         with open(input_path, "wb") as f:
-            f.write(file.file.read())
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size_bytes += len(chunk)
+                if size_bytes > max_size_mb * 1024 * 1024:
+                    raise ValueError(f"upload exceeds {max_size_mb}MB")
+                digest.update(chunk)
+                # File writes block, so they run on the executor rather than the event loop
+                await asyncio.get_running_loop().run_in_executor(None, f.write, chunk)
         
-        app_logger.info(f"File uploaded: {file.filename} ({file_size_mb:.2f}MB)")
+        size_mb = size_bytes / (1024 * 1024)
+        app_logger.info("File uploaded: %s (%.2fMB)", file.filename, size_mb)
+        return SavedUpload(input_path, basename, file.filename, size_mb, digest.hexdigest()), None
         
+    except ValueError as e:
+        cleanup_file(input_path)
+        app_logger.warning("File size too large: %s", e)
+        return None, f"파일 크기가 너무 큽니다. 최대 {max_size_mb}MB까지 허용됩니다."
+    except Exception as e:
+        cleanup_file(input_path)
+        app_logger.error("File upload error: %s", e)
+        return None, f"파일 처리 중 오류가 발생했습니다: {e}"
+
+
+async def validate_file_upload(upload: SavedUpload, max_duration: int) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Validate a saved upload.
+    Returns: (input_path, basename, error_message)
+    """
+    try:
         # Check duration
-        duration = get_audio_duration(input_path)
+        duration = await get_audio_duration(upload.input_path)
         if duration is None or duration > max_duration:
-            cleanup_file(input_path)
-            app_logger.warning(f"Audio duration too long: {duration}s > {max_duration}s")
+            cleanup_file(upload.input_path)
+            app_logger.warning("Audio duration too long: %ss > %ss", duration, max_duration)
             return None, None, f"오디오 길이가 너무 깁니다. 최대 {max_duration}초까지 허용됩니다."
         
-        app_logger.info(f"File validation successful: {basename} ({duration:.2f}s)")
-        return input_path, basename, None
+        app_logger.info("File validation successful: %s (%.2fs)", upload.basename, duration)
+        return upload.input_path, upload.basename, None
         
     except Exception as e:
-        app_logger.error(f"File validation error: {e}")
+        app_logger.error("File validation error: %s", e)
         return None, None, f"파일 처리 중 오류가 발생했습니다: {e}"
 
 
-def validate_youtube_url(youtube_url: str, max_size_mb: int, max_duration: int, upload_dir: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+async def probe_duration(input_path: str) -> Optional[float]:
+    """Duration of a saved input in seconds, None if ffprobe cannot tell."""
+    try:
+        return await get_audio_duration(input_path)
+    except Exception as e:
+        app_logger.warning("Could not probe duration of %s: %s", input_path, e)
+        return None
+
+
+def youtube_basename(video_info: dict, youtube_url: str) -> str:
+    """Build a unique file basename from the video title, falling back to its ID or a timestamp."""
+    video_title = video_info.get("title", "downloaded_audio")
+    
+    # Extract video ID from URL for better naming
+    video_id = extract_youtube_video_id(youtube_url)
+    
+    # Create a better filename with UUID to prevent conflicts
+    unique_id = uuid.uuid4().hex[:8]
+    
+    if video_title and video_title != "downloaded_audio" and "youtube video" not in video_title.lower():
+        # We got a proper title
+        safe_title = sanitize_filename(video_title)
+        basename = f"{safe_title}_{unique_id}"
+        app_logger.info("Using extracted title: %s", video_title)
+    elif video_id:
+        # Use video ID with a descriptive name
+        basename = f"YouTube_Video_{video_id}_{unique_id}"
+        app_logger.info("Using video ID as filename: %s", basename)
+    else:
+        # Fallback to timestamp
+        basename = f"youtube_video_{int(time.time())}_{unique_id}"
+        app_logger.info("Using timestamp as filename: %s", basename)
+    return basename
+
+
+async def validate_youtube_url(youtube_url: str, max_size_mb: int, max_duration: int, upload_dir: str,
+                               on_progress: Optional[Callable[[float], None]] = None) -> Tuple[Optional[str], Optional[str], Optional[str]]:
     """
     Validate and download YouTube URL.
     Returns: (input_path, basename, error_message)
     """
     try:
         # Get video info
-        video_info, error = get_youtube_video_info(youtube_url)
+        with profile_span("youtube_info"):
+            video_info, error = await get_youtube_video_info(youtube_url)
         if error:
-            app_logger.error(f"YouTube info error: {error}")
+            app_logger.error("YouTube info error: %s", error)
             return None, None, error
         
         # Check duration
         duration = video_info.get("duration")
         if duration is None or duration > max_duration:
-            app_logger.warning(f"YouTube video duration too long: {duration}s > {max_duration}s")
+            app_logger.warning("YouTube video duration too long: %ss > %ss", duration, max_duration)
             return None, None, f"YouTube 영상 길이가 너무 깁니다. 최대 {max_duration}초까지 허용됩니다."
         
         # Download audio - let yt-dlp use its own filename first, then get actual title
-        temp_basename = f"youtube_temp_{int(time.time())}"
+        temp_basename = f"youtube_temp_{int(time.time())}_{uuid.uuid4().hex[:8]}"
         temp_input_path = os.path.join(upload_dir, f"{temp_basename}.mp3")
         
         download_start_time = time.time()
-        app_logger.info(f"Starting YouTube download to temp file: {temp_basename}")
-        download_error = download_youtube_audio(youtube_url, temp_input_path)
+        app_logger.info("Starting YouTube download to temp file: %s", temp_basename)
+        with profile_span("youtube_download"):
+            download_error = await download_youtube_audio(youtube_url, temp_input_path, on_progress)
         download_end_time = time.time()
         download_time = download_end_time - download_start_time
 
         if download_error:
-            app_logger.error(f"YouTube download error: {download_error}")
+            app_logger.error("YouTube download error: %s", download_error)
             return None, None, download_error
         
         # Get video title and create meaningful filename
-        video_title = video_info.get("title", "downloaded_audio")
-        
-        # Extract video ID from URL for better naming
-        video_id = None
-        if 'youtu.be/' in youtube_url:
-            video_id = youtube_url.split('youtu.be/')[-1].split('?')[0]
-        elif 'watch?v=' in youtube_url:
-            video_id = youtube_url.split('watch?v=')[-1].split('&')[0]
-        
-        # Create a better filename with UUID to prevent conflicts
-        unique_id = uuid.uuid4().hex[:8]
-        
-        if video_title and video_title != "downloaded_audio" and "youtube video" not in video_title.lower():
-            # We got a proper title
-            safe_title = sanitize_filename(video_title)
-            basename = f"{safe_title}_{unique_id}"
-            app_logger.info(f"Using extracted title: {video_title}")
-        elif video_id:
-            # Use video ID with a descriptive name
-            basename = f"YouTube_Video_{video_id}_{unique_id}"
-            app_logger.info(f"Using video ID as filename: {basename}")
-        else:
-            # Fallback to timestamp
-            basename = f"youtube_video_{int(time.time())}_{unique_id}"
-            app_logger.info(f"Using timestamp as filename: {basename}")
+        basename = youtube_basename(video_info, youtube_url)
         final_input_path = os.path.join(upload_dir, f"{basename}.mp3")
         
         # Rename temp file to final filename
         if os.path.exists(temp_input_path):
             os.rename(temp_input_path, final_input_path)
-            app_logger.info(f"Renamed temp file to: {basename}.mp3")
+            app_logger.info("Renamed temp file to: %s.mp3", basename)
         
-        app_logger.info(f"YouTube download took {download_time:.2f} seconds.")
+        app_logger.info("YouTube download took %.2f seconds.", download_time)
         
         # Check file size after download
         if not os.path.exists(final_input_path):
-            app_logger.error(f"Downloaded file not found at: {final_input_path}")
+            app_logger.error("Downloaded file not found at: %s", final_input_path)
             return None, None, "다운로드된 파일을 찾을 수 없습니다."
             
         file_size_mb = os.path.getsize(final_input_path) / (1024 * 1024)
         if file_size_mb > max_size_mb:
             cleanup_file(final_input_path)
-            app_logger.warning(f"Downloaded file too large: {file_size_mb:.2f}MB > {max_size_mb}MB")
+            app_logger.warning("Downloaded file too large: %.2fMB > %sMB", file_size_mb, max_size_mb)
             return None, None, f"다운로드된 파일 크기가 너무 큽니다. 최대 {max_size_mb}MB까지 허용됩니다."
         
-        app_logger.info(f"YouTube download successful: {basename} ({file_size_mb:.2f}MB, {duration:.2f}s)")
+        app_logger.info("YouTube download successful: %s (%.2fMB, %.2fs)", basename, file_size_mb, duration)
         return final_input_path, basename, None
         
     except Exception as e:
-        app_logger.error(f"YouTube processing error: {e}")
+        app_logger.error("YouTube processing error: %s", e)
         return None, None, f"YouTube URL 처리 중 예상치 못한 오류: {e}"
 
 
-def process_audio_separation(input_path: str, basename: str, output_dir: str, spleeter_model: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+async def process_audio_separation(input_path: str, basename: str, output_dir: str, spleeter_model: str,
+                                   separation_slot: Optional[SeparationSlot] = None,
+                                   on_progress: Optional[Callable[[str, float], None]] = None,
+                                   backend: str = "spleeter", model_dir: Optional[str] = None,
+                                   silence_threshold_db: Optional[float] = None,
+                                   on_silence_report: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                   process_stats: Optional[ProcessStats] = None,
+                                   downmix: bool = False,
+                                   encoder_args: Sequence[str] = ()) -> Tuple[Optional[str], Optional[str], Optional[str]]:
     """
     Process audio separation and conversion.
+    Only the separation itself runs inside separation_slot, which is sized by
+    the probed (duration, channels); encoding overlaps with other jobs.
+    on_progress receives (stage, fraction) for the "separating" and "encoding" stages.
+    silence_threshold_db skips silent regions; on_silence_report receives how much was skipped.
+    process_stats is sampled with the separator's CPU time and RSS.
+    downmix and encoder_args come from the job's quality tier (quality_tiers.py).
     Returns: (vocal_mp3_path, inst_mp3_path, error_message)
     """
+    def report(stage: str, fraction: float) -> None:
+        if on_progress:
+            on_progress(stage, fraction)
+
     try:
         separation_start_time = time.time()
         spleeter_result_dir = os.path.join(output_dir, basename)
         os.makedirs(spleeter_result_dir, exist_ok=True)
-        app_logger.info(f"Created Spleeter output directory: {spleeter_result_dir}")
+        app_logger.info("Created Spleeter output directory: %s", spleeter_result_dir)
+
+        with profile_span("probe"):
+            duration, channels = await get_audio_info(input_path)
 
         # Separate audio with Spleeter
-        error = separate_audio_with_spleeter(input_path, output_dir, spleeter_model)
+        encode_threads = None
+        report("separating", 0.0)
+        with profile_span("separate", backend=backend) as separate_span:
+            on_report = silence_reporter(basename, separate_span, on_silence_report)
+            if separation_slot:
+                async with separation_slot(duration, channels) as cpu_allotment:
+                    error = await separate_audio_with_spleeter(input_path, output_dir, spleeter_model, cpu_allotment,
+                                                               backend=backend, model_dir=model_dir,
+                                                               silence_threshold_db=silence_threshold_db,
+                                                               on_silence_report=on_report,
+                                                               process_stats=process_stats, downmix=downmix)
+                    encode_threads = cpu_allotment.threads
+            else:
+                error = await separate_audio_with_spleeter(input_path, output_dir, spleeter_model,
+                                                           backend=backend, model_dir=model_dir,
+                                                           silence_threshold_db=silence_threshold_db,
+                                                           on_silence_report=on_report,
+                                                           process_stats=process_stats, downmix=downmix)
         if error:
-            app_logger.error(f"Spleeter error: {error}")
+            app_logger.error("Spleeter error: %s", error)
             return None, None, error
+        report("separating", 1.0)
         
-        # Set up file paths
-        vocal_wav_path = os.path.join(spleeter_result_dir, "vocals.wav")
-        inst_wav_path = os.path.join(spleeter_result_dir, "accompaniment.wav")
-        vocal_mp3_path = os.path.join(spleeter_result_dir, f"{basename}_Vocal.mp3")
-        inst_mp3_path = os.path.join(spleeter_result_dir, f"{basename}_Inst.mp3")
-
-        # Check if WAV files exist before conversion
-        if not os.path.exists(vocal_wav_path):
-            error_msg = f"Vocal WAV file not found at {vocal_wav_path}"
-            app_logger.error(error_msg)
-            return None, None, error_msg
-        if not os.path.exists(inst_wav_path):
-            error_msg = f"Instrumental WAV file not found at {inst_wav_path}"
-            app_logger.error(error_msg)
-            return None, None, error_msg
-
-        # Convert WAV to MP3
-        vocal_error = convert_wav_to_mp3(vocal_wav_path, vocal_mp3_path)
-        if vocal_error:
-            app_logger.error(f"Vocal conversion error: {vocal_error}")
-            return None, None, vocal_error
-        
-        inst_error = convert_wav_to_mp3(inst_wav_path, inst_mp3_path)
-        if inst_error:
-            app_logger.error(f"Instrumental conversion error: {inst_error}")
-            return None, None, inst_error
-        
-        # Clean up intermediate WAV files
-        cleanup_file(vocal_wav_path)
-        cleanup_file(inst_wav_path)
+        vocal_mp3_path, inst_mp3_path, error = await encode_stems(
+            spleeter_result_dir, basename, encode_threads, duration, on_progress, encoder_args
+        )
+        if error:
+            return None, None, error
         
         separation_end_time = time.time()
         separation_time = separation_end_time - separation_start_time
-        app_logger.info(f"Vocal separation for {basename} took {separation_time:.2f} seconds.")
-        app_logger.info(f"Audio separation completed for: {basename}")
+        app_logger.info("Vocal separation for %s took %.2f seconds.", basename, separation_time)
+        app_logger.info("Audio separation completed for: %s", basename)
         return vocal_mp3_path, inst_mp3_path, None
         
     except Exception as e:
-        app_logger.error(f"Audio processing error: {e}")
-        return None, None, f"오디오 분리 중 예상치 못한 오류: {e}"
\ No newline at end of file
+        app_logger.error("Audio processing error: %s", e)
+        return None, None, f"오디오 분리 중 예상치 못한 오류: {e}"
+
+
+def silence_reporter(basename: str, separate_span=None,
+                     on_silence_report: Optional[Callable[[Dict[str, Any]], None]] = None) -> Callable[[Dict[str, Any]], None]:
+    """Build the callback that logs a silence report, adds it to the profile span and passes it on."""
+    def on_report(report: Dict[str, Any]) -> None:
+        app_logger.info("Skipped %.1fs of %.1fs silence in %s (%s regions separated)",
+                        report.get("skipped_seconds", 0.0), report.get("audio_seconds", 0.0),
+                        basename, report.get("regions", 0))
+        if separate_span:
+            separate_span.attrs.update({f"silence_{key}": value for key, value in report.items()})
+        if on_silence_report:
+            on_silence_report(report)
+    return on_report
+
+
+def stem_mp3_paths(result_dir: str, basename: str) -> Tuple[str, str]:
+    """
+    Paths of a job's finished stems.
+    Returns: (vocal_mp3_path, inst_mp3_path)
+    """
+    return (os.path.join(result_dir, f"{basename}_Vocal.mp3"),
+            os.path.join(result_dir, f"{basename}_Inst.mp3"))
+
+
+async def encode_stems(result_dir: str, basename: str, threads: Optional[int] = None, duration: Optional[float] = None,
+                       on_progress: Optional[Callable[[str, float], None]] = None,
+                       encoder_args: Sequence[str] = ()) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Encode the separated WAV stems in result_dir to MP3 (building missing waveform peaks alongside) and remove the WAVs.
+    encoder_args are extra libmp3lame options, e.g. the fast tier's.
+    Returns: (vocal_mp3_path, inst_mp3_path, error_message)
+    """
+    def report(stage: str, fraction: float) -> None:
+        if on_progress:
+            on_progress(stage, fraction)
+
+    # Set up file paths
+    vocal_wav_path = os.path.join(result_dir, "vocals.wav")
+    inst_wav_path = os.path.join(result_dir, "accompaniment.wav")
+    vocal_mp3_path, inst_mp3_path = stem_mp3_paths(result_dir, basename)
+
+    # Check if WAV files exist before conversion
+    if not os.path.exists(vocal_wav_path):
+        error_msg = f"Vocal WAV file not found at {vocal_wav_path}"
+        app_logger.error(error_msg)
+        return None, None, error_msg
+    if not os.path.exists(inst_wav_path):
+        error_msg = f"Instrumental WAV file not found at {inst_wav_path}"
+        app_logger.error(error_msg)
+        return None, None, error_msg
+
+    # Convert both stems to MP3 concurrently, reporting their average progress
+    encode_progress = [0.0, 0.0]
+
+    def encode_reporter(index: int) -> Callable[[float], None]:
+        def on_encode_progress(fraction: float) -> None:
+            encode_progress[index] = fraction
+            report("encoding", sum(encode_progress) / len(encode_progress))
+        return on_encode_progress
+
+    with profile_span("encode"), log_context(stage="encode"):
+        vocal_error, inst_error, _ = await asyncio.gather(
+            convert_wav_to_mp3(vocal_wav_path, vocal_mp3_path, threads, duration, encode_reporter(0),
+                               encoder_args=encoder_args),
+            convert_wav_to_mp3(inst_wav_path, inst_mp3_path, threads, duration, encode_reporter(1),
+                               encoder_args=encoder_args),
+            ensure_waveform_peaks(result_dir)
+        )
+    if vocal_error:
+        app_logger.error("Vocal conversion error: %s", vocal_error)
+        return None, None, vocal_error
+    if inst_error:
+        app_logger.error("Instrumental conversion error: %s", inst_error)
+        return None, None, inst_error
+    
+    # Clean up intermediate WAV files
+    cleanup_file(vocal_wav_path)
+    cleanup_file(inst_wav_path)
+    return vocal_mp3_path, inst_mp3_path, None
+
+
+async def ensure_waveform_peaks(result_dir: str) -> None:
+    """
+    Build the waveform peaks from the WAV stems if the separator did not write
+    them (Spleeter CLI, streamed separation). The player works without them,
+    so a failure is only logged.
+    """
+    if os.path.exists(os.path.join(result_dir, PEAKS_FILENAME)):
+        return
+    try:
+        with profile_span("peaks"):
+            await asyncio.to_thread(write_peaks_from_stems, result_dir)
+    except Exception as e:
+        app_logger.warning("Waveform peaks for %s skipped: %s", result_dir, e)
+
+
+async def process_youtube_progressive(youtube_url: str, max_size_mb: int, max_duration: int, upload_dir: str,
+                                      output_dir: str, spleeter_model: str,
+                                      separation_slot: Optional[SeparationSlot] = None,
+                                      on_progress: Optional[Callable[[str, float], None]] = None,
+                                      backend: str = "spleeter", model_dir: Optional[str] = None,
+                                      silence_threshold_db: Optional[float] = None,
+                                      on_silence_report: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                      process_stats: Optional[ProcessStats] = None,
+                                      downmix: bool = False,
+                                      encoder_args: Sequence[str] = ()) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str], Optional[str]]:
+    """
+    Progressive ingest: separate a YouTube video window by window while it downloads,
+    so the job takes about max(download, separation) instead of their sum.
+    The separation slot is taken before the download starts and held until it ends.
+    on_progress receives (stage, fraction) for "downloading", "separating" and "encoding".
+    Returns: (input_path, basename, vocal_mp3_path, inst_mp3_path, error_message)
+    """
+    def report(stage: str, fraction: float) -> None:
+        if on_progress:
+            on_progress(stage, fraction)
+
+    input_path = None
+    try:
+        with profile_span("youtube_info"):
+            video_info, error = await get_youtube_video_info(youtube_url)
+        if error:
+            app_logger.error("YouTube info error: %s", error)
+            return None, None, None, None, error
+        
+        # The duration has to be known up front: nothing is probed before separation starts
+        duration = video_info.get("duration")
+        if duration is None or duration > max_duration:
+            app_logger.warning("YouTube video duration too long: %ss > %ss", duration, max_duration)
+            return None, None, None, None, f"YouTube 영상 길이가 너무 깁니다. 최대 {max_duration}초까지 허용됩니다."
+        
+        basename = youtube_basename(video_info, youtube_url)
+        input_path = os.path.join(upload_dir, f"{basename}.mp3")
+        result_dir = os.path.join(output_dir, basename)
+        os.makedirs(result_dir, exist_ok=True)
+        
+        def on_separated(seconds: float) -> None:
+            report("separating", min(seconds / duration, 1.0) if duration else 0.0)
+        
+        start_time = time.time()
+        encode_threads = None
+        with profile_span("stream_separate", backend=backend) as separate_span:
+            on_report = silence_reporter(basename, separate_span, on_silence_report)
+            if separation_slot:
+                # The stream is always decoded to stereo
+                async with separation_slot(duration, 2) as cpu_allotment:
+                    app_logger.info("Starting progressive YouTube ingest: %s", basename)
+                    error = await stream_youtube_separation(
+                        youtube_url, input_path, result_dir, spleeter_model, cpu_allotment, backend, model_dir,
+                        max_size_mb, lambda fraction: report("downloading", fraction), on_separated,
+                        silence_threshold_db, on_report, process_stats, downmix
+                    )
+                    encode_threads = cpu_allotment.threads
+            else:
+                app_logger.info("Starting progressive YouTube ingest: %s", basename)
+                error = await stream_youtube_separation(
+                    youtube_url, input_path, result_dir, spleeter_model, None, backend, model_dir,
+                    max_size_mb, lambda fraction: report("downloading", fraction), on_separated,
+                    silence_threshold_db, on_report, process_stats, downmix
+                )
+        if error:
+            app_logger.error("Progressive ingest error: %s", error)
+            cleanup_file(input_path)
+            return None, None, None, None, error
+        app_logger.info("Download and separation of %s took %.2f seconds.", basename, time.time() - start_time)
+        report("separating", 1.0)
+        
+        vocal_mp3_path, inst_mp3_path, error = await encode_stems(
+            result_dir, basename, encode_threads, duration, on_progress, encoder_args
+        )
+        if error:
+            return None, None, None, None, error
+        
+        app_logger.info("Audio separation completed for: %s", basename)
+        return input_path, basename, vocal_mp3_path, inst_mp3_path, None
+        
+    except Exception as e:
+        cleanup_file(input_path)
+        app_logger.error("YouTube processing error: %s", e)
+        return None, None, None, None, f"YouTube URL 처리 중 예상치 못한 오류: {e}"
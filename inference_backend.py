@@ -0,0 +1,443 @@
+"""
+Optimized CPU inference for an exported Spleeter model (see model_export.py).
+
+Runs as its own process, like `python -m spleeter separate`:
+
+    python -m inference_backend separate --backend frozen --model-dir pretrained_models/2stems -o outputs song.mp3
+
+and writes <output_dir>/<input name>/<instrument>.wav in the same layout as Spleeter.
+
+With --silence-threshold-db, silent stretches (intros, outros, breaks) are
+found by a vectorized energy/onset pass and skipped: only the active regions
+go through the model, the gaps are zeros, and the stems keep the input's exact
+length. A "silence {json}" line on stdout reports how much audio was skipped.
+`separate` also writes the original's and stems' waveform peaks (waveform_peaks.py).
+With --downmix (the fast quality tier) the model sees one mono mix of the
+input and the stems are written as mono WAVs.
+
+`stream` separates float32 stereo PCM arriving on stdin window by window and
+appends each window to <output_dir>/<instrument>.wav, so separation can run
+while the audio is still being downloaded and decoded (any backend, including
+stock Spleeter run in-process). It prints "progress <seconds>" after each window.
+
+TensorFlow and numpy are imported lazily so the web server can import this module cheaply.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import wave
+from typing import Dict, List, Optional, Tuple, Any
+
+from waveform_peaks import PEAKS_FILENAME, TRACK_CODES, write_peaks
+
+
+MANIFEST_NAME = "optimized_model.json"
+SAMPLE_RATE = 44100
+# Interleaved stereo float32
+FRAME_BYTES = 8
+STREAM_WINDOW_SECONDS = 20.0
+# Each window also separates this much of the next one, to crossfade across the seam
+STREAM_OVERLAP_SECONDS = 1.0
+# "spleeter" runs the stock checkpoint through `python -m spleeter`
+BACKENDS = ("spleeter", "frozen", "int8")
+
+SILENCE_FRAME = 1024
+# Silences shorter than this are separated anyway: splitting would not pay off
+MIN_SILENCE_SECONDS = 1.0
+# Kept around every active frame: before it for soft attacks, after it for decays and reverb tails
+PRE_ROLL_SECONDS = 0.1
+POST_ROLL_SECONDS = 0.5
+# A frame this much louder than the previous one is an onset even below the threshold
+ONSET_RISE_DB = 9.0
+ONSET_FLOOR_DB = 20.0
+
+
+def load_manifest(model_dir: str) -> Optional[Dict[str, Any]]:
+    """Read the export manifest written by model_export.py, None if the model was not exported."""
+    try:
+        with open(os.path.join(model_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def resolve_backend(backend: str, model_dir: str, model: str, optimized_enabled: bool = False) -> str:
+    """
+    Get the backend that can actually run: an optimized backend that is not
+    enabled, or whose export is missing or was made from a different model,
+    falls back to stock Spleeter.
+    """
+    # Imported here: the separation subprocess must not open the app's log file
+    from logger import app_logger
+
+    if backend == "spleeter":
+        return backend
+    if backend not in BACKENDS:
+        app_logger.warning("Unknown separation backend '%s', using spleeter", backend)
+        return "spleeter"
+    if not optimized_enabled:
+        app_logger.warning("Backend '%s' needs ENABLE_OPTIMIZED_BACKENDS=true (validate it with "
+                           "`python model_export.py benchmark` first), using spleeter", backend)
+        return "spleeter"
+
+    manifest = load_manifest(model_dir)
+    model_file = manifest.get("frozen_graph" if backend == "frozen" else "int8_model") if manifest else None
+    if not model_file or not os.path.exists(os.path.join(model_dir, model_file)):
+        app_logger.warning("No %s export in %s (run `python model_export.py export`), using spleeter", backend, model_dir)
+        return "spleeter"
+    if manifest.get("model") != model:
+        app_logger.warning("Export in %s is for %s, not %s; using spleeter", model_dir, manifest.get("model"), model)
+        return "spleeter"
+    return backend
+
+
+def thread_count() -> int:
+    """Intra-op threads granted to this process by the worker slot (0 lets the runtime decide)."""
+    try:
+        return int(os.getenv("TF_NUM_INTRAOP_THREADS", "0"))
+    except ValueError:
+        return 0
+
+
+def decode_audio(path: str, sample_rate: int = SAMPLE_RATE):
+    """Decode any ffmpeg-readable file to a float32 (samples, 2) array."""
+    import numpy as np
+
+    cmd = ["ffmpeg", "-v", "error", "-i", path, "-f", "f32le", "-ac", "2", "-ar", str(sample_rate), "pipe:1"]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg decode failed: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, 2)
+
+
+def downmix_stereo(waveform):
+    """Mono mix of a (samples, 2) waveform, kept two-channel for the model's stereo input."""
+    import numpy as np
+
+    mono = waveform.mean(axis=1, keepdims=True, dtype=np.float32)
+    return np.repeat(mono, 2, axis=1)
+
+
+def write_wav(path: str, waveform, sample_rate: int = SAMPLE_RATE) -> None:
+    """Write a float (samples, channels) array as 16-bit PCM WAV."""
+    import numpy as np
+
+    pcm = (np.clip(waveform, -1.0, 1.0) * 32767.0).astype("<i2")
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(pcm.shape[1])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+
+
+class FrozenGraphSeparator:
+    """The checkpoint frozen into constants and optimized for inference, run with a plain Session."""
+
+    def __init__(self, model_dir: str, manifest: Dict[str, Any], threads: int = 0):
+        import tensorflow as tf
+
+        self.instruments = list(manifest["instruments"])
+        graph_def = tf.compat.v1.GraphDef()
+        with open(os.path.join(model_dir, manifest["frozen_graph"]), "rb") as f:
+            graph_def.ParseFromString(f.read())
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.compat.v1.import_graph_def(graph_def, name="")
+        config = tf.compat.v1.ConfigProto(
+            intra_op_parallelism_threads=threads,
+            inter_op_parallelism_threads=1 if 0 < threads <= 2 else 2
+        )
+        self.session = tf.compat.v1.Session(graph=self.graph, config=config)
+        self.input = self.graph.get_tensor_by_name(manifest["input"])
+        self.outputs = {
+            instrument: self.graph.get_tensor_by_name(tensor_name)
+            for instrument, tensor_name in manifest["outputs"].items()
+        }
+
+    def separate(self, waveform) -> Dict[str, Any]:
+        return self.session.run(self.outputs, feed_dict={self.input: waveform})
+
+
+class TFLiteSeparator:
+    """The int8 weight-quantized TFLite export; ops TFLite lacks (e.g. complex STFT math) run via the TF delegate."""
+
+    def __init__(self, model_dir: str, manifest: Dict[str, Any], threads: int = 0):
+        import tensorflow as tf
+
+        self.instruments = list(manifest["instruments"])
+        self.interpreter = tf.lite.Interpreter(
+            model_path=os.path.join(model_dir, manifest["int8_model"]),
+            num_threads=threads or None
+        )
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        # The converter keeps outputs in the order they were exported
+        output_details = self.interpreter.get_output_details()
+        self.output_indices = {
+            instrument: detail["index"] for instrument, detail in zip(manifest["instruments"], output_details)
+        }
+
+    def separate(self, waveform) -> Dict[str, Any]:
+        self.interpreter.resize_tensor_input(self.input_index, list(waveform.shape), strict=False)
+        self.interpreter.allocate_tensors()
+        self.interpreter.set_tensor(self.input_index, waveform)
+        self.interpreter.invoke()
+        return {instrument: self.interpreter.get_tensor(index) for instrument, index in self.output_indices.items()}
+
+
+class StockSeparator:
+    """Stock Spleeter run in-process on waveforms (the checkpoint is found through MODEL_PATH)."""
+
+    def __init__(self, model: str):
+        from spleeter.separator import Separator
+        from spleeter.utils.configuration import load_configuration
+
+        self.instruments = list(load_configuration(model)["instrument_list"])
+        self.separator = Separator(model, multiprocess=False)
+
+    def separate(self, waveform) -> Dict[str, Any]:
+        return self.separator.separate(waveform)
+
+
+def load_separator(backend: str, model_dir: Optional[str], threads: int = 0, model: str = "spleeter:2stems"):
+    """Load the in-process runtime for a backend."""
+    if backend == "spleeter":
+        return StockSeparator(model)
+    manifest = load_manifest(model_dir)
+    if not manifest:
+        raise RuntimeError(f"No exported model in {model_dir}")
+    if backend == "frozen":
+        return FrozenGraphSeparator(model_dir, manifest, threads)
+    if backend == "int8":
+        return TFLiteSeparator(model_dir, manifest, threads)
+    raise ValueError(f"Unsupported backend: {backend}")
+
+
+def find_active_regions(waveform, threshold_db: float, sample_rate: int = SAMPLE_RATE,
+                        min_silence_seconds: float = MIN_SILENCE_SECONDS) -> List[Tuple[int, int]]:
+    """
+    Find the (start, end) sample ranges that are not silent. A frame is active
+    if its RMS is above threshold_db (dBFS) or it is an onset, a sharp rise in
+    level from near silence; active frames are widened by the pre/post roll and
+    silences shorter than min_silence_seconds are bridged.
+    """
+    import numpy as np
+
+    length = len(waveform)
+    if not length:
+        return []
+    frames = -(-length // SILENCE_FRAME)
+    power = np.zeros(frames * SILENCE_FRAME, dtype=np.float64)
+    power[:length] = np.square(waveform, dtype=np.float64).mean(axis=1)
+    level_db = 10.0 * np.log10(power.reshape(frames, SILENCE_FRAME).mean(axis=1) + 1e-12)
+
+    onsets = (np.diff(level_db, prepend=level_db[0]) > ONSET_RISE_DB) & (level_db > threshold_db - ONSET_FLOOR_DB)
+    active = (level_db > threshold_db) | onsets
+
+    # Widen every active frame: frame i stays active if any frame in [i - post, i + pre] is
+    pre = int(np.ceil(PRE_ROLL_SECONDS * sample_rate / SILENCE_FRAME))
+    post = int(np.ceil(POST_ROLL_SECONDS * sample_rate / SILENCE_FRAME))
+    counts = np.concatenate([[0], np.cumsum(active)])
+    index = np.arange(frames)
+    active = counts[np.minimum(index + pre + 1, frames)] - counts[np.maximum(index - post, 0)] > 0
+
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], active.astype(np.int8), [0]])))
+    regions: List[Tuple[int, int]] = []
+    min_gap = int(np.ceil(min_silence_seconds * sample_rate / SILENCE_FRAME))
+    for start, end in zip(edges[::2], edges[1::2]):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return [(start * SILENCE_FRAME, min(end * SILENCE_FRAME, length)) for start, end in regions]
+
+
+def separate_active(separator, waveform, threshold_db: Optional[float] = None,
+                    sample_rate: int = SAMPLE_RATE) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Separate only the active regions of waveform and splice them into silent
+    stems of exactly the input length. threshold_db None separates everything.
+    Returns: (stems, report)
+    """
+    import numpy as np
+
+    length = len(waveform)
+    regions = [(0, length)] if threshold_db is None else find_active_regions(waveform, threshold_db, sample_rate)
+    inferred = sum(end - start for start, end in regions)
+    report = {
+        "audio_seconds": round(length / sample_rate, 3),
+        "inferred_seconds": round(inferred / sample_rate, 3),
+        "skipped_seconds": round((length - inferred) / sample_rate, 3),
+        "regions": len(regions)
+    }
+
+    if regions == [(0, length)]:
+        stems = separator.separate(waveform)
+        return {instrument: np.asarray(stem)[:length] for instrument, stem in stems.items()}, report
+
+    stems = {instrument: np.zeros(waveform.shape, dtype=np.float32) for instrument in separator.instruments}
+    for start, end in regions:
+        for instrument, stem in separator.separate(np.ascontiguousarray(waveform[start:end])).items():
+            stem = np.asarray(stem)[:end - start]
+            stems[instrument][start:start + len(stem)] = stem
+    return stems, report
+
+
+def separate_file(separator, input_path: str, output_dir: str, sample_rate: int = SAMPLE_RATE,
+                  silence_threshold_db: Optional[float] = None,
+                  downmix: bool = False) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Separate one file and write <output_dir>/<input name>/<instrument>.wav
+    (mono if downmix).
+    Returns: (written paths, silence report)
+    """
+    import numpy as np
+
+    waveform = decode_audio(input_path, sample_rate)
+    analysis = downmix_stereo(waveform) if downmix else waveform
+    stems, report = separate_active(separator, analysis, silence_threshold_db, sample_rate)
+    channels = 1 if downmix else 2
+
+    result_dir = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0])
+    os.makedirs(result_dir, exist_ok=True)
+    written = []
+    for instrument, stem in stems.items():
+        path = os.path.join(result_dir, f"{instrument}.wav")
+        write_wav(path, np.asarray(stem)[:len(waveform), :channels], sample_rate)
+        written.append(path)
+    try:
+        # The player's waveforms, while the decoded original is still at hand
+        tracks = {"o": waveform, **{TRACK_CODES[i]: stems[i] for i in stems if i in TRACK_CODES}}
+        write_peaks(os.path.join(result_dir, PEAKS_FILENAME), tracks, sample_rate)
+    except Exception as e:
+        print(f"waveform peaks skipped: {e}", file=sys.stderr)
+    return written, report
+
+
+def stream_separate(separator, source, result_dir: str, sample_rate: int = SAMPLE_RATE,
+                    window_seconds: float = STREAM_WINDOW_SECONDS,
+                    overlap_seconds: float = STREAM_OVERLAP_SECONDS,
+                    silence_threshold_db: Optional[float] = None,
+                    downmix: bool = False) -> Dict[str, Any]:
+    """
+    Separate PCM from a blocking binary stream one window at a time, appending
+    every window to <result_dir>/<instrument>.wav (mono if downmix) as soon as it is separated.
+    Returns: silence report over the whole stream (skipped time counts the
+    overlap separated twice once per window)
+    """
+    import numpy as np
+
+    window = int(window_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+    fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+    channels = 1 if downmix else 2
+    os.makedirs(result_dir, exist_ok=True)
+
+    writers: Dict[str, wave.Wave_write] = {}
+    tails: Dict[str, Any] = {}
+    buffer = np.zeros((0, 2), dtype=np.float32)
+    written = 0
+    totals = {"inferred_seconds": 0.0, "skipped_seconds": 0.0, "regions": 0}
+    try:
+        while True:
+            wanted = (window + overlap - len(buffer)) * FRAME_BYTES
+            # Blocks until the window is full or the stream ends
+            data = source.read(wanted)
+            usable = len(data) - len(data) % FRAME_BYTES
+            if usable:
+                buffer = np.concatenate([buffer, np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, 2)])
+            final = len(data) < wanted
+            if not len(buffer):
+                break
+
+            analysis = downmix_stereo(buffer) if downmix else buffer
+            stems, report = separate_active(separator, analysis, silence_threshold_db, sample_rate)
+            for key in totals:
+                totals[key] += report[key]
+            emit = len(buffer) if final else window
+            for instrument, stem in stems.items():
+                stem = np.array(stem, dtype=np.float32)[:len(buffer), :channels]
+                tail = tails.get(instrument)
+                if tail is not None:
+                    seam = min(len(tail), len(stem))
+                    stem[:seam] = tail[:seam] * (1.0 - fade_in[:seam]) + stem[:seam] * fade_in[:seam]
+                tails[instrument] = stem[emit:emit + overlap]
+
+                if instrument not in writers:
+                    writer = wave.open(os.path.join(result_dir, f"{instrument}.wav"), "wb")
+                    writer.setnchannels(channels)
+                    writer.setsampwidth(2)
+                    writer.setframerate(sample_rate)
+                    writers[instrument] = writer
+                pcm = (np.clip(stem[:emit], -1.0, 1.0) * 32767.0).astype("<i2")
+                writers[instrument].writeframes(pcm.tobytes())
+
+            written += emit
+            print(f"progress {written / sample_rate:.2f}", flush=True)
+            if final:
+                break
+            # The overlap is separated again as the head of the next window
+            buffer = buffer[emit:]
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    if not written:
+        raise RuntimeError("no audio received")
+    return {
+        "audio_seconds": round(written / sample_rate, 3),
+        "inferred_seconds": round(totals["inferred_seconds"], 3),
+        "skipped_seconds": round(totals["skipped_seconds"], 3),
+        "regions": totals["regions"]
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Separate audio with an optimized Spleeter export")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    separate = subparsers.add_parser("separate", help="separate audio files")
+    separate.add_argument("--backend", choices=BACKENDS, required=True)
+    separate.add_argument("--model", default="spleeter:2stems", help="Spleeter model (spleeter backend)")
+    separate.add_argument("--model-dir", default=None, help="directory holding the export manifest")
+    separate.add_argument("-o", "--output-dir", required=True)
+    separate.add_argument("--silence-threshold-db", type=float, default=None,
+                          help="skip regions quieter than this (dBFS), e.g. -50")
+    separate.add_argument("--downmix", action="store_true", help="separate a mono mix, write mono stems")
+    separate.add_argument("inputs", nargs="+")
+
+    stream = subparsers.add_parser("stream", help="separate float32 stereo PCM from stdin window by window")
+    stream.add_argument("--backend", choices=BACKENDS, required=True)
+    stream.add_argument("--model", default="spleeter:2stems", help="Spleeter model (spleeter backend)")
+    stream.add_argument("--model-dir", default=None, help="directory holding the export manifest")
+    stream.add_argument("-o", "--output-dir", required=True, help="directory receiving <instrument>.wav")
+    stream.add_argument("--window-seconds", type=float, default=STREAM_WINDOW_SECONDS)
+    stream.add_argument("--overlap-seconds", type=float, default=STREAM_OVERLAP_SECONDS)
+    stream.add_argument("--silence-threshold-db", type=float, default=None,
+                        help="skip regions quieter than this (dBFS), e.g. -50")
+    stream.add_argument("--downmix", action="store_true", help="separate a mono mix, write mono stems")
+    args = parser.parse_args(argv)
+    if args.backend != "spleeter" and not args.model_dir:
+        parser.error(f"--model-dir is required for the {args.backend} backend")
+
+    try:
+        separator = load_separator(args.backend, args.model_dir, thread_count(), args.model)
+        if args.command == "stream":
+            report = stream_separate(separator, sys.stdin.buffer, args.output_dir,
+                                     window_seconds=args.window_seconds, overlap_seconds=args.overlap_seconds,
+                                     silence_threshold_db=args.silence_threshold_db, downmix=args.downmix)
+            print(f"silence {json.dumps(report)}", flush=True)
+        else:
+            for input_path in args.inputs:
+                _, report = separate_file(separator, input_path, args.output_dir,
+                                          silence_threshold_db=args.silence_threshold_db, downmix=args.downmix)
+                print(f"silence {json.dumps(report)}", flush=True)
+    except Exception as e:
+        print(f"Separation failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from config_manager import config_manager
+from logger import app_logger
+
+# Measurements of removed tasks kept through compaction to calibrate the estimators after a restart
+CALIBRATION_KINDS = ("memory", "costs")
+CALIBRATION_SAMPLES = 100
+
+
+class JobJournal:
+    """
+    Write-ahead log of task state transitions, one JSON record per line.
+    Each record carries only the fields that changed; replaying the file folds
+    them into the latest state of every task. record() only queues the line: a
+    writer thread appends and fsyncs everything queued in one batch, so the
+    event loop never waits on the disk and a crash loses at most the last batch.
+    An empty path disables the journal.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.enabled = bool(path)
+        # Held while the file is written or replaced
+        self.lock = threading.Lock()
+        self.file = None
+        self.records_written = 0
+        # Lines waiting for the writer thread
+        self.condition = threading.Condition()
+        self.pending: List[str] = []
+        self.writing = False
+        self.writer: Optional[threading.Thread] = None
+
+    def _open(self):
+        if self.file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(self.path, "a+", encoding="utf-8")
+            # Start on a fresh line if a crash left a torn record at the end
+            if self.file.tell() > 0:
+                self.file.seek(self.file.tell() - 1)
+                if self.file.read(1) != "\n":
+                    self.file.write("\n")
+        return self.file
+
+    def record(self, task_id: str, event: str, **fields: Any) -> None:
+        """Queue one transition for the writer thread; failures are logged, never raised into the pipeline."""
+        if not self.enabled:
+            return
+        line = json.dumps({"task_id": task_id, "event": event, "ts": time.time(), **fields}, ensure_ascii=False)
+        with self.condition:
+            self.pending.append(line)
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._write_loop, name="job-journal", daemon=True)
+                self.writer.start()
+            self.condition.notify_all()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                lines, self.pending = self.pending, []
+                self.writing = True
+            try:
+                with self.lock:
+                    f = self._open()
+                    f.write("".join(line + "\n" for line in lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self.records_written += len(lines)
+            except OSError as e:
+                app_logger.error("Failed to write %s job journal records: %s", len(lines), e)
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued record is on disk. Returns False on timeout."""
+        if not self.enabled:
+            return True
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.writing, timeout)
+
+    def replay(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+        """
+        Fold the journal into {task_id: state}, skipping a torn or corrupt line.
+        Returns: (states, calibration samples of removed tasks by kind)
+        """
+        if not self.enabled:
+            return {}, {kind: [] for kind in CALIBRATION_KINDS}
+        self.flush()
+        with self.lock:
+            states, calibration = self._fold()
+        app_logger.info("Replayed job journal: %s tasks", len(states))
+        return states, calibration
+
+    def _fold(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+        states: Dict[str, Dict[str, Any]] = {}
+        calibration: Dict[str, List[Dict[str, Any]]] = {kind: [] for kind in CALIBRATION_KINDS}
+        if not os.path.exists(self.path):
+            return states, calibration
+
+        skipped = 0
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    task_id = record.pop("task_id")
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    skipped += 1
+                    continue
+                event = record.pop("event", None)
+                record.pop("ts", None)
+                if event == "calibration":
+                    for kind in CALIBRATION_KINDS:
+                        calibration[kind].extend(record.get(kind) or [])
+                elif event == "removed":
+                    removed = states.pop(task_id, None) or {}
+                    for kind in CALIBRATION_KINDS:
+                        if removed.get(kind):
+                            calibration[kind].append(removed[kind])
+                elif event == "snapshot":
+                    states[task_id] = record
+                else:
+                    states.setdefault(task_id, {}).update(record)
+        if skipped:
+            app_logger.warning("Skipped %s unreadable job journal lines", skipped)
+        return states, {kind: samples[-CALIBRATION_SAMPLES:] for kind, samples in calibration.items()}
+
+    def compact(self) -> int:
+        """
+        Atomically replace the journal with one snapshot record per live task,
+        after one record with the measurements of the removed ones.
+        Returns: number of tasks kept
+        """
+        if not self.enabled:
+            return 0
+        self.flush()
+        with self.lock:
+            temp_path = f"{self.path}.tmp"
+            try:
+                states, calibration = self._fold()
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    if any(calibration.values()):
+                        record = {"task_id": "", "event": "calibration", "ts": time.time(), **calibration}
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    for task_id, state in states.items():
+                        record = {"task_id": task_id, "event": "snapshot", "ts": time.time(), **state}
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                os.replace(temp_path, self.path)
+                self.records_written = 0
+                return len(states)
+            except OSError as e:
+                app_logger.error("Failed to compact job journal: %s", e)
+                return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        size = os.path.getsize(self.path) if self.enabled and os.path.exists(self.path) else 0
+        return {"enabled": self.enabled, "path": self.path, "bytes": size, "records_since_compaction": self.records_written}
+
+
+# Global job journal
+job_journal = JobJournal(config_manager.get_job_journal_path())
@@ -0,0 +1,455 @@
+"""
+Local load-testing harness for the FastAPI app.
+
+Drives /upload, /api/task polling and /download in-process over ASGI while
+the separation, encoding and yt-dlp stages are replaced by stubs with
+configurable latency, so scheduler and API changes can be measured without
+models or network.
+
+    python loadtest.py --jobs 200 --clients 50 --rate 10 --separate-latency 3
+
+Custom stubs: subclass StubBackend and pass --stubs mymodule:MyBackend.
+--remote-workers N separates on N worker.py workers leasing jobs over ASGI.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+import wave
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def write_silent_wav(path: str, channels: int, frames: int = 1024) -> None:
+    """A short silent 16-bit stem, valid enough for the real peaks code to read."""
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(44100)
+        wav_file.writeframes(b"\0" * (frames * channels * 2))
+
+
+class StubBackend:
+    """Stand-ins for ffprobe, yt-dlp, Spleeter and ffmpeg with configurable latency."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+
+    def _latency(self, mean: float) -> float:
+        jitter = self.args.jitter
+        return max(0.0, random.uniform(mean * (1 - jitter), mean * (1 + jitter)))
+
+    def _separate_latency(self, downmix: bool) -> float:
+        # Downmixed separations are the fast quality tier
+        return self._latency(self.args.separate_latency / (self.args.fast_speedup if downmix else 1.0))
+
+    async def get_audio_duration(self, filepath: str) -> Optional[float]:
+        await asyncio.sleep(self._latency(self.args.probe_latency))
+        return self.args.audio_seconds
+
+    async def get_audio_info(self, filepath: str) -> Tuple[Optional[float], Optional[int]]:
+        return await self.get_audio_duration(filepath), 2
+
+    async def get_youtube_video_info(self, url: str) -> Tuple[Optional[dict], Optional[str]]:
+        await asyncio.sleep(self._latency(self.args.probe_latency))
+        return {"title": f"load {url.rsplit('=', 1)[-1]}", "duration": self.args.audio_seconds}, None
+
+    async def download_youtube_audio(self, url: str, output_path: str, on_progress=None) -> Optional[str]:
+        steps = 10
+        delay = self._latency(self.args.download_latency) / steps
+        for step in range(1, steps + 1):
+            await asyncio.sleep(delay)
+            if on_progress:
+                on_progress(step / steps)
+        with open(output_path, "wb") as f:
+            f.write(os.urandom(int(self.args.file_size_mb * 1024 * 1024)))
+        return None
+
+    async def separate_audio_with_spleeter(self, input_path: str, output_dir: str,
+                                           model: str = "spleeter:2stems", cpu_allotment=None,
+                                           backend: str = "spleeter", model_dir: Optional[str] = None,
+                                           silence_threshold_db: Optional[float] = None,
+                                           on_silence_report=None, process_stats=None,
+                                           downmix: bool = False) -> Optional[str]:
+        await asyncio.sleep(self._separate_latency(downmix))
+        result_dir = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0])
+        os.makedirs(result_dir, exist_ok=True)
+        for stem in ("vocals", "accompaniment"):
+            write_silent_wav(os.path.join(result_dir, f"{stem}.wav"), 1 if downmix else 2)
+        return None
+
+    async def stream_youtube_separation(self, url: str, original_path: str, result_dir: str,
+                                        model: str = "spleeter:2stems", cpu_allotment=None,
+                                        backend: str = "spleeter", model_dir: Optional[str] = None,
+                                        max_size_mb: Optional[int] = None,
+                                        on_download_progress=None, on_separation_progress=None,
+                                        silence_threshold_db: Optional[float] = None,
+                                        on_silence_report=None, process_stats=None,
+                                        downmix: bool = False) -> Optional[str]:
+        # Download and separation overlap, so the slower of the two sets the pace
+        steps = 10
+        download_delay = self._latency(self.args.download_latency) / steps
+        separate_delay = self._separate_latency(downmix) / steps
+        for step in range(1, steps + 1):
+            await asyncio.sleep(max(download_delay, separate_delay))
+            if on_download_progress:
+                on_download_progress(step / steps)
+            if on_separation_progress:
+                on_separation_progress(self.args.audio_seconds * step / steps)
+        with open(original_path, "wb") as f:
+            f.write(os.urandom(int(self.args.file_size_mb * 1024 * 1024)))
+        for stem in ("vocals", "accompaniment"):
+            write_silent_wav(os.path.join(result_dir, f"{stem}.wav"), 1 if downmix else 2)
+        return None
+
+    async def convert_wav_to_mp3(self, wav_path: str, mp3_path: str, threads=None,
+                                 duration=None, on_progress=None, encoder_args=()) -> Optional[str]:
+        await asyncio.sleep(self._latency(self.args.encode_latency))
+        with open(mp3_path, "wb") as f:
+            f.write(os.urandom(int(self.args.output_size_mb * 1024 * 1024)))
+        if on_progress:
+            on_progress(1.0)
+        return None
+
+    def install(self) -> None:
+        """Replace the tool wrappers the pipeline calls with this backend's methods."""
+        import file_handlers
+        for name in ("get_audio_duration", "get_audio_info", "get_youtube_video_info", "download_youtube_audio",
+                     "separate_audio_with_spleeter", "stream_youtube_separation", "convert_wav_to_mp3"):
+            setattr(file_handlers, name, getattr(self, name))
+
+
+class AsgiClient:
+    """Minimal in-process HTTP client speaking ASGI directly to the app."""
+
+    def __init__(self, app, chunk_size: int = 64 * 1024):
+        self.app = app
+        self.chunk_size = chunk_size
+
+    async def request(self, method: str, url: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None,
+                      client: Optional[Tuple[str, int]] = ("127.0.0.1", 50000)) -> Tuple[int, Dict[str, str], bytes]:
+        path, _, query = url.partition("?")
+        headers = dict(headers or {})
+        headers.setdefault("host", "loadtest")
+        headers["content-length"] = str(len(body))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "",
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+            "client": client, "server": ("loadtest", 80),
+        }
+        offsets = list(range(0, len(body), self.chunk_size)) or [0]
+        pending = iter(offsets)
+        status = 0
+        response_headers: Dict[str, str] = {}
+        chunks: List[bytes] = []
+
+        async def receive():
+            offset = next(pending, None)
+            if offset is None:
+                # Nothing more to send; park until the app stops listening for disconnects
+                await asyncio.Event().wait()
+            end = offset + self.chunk_size
+            return {"type": "http.request", "body": body[offset:end], "more_body": end < len(body)}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers.update({k.decode("latin-1"): v.decode("latin-1") for k, v in message.get("headers", [])})
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, response_headers, b"".join(chunks)
+
+
+class AsgiTransport:
+    """
+    Worker transport that talks to the in-process app instead of a socket.
+    Requests carry no client address, like a worker on the Unix socket.
+    """
+
+    def __init__(self, client: AsgiClient):
+        self.client = client
+
+    async def request(self, method: str, path: str, body: bytes = b"",
+                      headers: Optional[Dict[str, str]] = None, body_file: Optional[str] = None,
+                      response_file: Optional[str] = None) -> Tuple[int, Dict[str, str], bytes]:
+        if body_file:
+            with open(body_file, "rb") as f:
+                body = f.read()
+        status, response_headers, content = await self.client.request(method, path, body, headers, client=None)
+        if response_file and status == 200:
+            with open(response_file, "wb") as f:
+                f.write(content)
+            return status, response_headers, b""
+        return status, response_headers, content
+
+
+def build_multipart(fields: Dict[str, str], files: Dict[str, Tuple[str, bytes, str]]) -> Tuple[bytes, str]:
+    """Encode form fields and files as multipart/form-data; returns (body, content_type)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+    return {
+        "count": len(values),
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(max(values) if values else None),
+    }
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, app, task_manager):
+        self.args = args
+        self.client = AsgiClient(app)
+        self.task_manager = task_manager
+        self.statuses: Dict[str, int] = {}
+        self.outcomes: Dict[str, int] = {}
+        self.upload_latency: List[float] = []
+        self.status_latency: List[float] = []
+        self.download_latency: List[float] = []
+        self.end_to_end: List[float] = []
+        self.queue_wait: List[float] = []
+        self.app_loop_lag: List[float] = []
+        self.pipeline_loop_lag: List[float] = []
+        self.running = True
+
+    def instrument_scheduler(self) -> None:
+        """Record how long each job waits for a separation slot."""
+        scheduler = self.task_manager.scheduler
+        original_slot = scheduler.slot
+        queue_wait = self.queue_wait
+
+        @asynccontextmanager
+        async def timed_slot(task_id: str, *args, **kwargs):
+            wait_start = time.perf_counter()
+            async with original_slot(task_id, *args, **kwargs) as cpu_allotment:
+                queue_wait.append(time.perf_counter() - wait_start)
+                yield cpu_allotment
+
+        scheduler.slot = timed_slot
+
+    async def monitor_lag(self, samples: List[float], interval: float = 0.01) -> None:
+        while self.running:
+            tick = time.perf_counter()
+            await asyncio.sleep(interval)
+            samples.append(max(0.0, time.perf_counter() - tick - interval))
+
+    async def run_client(self, index: int) -> None:
+        args = self.args
+        client_addr = (f"10.0.{index // 250}.{index % 250 + 1}", 40000 + index)
+        if random.random() < args.youtube_ratio:
+            body, content_type = build_multipart({"youtube_url": f"https://www.youtube.com/watch?v=load{index}"}, {})
+        else:
+            content = os.urandom(int(args.file_size_mb * 1024 * 1024))
+            body, content_type = build_multipart({}, {"file": (f"load_{index}.mp3", content, "audio/mpeg")})
+
+        submitted = time.perf_counter()
+        status, _, payload = await self.client.request(
+            "POST", "/upload", body, {"content-type": content_type}, client=client_addr
+        )
+        self.upload_latency.append(time.perf_counter() - submitted)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if status != 200:
+            return
+
+        task_id = json.loads(payload)["task_id"]
+        while True:
+            await asyncio.sleep(args.poll_interval)
+            poll_start = time.perf_counter()
+            status, _, payload = await self.client.request("GET", f"/api/task/{task_id}", client=client_addr)
+            self.status_latency.append(time.perf_counter() - poll_start)
+            task = json.loads(payload)
+            if task["status"] in ("completed", "failed", "timeout"):
+                break
+
+        self.end_to_end.append(time.perf_counter() - submitted)
+        self.outcomes[task["status"]] = self.outcomes.get(task["status"], 0) + 1
+        if task["status"] == "completed" and args.download:
+            for url in (task["vocal_url"], task["inst_url"], task["original_url"]):
+                download_start = time.perf_counter()
+                await self.client.request("GET", url, client=client_addr)
+                self.download_latency.append(time.perf_counter() - download_start)
+
+    def start_workers(self) -> List[Any]:
+        """Run --remote-workers separation workers on this loop, leasing jobs through the app."""
+        from worker import SeparationWorker
+        workers = [
+            SeparationWorker(AsgiTransport(self.client), os.path.join(self.args.work_dir, f"worker_{index}"),
+                             worker_id=f"loadtest-{index}", lease_wait=0.5)
+            for index in range(self.args.remote_workers)
+        ]
+        return [(worker, asyncio.create_task(worker.run())) for worker in workers]
+
+    async def run(self) -> Dict[str, Any]:
+        self.instrument_scheduler()
+        workers = self.start_workers()
+        app_monitor = asyncio.create_task(self.monitor_lag(self.app_loop_lag))
+        pipeline_monitor = asyncio.run_coroutine_threadsafe(
+            self.monitor_lag(self.pipeline_loop_lag), self.task_manager.loop
+        )
+
+        concurrency = asyncio.Semaphore(self.args.clients)
+
+        async def session(index: int):
+            async with concurrency:
+                await self.run_client(index)
+
+        started = time.perf_counter()
+        sessions = []
+        for index in range(self.args.jobs):
+            sessions.append(asyncio.create_task(session(index)))
+            if self.args.rate > 0:
+                await asyncio.sleep(random.expovariate(self.args.rate))
+        await asyncio.gather(*sessions)
+        elapsed = time.perf_counter() - started
+
+        self.running = False
+        await app_monitor
+        await asyncio.wrap_future(pipeline_monitor)
+        for worker, _ in workers:
+            worker.stop()
+        await asyncio.gather(*(task for _, task in workers))
+
+        rejected = self.statuses.get("503", 0)
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "submissions": self.args.jobs,
+            "http_status": self.statuses,
+            "admission_rejections": rejected,
+            "rejection_rate": round(rejected / self.args.jobs, 4) if self.args.jobs else 0,
+            "outcomes": self.outcomes,
+            "throughput_jobs_per_s": round(self.outcomes.get("completed", 0) / elapsed, 3) if elapsed else None,
+            "upload_latency": summarize(self.upload_latency),
+            "queue_wait": summarize(self.queue_wait),
+            "end_to_end": summarize(self.end_to_end),
+            "status_endpoint": summarize(self.status_latency),
+            "download": summarize(self.download_latency),
+            "app_loop_lag": summarize(self.app_loop_lag),
+            "pipeline_loop_lag": summarize(self.pipeline_loop_lag),
+            "server_stats": self.task_manager.get_stats(),
+        }
+
+
+def load_backend(spec: Optional[str], args: argparse.Namespace) -> StubBackend:
+    if not spec:
+        return StubBackend(args)
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)(args)
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nElapsed: {report['elapsed_seconds']}s, submissions: {report['submissions']}, "
+          f"rejected: {report['admission_rejections']} ({report['rejection_rate']:.1%}), "
+          f"outcomes: {report['outcomes']}, throughput: {report['throughput_jobs_per_s']} jobs/s")
+    tiers = report["server_stats"]["quality_tiers"]["tiers"]
+    print("Quality tiers: " + ", ".join(f"{name} {tier['jobs']}" for name, tier in tiers.items()))
+    print(f"{'metric':<20}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    for key in ("upload_latency", "queue_wait", "end_to_end", "status_endpoint", "download",
+                "app_loop_lag", "pipeline_loop_lag"):
+        row = report[key]
+        print(f"{key:<20}{row['count']:>8}" + "".join(
+            f"{str(row[column]):>12}" for column in ("p50_ms", "p95_ms", "p99_ms", "max_ms")
+        ))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="In-process load test with stubbed separation")
+    parser.add_argument("--jobs", type=int, default=100, help="total submissions")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent client sessions")
+    parser.add_argument("--rate", type=float, default=10.0, help="arrival rate in submissions/s (0 = all at once)")
+    parser.add_argument("--youtube-ratio", type=float, default=0.3, help="fraction of submissions that are YouTube URLs")
+    parser.add_argument("--file-size-mb", type=float, default=5.0, help="uploaded/downloaded input size")
+    parser.add_argument("--output-size-mb", type=float, default=1.0, help="size of each stub MP3 stem")
+    parser.add_argument("--audio-seconds", type=float, default=180.0, help="duration reported by the stub probe")
+    parser.add_argument("--probe-latency", type=float, default=0.05)
+    parser.add_argument("--download-latency", type=float, default=2.0)
+    parser.add_argument("--separate-latency", type=float, default=3.0)
+    parser.add_argument("--encode-latency", type=float, default=0.5)
+    parser.add_argument("--fast-speedup", type=float, default=2.0, help="separation speedup of the fast quality tier")
+    parser.add_argument("--degrade-wait", type=int, help="override DEGRADE_WAIT_SECONDS")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative latency jitter")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="status polling interval (the UI uses 2s)")
+    parser.add_argument("--no-download", dest="download", action="store_false", help="skip fetching results")
+    parser.add_argument("--slots", type=int, help="override MAX_CONCURRENT_TASKS")
+    parser.add_argument("--max-queued", type=int, help="override MAX_QUEUED_TASKS")
+    parser.add_argument("--remote-workers", type=int, default=0,
+                        help="separate on this many in-process remote workers (REMOTE_SEPARATION)")
+    parser.add_argument("--stubs", help="custom backend as module:Class (subclass of StubBackend)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    random.seed(args.seed)
+
+    # The app wipes and reuses its working directories, so point it at scratch space
+    work_dir = tempfile.mkdtemp(prefix="loadtest_")
+    os.environ["UPLOAD_DIR"] = os.path.join(work_dir, "uploads")
+    os.environ["OUTPUT_DIR"] = os.path.join(work_dir, "outputs")
+    os.environ["JOB_JOURNAL_PATH"] = os.path.join(work_dir, "journal", "jobs.jsonl")
+    os.environ["WARMUP_ON_STARTUP"] = "false"
+    os.environ["LOG_LEVEL"] = args.log_level
+    if args.slots:
+        os.environ["MAX_CONCURRENT_TASKS"] = str(args.slots)
+    if args.degrade_wait is not None:
+        os.environ["DEGRADE_WAIT_SECONDS"] = str(args.degrade_wait)
+        # Stubbed separations load no model; a model name of its own keeps the fast tier enabled
+        os.environ.setdefault("FAST_TIER_MODEL", "loadtest:fast")
+    if args.max_queued:
+        os.environ["MAX_QUEUED_TASKS"] = str(args.max_queued)
+    if args.remote_workers:
+        os.environ["REMOTE_SEPARATION"] = "true"
+    args.work_dir = work_dir
+
+    try:
+        import main as app_module
+        load_backend(args.stubs, args).install()
+        report = asyncio.run(LoadTest(args, app_module.app, app_module.task_manager).run())
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
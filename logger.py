@@ -1,37 +1,152 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from datetime import datetime
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+
+# Task/stage tags picked up by every record logged in the current (async) context
+log_task_id: ContextVar[Optional[str]] = ContextVar("log_task_id", default=None)
+log_stage: ContextVar[Optional[str]] = ContextVar("log_stage", default=None)
+
+LOG_QUEUE_SIZE = 10000
+LAZY_ARG_TYPES = (str, int, float, bool, type(None))
+
+
+@contextmanager
+def log_context(task_id: Optional[str] = None, stage: Optional[str] = None):
+    """Tag records logged inside the block with task_id and/or stage."""
+    tokens = []
+    if task_id is not None:
+        tokens.append((log_task_id, log_task_id.set(task_id)))
+    if stage is not None:
+        tokens.append((log_stage, log_stage.set(stage)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the task/stage context onto the record in the calling thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "task_id"):
+            record.task_id = log_task_id.get()
+        if not hasattr(record, "stage"):
+            record.stage = log_stage.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hand records to the background writer without blocking the caller.
+    Messages are formatted by the writer thread unless their arguments could
+    change before then; records are dropped (and counted) when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not all(isinstance(arg, LAZY_ARG_TYPES) for arg in (args if isinstance(args, tuple) else (args,))):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, tagged with task_id and stage."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "task_id": getattr(record, "task_id", None),
+            "stage": getattr(record, "stage", None),
+            "thread": record.threadName,
+        }
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            data["suppressed"] = suppressed
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RateLimitedLogger(logging.LoggerAdapter):
+    """
+    Logger for hot paths: each message template is let through at most
+    `rate` times per `per_seconds`; the next record that passes carries the
+    number suppressed in between.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: int = 5, per_seconds: float = 1.0):
+        super().__init__(logger, {})
+        self.rate = rate
+        self.per_seconds = per_seconds
+        self.lock = threading.Lock()
+        self.buckets: Dict[str, Tuple[float, float, int]] = {}
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self.lock:
+            tokens, last, suppressed = self.buckets.get(msg, (float(self.rate), now, 0))
+            tokens = min(float(self.rate), tokens + (now - last) * self.rate / self.per_seconds)
+            if tokens < 1.0:
+                self.buckets[msg] = (tokens, now, suppressed + 1)
+                return
+            self.buckets[msg] = (tokens - 1.0, now, 0)
+        if suppressed:
+            kwargs["extra"] = dict(kwargs.get("extra") or {}, suppressed=suppressed)
+        self.logger.log(level, msg, *args, **kwargs)
 
 
 def setup_logger(name: str = "removevocal", level: str = None) -> logging.Logger:
-    """Setup application logger with file and console handlers."""
-    
+    """Setup application logger writing through a queue to background file and console handlers."""
+
     # Get log level from environment variable or use default
     if level is None:
         level = os.getenv('LOG_LEVEL', 'INFO')
-    
+
     # Create logger
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, level.upper(), logging.INFO))
-    
+
     # Prevent duplicate handlers
     if logger.handlers:
         return logger
-    
+
     # Create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
     console_formatter = logging.Formatter(
         '%(levelname)s - %(message)s'
     )
-    
+
     # Create logs directory if it doesn't exist
     logs_dir = "logs"
     os.makedirs(logs_dir, exist_ok=True)
-    
-    # File handler with rotation
+
+    # File handler with rotation, JSON lines
     file_handler = RotatingFileHandler(
         os.path.join(logs_dir, "app.log"),
         maxBytes=10*1024*1024,  # 10MB
@@ -39,19 +154,25 @@ def setup_logger(name: str = "removevocal", level: str = None) -> logging.Logger
         encoding='utf-8'  # UTF-8 인코딩 추가
     )
     file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(file_formatter)
-    
+    file_handler.setFormatter(JsonFormatter())
+
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(console_formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+
+    # Callers only enqueue; file and console I/O happen on the listener thread
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
     return logger
 
 
 # Global logger instance
-app_logger = setup_logger()
\ No newline at end of file
+app_logger = setup_logger()
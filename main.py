@@ -1,63 +1,134 @@
 from fastapi import FastAPI, Request, UploadFile, File, Form, Query, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from starlette.requests import ClientDisconnect
 from urllib.parse import unquote, quote
+import asyncio
+import hmac
+import logging
 import os
-import shutil
 import time
 import re
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
 
+from client_limits import CLIENT_LIMIT_ERROR, client_registry
 from config_manager import config_manager
 from audio_utils import (
     sanitize_filename, get_audio_duration, get_youtube_video_info,
     download_youtube_audio, separate_audio_with_spleeter, convert_wav_to_mp3,
     cleanup_files
 )
-from logger import app_logger
+from job_journal import job_journal
+from logger import app_logger, RateLimitedLogger
+from remix import MAX_GAIN, RemixError, ensure_stem_pcm, get_cached_remix, quantize_gain, remix_cache_path, stream_remix
+from startup import startup_state, prepare_directories, start_warmup
+from waveform_peaks import PEAKS_FILENAME, read_peaks_level
+from zip_stream import ZipEntry, ZIP_MAX_SIZE, stream_zip, zip_size
 
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 # Get configuration
-UPLOAD_DIR = config_manager.get_upload_dir()
-OUTPUT_DIR = config_manager.get_output_dir()
-MAX_FILE_SIZE_MB = config_manager.get_max_file_size_mb()
-MAX_DURATION_SECONDS = config_manager.get_max_duration_seconds()
-
-app_logger.info(f"Configuration: MAX_FILE_SIZE_MB={MAX_FILE_SIZE_MB}, MAX_DURATION_SECONDS={MAX_DURATION_SECONDS}")
-app_logger.info(f"Directories: UPLOAD_DIR={UPLOAD_DIR}, OUTPUT_DIR={OUTPUT_DIR}")
-
-# Clean up and create directories
-for directory in [UPLOAD_DIR, OUTPUT_DIR]:
-    if os.path.exists(directory):
-        # .gitkeep 파일을 제외하고 모든 파일 삭제
-        for filename in os.listdir(directory):
-            if filename != '.gitkeep':
-                file_path = os.path.join(directory, filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-        app_logger.info(f"Cleaned up directory: {directory}")
+with startup_state.phase("config"):
+    UPLOAD_DIR = config_manager.get_upload_dir()
+    OUTPUT_DIR = config_manager.get_output_dir()
+    MAX_FILE_SIZE_MB = config_manager.get_max_file_size_mb()
+    MAX_DURATION_SECONDS = config_manager.get_max_duration_seconds()
+
+app_logger.info("Configuration: MAX_FILE_SIZE_MB=%s, MAX_DURATION_SECONDS=%s", MAX_FILE_SIZE_MB, MAX_DURATION_SECONDS)
+app_logger.info("Directories: UPLOAD_DIR=%s, OUTPUT_DIR=%s", UPLOAD_DIR, OUTPUT_DIR)
+
+# /download is polled by every finished page; keep its log volume bounded
+download_logger = RateLimitedLogger(app_logger, rate=5, per_seconds=1.0)
+
+# Clean up and create directories; with the job journal on, cleanup waits for
+# recovery to know which files restored and resumed tasks still need
+with startup_state.phase("directories"):
+    prepare_directories([UPLOAD_DIR, OUTPUT_DIR], clean=not job_journal.enabled)
+
+@app.on_event("startup")
+def start_background_warmup():
+    """Warm up the separator in the background; /ready flips once it has run."""
+    if task_manager.work_queue:
+        app_logger.info("Separation runs on remote workers, marking service ready")
+        startup_state.mark_ready()
+    elif config_manager.get_warmup_enabled():
+        start_warmup(startup_state, task_manager.model_dir, config_manager.get_spleeter_model(),
+                     task_manager.separation_backend)
     else:
-        os.makedirs(directory, exist_ok=True)
-        app_logger.info(f"Created directory: {directory}")
+        app_logger.info("Warm-up disabled, marking service ready")
+        startup_state.mark_ready()
+
+@app.on_event("shutdown")
+def flush_job_journal():
+    """Let the journal writer get the last queued records to disk."""
+    if not job_journal.flush(timeout=5.0):
+        app_logger.warning("Job journal records still queued at shutdown")
 
 @app.get("/", response_class=HTMLResponse)
 def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request,
-                                                    "MAX_FILE_SIZE_MB": MAX_FILE_SIZE_MB,
-                                                    "MAX_DURATION_SECONDS": MAX_DURATION_SECONDS})
+                                                    "MAX_FILE_SIZE_MB": task_manager.max_file_size_mb,
+                                                    "MAX_DURATION_SECONDS": task_manager.max_duration_seconds})
+
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe: 200 only after the warm-up inference has completed; 503
+    until then, with degraded and warmup_error set while the warm-up keeps failing.
+    """
+    state = startup_state.to_dict()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+with startup_state.phase("task_manager"):
+    from file_handlers import save_upload, validate_file_upload, validate_youtube_url, process_audio_separation, stem_mp3_paths
+    from task_manager import task_manager, TaskStatus
+    from upload_sessions import upload_sessions, MAX_CHUNK_SIZE, UPLOAD_SESSION_LIMIT_ERROR
 
-from file_handlers import validate_file_upload, validate_youtube_url, process_audio_separation
-from task_manager import task_manager, TaskStatus
+if job_journal.enabled:
+    with startup_state.phase("recovery"):
+        task_manager.recover([UPLOAD_DIR, OUTPUT_DIR])
+
+def client_identity(request: Request) -> str:
+    """Identify the submitting client by configured API key or address."""
+    return client_registry.identify(
+        request.client.host if request.client else None,
+        request.headers.get("x-api-key"),
+        request.headers.get("x-forwarded-for")
+    )
+
+def submit_job(saved_upload, youtube_url: Optional[str], max_file_size_mb: int, max_duration_seconds: int,
+               profile: bool = False, client_id: str = "anonymous") -> JSONResponse:
+    """Create a task for a saved upload or YouTube URL and hand it to the pipeline."""
+    # Create task immediately with minimal info
+    task_id = task_manager.create_task_immediate()
+    
+    # Try to submit task for processing
+    if not task_manager.submit_task_with_input(task_id, saved_upload, youtube_url, max_file_size_mb, max_duration_seconds, UPLOAD_DIR,
+                                               profile=profile, client_id=client_id):
+        task = task_manager.get_task(task_id)
+        if task and task.error_message == CLIENT_LIMIT_ERROR:
+            return JSONResponse(status_code=429, content={"error": task.message})
+        # Task queue is full
+        return JSONResponse(
+            status_code=503,
+            content={"error": "서버가 바쁩니다. 잠시 후 다시 시도해주세요."}
+        )
+    
+    app_logger.info("Created immediate background task %s", task_id)
+    
+    # Return task_id immediately - no template rendering
+    return JSONResponse(content={
+        "task_id": task_id,
+        "message": "음성 분리 작업을 시작했습니다."
+    })
 
 @app.post("/upload")
 async def upload(request: Request, background_tasks: BackgroundTasks, 
-                file: UploadFile = File(None), youtube_url: str = Form(None)):
+                file: UploadFile = File(None), youtube_url: str = Form(None), profile: bool = Form(False)):
     """Handle file upload or YouTube URL processing for audio separation."""
     
     try:
@@ -70,32 +141,129 @@ async def upload(request: Request, background_tasks: BackgroundTasks,
                     content={"error": "파일을 업로드하거나 YouTube URL을 제공해주세요."}
                 )
         
-        # Create task immediately with minimal info
-        task_id = task_manager.create_task_immediate()
+        # Rate-limit before the upload is streamed to disk
+        client_id = client_identity(request)
+        error = client_registry.take_submission(client_id)
+        if error:
+            return JSONResponse(status_code=429, content={"error": error})
         
-        # Try to submit task for processing
-        if not task_manager.submit_task_with_input(task_id, file, youtube_url, MAX_FILE_SIZE_MB, MAX_DURATION_SECONDS, UPLOAD_DIR):
-            # Task queue is full
-            return JSONResponse(
-                status_code=503,
-                content={"error": "서버가 바쁩니다. 잠시 후 다시 시도해주세요."}
-            )
+        # Limits in force when the job is admitted apply for its whole run
+        max_file_size_mb = task_manager.max_file_size_mb
+        max_duration_seconds = task_manager.max_duration_seconds
         
-        app_logger.info(f"Created immediate background task {task_id}")
+        # Persist the upload now: UploadFile is closed as soon as this handler returns
+        saved_upload = None
+        if file and file.filename:
+            saved_upload, error = await save_upload(file, max_file_size_mb, UPLOAD_DIR)
+            if error:
+                return JSONResponse(status_code=400, content={"error": error})
         
-        # Return task_id immediately - no template rendering
-        return JSONResponse(content={
-            "task_id": task_id,
-            "message": "음성 분리 작업을 시작했습니다."
-        })
+        return submit_job(saved_upload, youtube_url, max_file_size_mb, max_duration_seconds, profile=profile,
+                          client_id=client_id)
         
     except Exception as e:
-        app_logger.error(f"Unexpected error during upload processing: {e}")
+        app_logger.error("Unexpected error during upload processing: %s", e)
         return JSONResponse(
             status_code=500,
             content={"error": f"예상치 못한 오류가 발생했습니다: {e}"}
         )
 
+class UploadSessionRequest(BaseModel):
+    filename: str = Field(..., min_length=1)
+    size: int = Field(..., gt=0)
+
+class UploadFinalizeRequest(BaseModel):
+    sha256: Optional[str] = None
+    profile: bool = False
+
+@app.post("/api/uploads")
+async def create_upload_session(body: UploadSessionRequest, request: Request):
+    """Start a resumable upload; chunks are then PUT at their byte offsets."""
+    # Rate-limited here, like /upload before its file is streamed: a session reserves disk
+    # for its full size, and finalizing it is the submission this charge stands for
+    client_id = client_identity(request)
+    error = client_registry.take_submission(client_id)
+    if error:
+        return JSONResponse(status_code=429, content={"error": error})
+    
+    session, error = await upload_sessions.create(body.filename, body.size, task_manager.max_file_size_mb, UPLOAD_DIR,
+                                                  client_id=client_id)
+    if error:
+        return JSONResponse(status_code=429 if error == UPLOAD_SESSION_LIMIT_ERROR else 400, content={"error": error})
+    return JSONResponse(content=session.to_dict())
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """Get which byte ranges of an upload are still missing, to resume it."""
+    session = upload_sessions.get(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return JSONResponse(content=session.to_dict())
+
+@app.put("/api/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Write one chunk of a resumable upload at the given byte offset."""
+    session = upload_sessions.get(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    
+    parts, size = [], 0
+    try:
+        async for part in request.stream():
+            size += len(part)
+            if size > MAX_CHUNK_SIZE:
+                return JSONResponse(status_code=413, content={"error": f"청크는 최대 {MAX_CHUNK_SIZE} bytes까지 허용됩니다."})
+            parts.append(part)
+    except ClientDisconnect:
+        # Nothing was written; the client resends this chunk
+        app_logger.debug("Upload session %s: client disconnected mid-chunk at offset %s", upload_id, offset)
+        return JSONResponse(status_code=400, content={"error": "청크 전송이 중단되었습니다."})
+    
+    error = await upload_sessions.write_chunk(session, offset, b"".join(parts))
+    if error:
+        return JSONResponse(status_code=400, content={"error": error})
+    return JSONResponse(content={
+        "upload_id": upload_id,
+        "received_bytes": session.received_bytes,
+        "complete": session.complete
+    })
+
+@app.post("/api/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, body: Optional[UploadFinalizeRequest] = None):
+    """Verify an assembled upload and start separating it."""
+    session = upload_sessions.get(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    body = body or UploadFinalizeRequest()
+    # Charged against the submission rate when the session was created
+    client_id = session.client_id
+    
+    # Limits in force when the job is admitted apply for its whole run
+    max_file_size_mb = task_manager.max_file_size_mb
+    max_duration_seconds = task_manager.max_duration_seconds
+    
+    saved_upload, error = await upload_sessions.finalize(session, body.sha256)
+    if error:
+        return JSONResponse(status_code=400, content={"error": error})
+    return submit_job(saved_upload, None, max_file_size_mb, max_duration_seconds, profile=body.profile,
+                      client_id=client_id)
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    """Abandon a resumable upload and delete its partial file."""
+    if not upload_sessions.discard(upload_id):
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return JSONResponse(content={"message": "Upload aborted"})
+
+@app.on_event("startup")
+async def start_upload_session_gc():
+    """Periodically discard resumable uploads that went idle."""
+    async def collect():
+        while True:
+            await asyncio.sleep(min(60, upload_sessions.ttl_seconds))
+            upload_sessions.cleanup_expired()
+    app.state.upload_gc_task = asyncio.create_task(collect())
+
 @app.get("/api/task/{task_id}")
 async def get_task_status(task_id: str):
     """Get task status and progress."""
@@ -103,19 +271,258 @@ async def get_task_status(task_id: str):
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    task_manager.refresh_eta(task)
     return JSONResponse(content=task.to_dict())
 
 @app.get("/api/stats")
 async def get_stats():
     """Get task manager statistics."""
-    return JSONResponse(content=task_manager.get_stats())
+    stats = task_manager.get_stats()
+    stats["upload_sessions"] = upload_sessions.get_stats()
+    stats["journal"] = job_journal.get_stats()
+    return JSONResponse(content=stats)
 
 @app.post("/api/cleanup")
 async def cleanup_old_tasks():
     """Clean up old tasks (admin endpoint)."""
-    task_manager.cleanup_old_tasks()
+    # Compacting the journal waits on the disk
+    await asyncio.to_thread(task_manager.cleanup_old_tasks)
     return JSONResponse(content={"message": "Cleanup completed"})
 
+ADMIN_TOKEN = config_manager.get_admin_token()
+
+def require_admin(request: Request):
+    """Reject admin requests without the admin token, or, with none configured, from anywhere but the Unix socket."""
+    if ADMIN_TOKEN:
+        if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+            raise HTTPException(status_code=401, detail="Invalid admin token")
+    elif request.client is not None:
+        raise HTTPException(status_code=401, detail="Admin token required")
+
+class RuntimeSettings(BaseModel):
+    """Settings changeable at runtime; omitted fields are left as they are."""
+    # Upper bounds keep a typo from building a 100000-thread pool or admitting unbounded work
+    max_concurrent_tasks: Optional[int] = Field(None, ge=1, le=64)
+    max_queued_tasks: Optional[int] = Field(None, ge=1, le=1000)
+    task_timeout_seconds: Optional[int] = Field(None, ge=1, le=86400)
+    max_file_size_mb: Optional[int] = Field(None, ge=1, le=2048)
+    max_duration_seconds: Optional[int] = Field(None, ge=1, le=7200)
+
+@app.get("/api/admin/config")
+async def get_runtime_config(request: Request):
+    """Get the current worker pool size, queue depth and limits (admin endpoint)."""
+    require_admin(request)
+    return JSONResponse(content=task_manager.get_runtime_settings())
+
+@app.post("/api/admin/config")
+def update_runtime_config(settings: RuntimeSettings, request: Request):
+    """Resize the worker pool and queue depth or change limits without a restart (admin endpoint)."""
+    require_admin(request)
+    applied = task_manager.reconfigure(**settings.model_dump(exclude_none=True))
+    return JSONResponse(content=applied)
+
+@app.get("/api/admin/tasks/{task_id}/profile")
+async def get_task_profile(task_id: str, request: Request, format: str = Query("folded", pattern="^(folded|json)$")):
+    """Download a task's profile as folded stacks (flame graph input) or a JSON span tree (admin endpoint)."""
+    require_admin(request)
+    profile = task_manager.get_profile(task_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="No profile recorded for this task")
+    
+    if format == "json":
+        return JSONResponse(content=profile.to_json())
+    return PlainTextResponse(
+        profile.to_folded(),
+        headers={"Content-Disposition": f'attachment; filename="{task_id}.folded"'}
+    )
+
+WORKER_TOKEN = config_manager.get_worker_token()
+# How often a waiting lease request checks the queue
+WORKER_POLL_SECONDS = 0.25
+STEM_INDEX = {"vocal": 0, "inst": 1}
+
+if task_manager.work_queue and not WORKER_TOKEN and not os.getenv("UNIX_SOCKET"):
+    app_logger.warning("REMOTE_SEPARATION without WORKER_TOKEN: only workers on the Unix socket will be accepted")
+
+def require_worker(request: Request):
+    """Reject requests from anything but an authenticated worker, or all of them without remote separation."""
+    if not task_manager.work_queue:
+        raise HTTPException(status_code=404, detail="Remote separation is disabled")
+    if WORKER_TOKEN:
+        if not hmac.compare_digest(request.headers.get("x-worker-token", ""), WORKER_TOKEN):
+            raise HTTPException(status_code=401, detail="Invalid worker token")
+    # Without a token only the Unix socket (no client address) is trusted: a loopback
+    # address may be a reverse proxy or any local process forwarding outside traffic
+    elif request.client is not None:
+        raise HTTPException(status_code=401, detail="Worker token required")
+
+def leased_job(job_id: str, lease_id: str):
+    """The job held by this lease, or 409 if it expired or went to another worker."""
+    item = task_manager.work_queue.get_leased(job_id, lease_id)
+    if not item:
+        raise HTTPException(status_code=409, detail="Lease expired or superseded")
+    return item
+
+class WorkerLeaseRequest(BaseModel):
+    worker_id: str = Field(..., min_length=1, max_length=128)
+    wait: float = Field(0.0, ge=0, le=30)
+
+class WorkerHeartbeat(BaseModel):
+    lease_id: str
+    stage: Optional[str] = None
+    fraction: Optional[float] = Field(None, ge=0, le=1)
+
+class WorkerCompletion(BaseModel):
+    lease_id: str
+    error: Optional[str] = None
+    silence_report: Optional[Dict[str, Any]] = None
+    memory_report: Optional[Dict[str, Any]] = None
+    # Measured "separate" and "encode" seconds; they calibrate the API node's cost model
+    stage_seconds: Optional[Dict[str, float]] = None
+
+@app.post("/api/worker/lease")
+async def lease_job(body: WorkerLeaseRequest, request: Request):
+    """Hand the next separation job to a worker, waiting up to `wait` seconds for one (204 if none)."""
+    require_worker(request)
+    deadline = time.monotonic() + body.wait
+    job = task_manager.work_queue.lease(body.worker_id)
+    while not job and time.monotonic() < deadline:
+        await asyncio.sleep(WORKER_POLL_SECONDS)
+        job = task_manager.work_queue.lease(body.worker_id)
+    if not job:
+        return Response(status_code=204)
+    return JSONResponse(content=job)
+
+@app.get("/api/worker/jobs/{job_id}/input")
+def get_job_input(job_id: str, request: Request, lease_id: str = Query(...)):
+    """Download a leased job's input file."""
+    require_worker(request)
+    item = leased_job(job_id, lease_id)
+    return FileResponse(item.input_path, media_type="application/octet-stream")
+
+@app.post("/api/worker/jobs/{job_id}/heartbeat")
+async def renew_job_lease(job_id: str, body: WorkerHeartbeat, request: Request):
+    """Renew a lease and report the worker's progress."""
+    require_worker(request)
+    if not task_manager.work_queue.heartbeat(job_id, body.lease_id, body.stage, body.fraction):
+        raise HTTPException(status_code=409, detail="Lease expired or superseded")
+    return JSONResponse(content={"lease_seconds": task_manager.work_queue.lease_seconds})
+
+@app.put("/api/worker/jobs/{job_id}/stems/{stem}")
+async def upload_job_stem(job_id: str, stem: str, request: Request, lease_id: str = Query(...)):
+    """Store one encoded stem (vocal or inst), or the waveform peaks, of a leased job in its output directory."""
+    require_worker(request)
+    if stem not in STEM_INDEX and stem != "peaks":
+        raise HTTPException(status_code=404, detail="Unknown stem")
+    item = leased_job(job_id, lease_id)
+    
+    if stem == "peaks":
+        path = os.path.join(item.result_dir, PEAKS_FILENAME)
+    else:
+        path = stem_mp3_paths(item.result_dir, item.params["basename"])[STEM_INDEX[stem]]
+    temp_path = f"{path}.{lease_id}.part"
+    max_bytes = task_manager.max_file_size_mb * 4 * 1024 * 1024
+    loop = asyncio.get_running_loop()
+    size = 0
+    
+    await asyncio.to_thread(os.makedirs, item.result_dir, exist_ok=True)
+    try:
+        with open(temp_path, "wb") as f:
+            async for part in request.stream():
+                size += len(part)
+                if size > max_bytes:
+                    return JSONResponse(status_code=413, content={"error": "Stem too large"})
+                # File writes block, so they run on the executor rather than the event loop
+                await loop.run_in_executor(None, f.write, part)
+        # A worker whose lease lapsed mid-upload must not replace the new worker's file
+        leased_job(job_id, lease_id)
+        await asyncio.to_thread(os.replace, temp_path, path)
+    except ClientDisconnect:
+        return JSONResponse(status_code=400, content={"error": "Upload interrupted"})
+    finally:
+        cleanup_files(temp_path)
+    return JSONResponse(content={"bytes": size})
+
+@app.post("/api/worker/jobs/{job_id}/complete")
+async def complete_job(job_id: str, body: WorkerCompletion, request: Request):
+    """Finish a leased job: its stems are in place, or it failed with `error`."""
+    require_worker(request)
+    item = leased_job(job_id, body.lease_id)
+    if not body.error and not all(os.path.exists(path) for path in stem_mp3_paths(item.result_dir, item.params["basename"])):
+        raise HTTPException(status_code=400, detail="Stems missing")
+    if not task_manager.work_queue.complete(job_id, body.lease_id, body.model_dump(exclude={"lease_id"})):
+        raise HTTPException(status_code=409, detail="Lease expired or superseded")
+    return JSONResponse(content={"message": "Job completed"})
+
+def decode_filename_param(f: str) -> str:
+    """Decode a URL-encoded filename query parameter."""
+    try:
+        return unquote(f, encoding='utf-8').strip()
+    except:
+        # If UTF-8 decoding fails, try other encodings or use original
+        try:
+            return unquote(f, encoding='cp949').strip()  # Korean encoding
+        except:
+            return f.strip()
+
+def resolve_download_path(clean_filename: str, t: str) -> Optional[Tuple[str, str]]:
+    """
+    Find the file for a download type: v=vocal, a=accompaniment, o=original.
+    Returns: (filepath, filename), or None if no matching file exists
+    """
+    # Build file paths based on type
+    if t == "v":
+        filename = f"{clean_filename}_Vocal.mp3"
+        filepath = os.path.join(OUTPUT_DIR, clean_filename, filename)
+    elif t == "a":
+        filename = f"{clean_filename}_Inst.mp3"
+        filepath = os.path.join(OUTPUT_DIR, clean_filename, filename)
+    elif t == "o":
+        filename = f"{clean_filename}.mp3"
+        filepath = os.path.join(UPLOAD_DIR, filename)
+    
+    app_logger.debug("Looking for file at: %s", filepath)
+    
+    # Check if file exists
+    if os.path.exists(filepath):
+        return filepath, filename
+    
+    download_logger.warning("File not found: %s", filepath)
+    
+    # Debug: List directory contents and try to find similar files
+    if t in ["v", "a"]:
+        output_subdir = os.path.join(OUTPUT_DIR, clean_filename)
+        if os.path.exists(output_subdir):
+            files_in_dir = os.listdir(output_subdir)
+            app_logger.debug("Files in %s: %s", output_subdir, files_in_dir)
+            
+            # Try to find the file with similar name pattern
+            target_suffix = "_Vocal.mp3" if t == "v" else "_Inst.mp3"
+            for file_in_dir in files_in_dir:
+                if file_in_dir.endswith(target_suffix):
+                    actual_filepath = os.path.join(output_subdir, file_in_dir)
+                    app_logger.debug("Found similar file: %s", actual_filepath)
+                    return actual_filepath, file_in_dir
+        else:
+            app_logger.debug("Output subdirectory does not exist: %s", output_subdir)
+            # Listing every output directory is only worth it when debugging
+            if app_logger.isEnabledFor(logging.DEBUG) and os.path.exists(OUTPUT_DIR):
+                app_logger.debug("Available output directories: %s", os.listdir(OUTPUT_DIR))
+                
+    elif t == "o":
+        if os.path.exists(UPLOAD_DIR):
+            files_in_upload = os.listdir(UPLOAD_DIR)
+            app_logger.debug("Files in %s: %s", UPLOAD_DIR, files_in_upload)
+            
+            # Try to find the original file
+            for file_in_upload in files_in_upload:
+                if file_in_upload.endswith('.mp3') and clean_filename in file_in_upload:
+                    actual_filepath = os.path.join(UPLOAD_DIR, file_in_upload)
+                    app_logger.debug("Found original file: %s", actual_filepath)
+                    return actual_filepath, file_in_upload
+    
+    return None
+
 @app.get("/download")
 def download(
     f: str = Query(..., description="Filename without extension"),
@@ -125,80 +532,20 @@ def download(
     
     try:
         # Decode URL-encoded filename and validate
-        try:
-            clean_filename = unquote(f, encoding='utf-8').strip()
-        except:
-            # If UTF-8 decoding fails, try other encodings or use original
-            try:
-                clean_filename = unquote(f, encoding='cp949').strip()  # Korean encoding
-            except:
-                clean_filename = f.strip()
+        clean_filename = decode_filename_param(f)
         
         if not clean_filename:
             app_logger.warning("Empty filename parameter after decoding")
             raise HTTPException(status_code=400, detail="Invalid filename parameter")
         
-        app_logger.info(f"Download request - filename: '{clean_filename}', type: '{t}'")
-        
-        # Build file paths based on type
-        if t == "v":
-            filename = f"{clean_filename}_Vocal.mp3"
-            filepath = os.path.join(OUTPUT_DIR, clean_filename, filename)
-        elif t == "a":
-            filename = f"{clean_filename}_Inst.mp3"
-            filepath = os.path.join(OUTPUT_DIR, clean_filename, filename)
-        elif t == "o":
-            filename = f"{clean_filename}.mp3"
-            filepath = os.path.join(UPLOAD_DIR, filename)
+        app_logger.debug("Download request - filename: '%s', type: '%s'", clean_filename, t)
         
-        app_logger.info(f"Looking for file at: {filepath}")
-        
-        # Check if file exists
-        if not os.path.exists(filepath):
-            app_logger.error(f"File not found: {filepath}")
-            
-            # Debug: List directory contents and try to find similar files
-            if t in ["v", "a"]:
-                output_subdir = os.path.join(OUTPUT_DIR, clean_filename)
-                if os.path.exists(output_subdir):
-                    files_in_dir = os.listdir(output_subdir)
-                    app_logger.info(f"Files in {output_subdir}: {files_in_dir}")
-                    
-                    # Try to find the file with similar name pattern
-                    target_suffix = "_Vocal.mp3" if t == "v" else "_Inst.mp3"
-                    for file_in_dir in files_in_dir:
-                        if file_in_dir.endswith(target_suffix):
-                            actual_filepath = os.path.join(output_subdir, file_in_dir)
-                            app_logger.info(f"Found similar file: {actual_filepath}")
-                            filepath = actual_filepath
-                            filename = file_in_dir
-                            break
-                else:
-                    app_logger.info(f"Output subdirectory does not exist: {output_subdir}")
-                    # Try to find directory with similar name
-                    if os.path.exists(OUTPUT_DIR):
-                        all_dirs = os.listdir(OUTPUT_DIR)
-                        app_logger.info(f"Available output directories: {all_dirs}")
-                        
-            elif t == "o":
-                if os.path.exists(UPLOAD_DIR):
-                    files_in_upload = os.listdir(UPLOAD_DIR)
-                    app_logger.info(f"Files in {UPLOAD_DIR}: {files_in_upload}")
-                    
-                    # Try to find the original file
-                    for file_in_upload in files_in_upload:
-                        if file_in_upload.endswith('.mp3') and clean_filename in file_in_upload:
-                            actual_filepath = os.path.join(UPLOAD_DIR, file_in_upload)
-                            app_logger.info(f"Found original file: {actual_filepath}")
-                            filepath = actual_filepath
-                            filename = file_in_upload
-                            break
-            
-            # Final check if we found an alternative file
-            if not os.path.exists(filepath):
-                raise HTTPException(status_code=404, detail="File not found")
+        resolved = resolve_download_path(clean_filename, t)
+        if not resolved:
+            raise HTTPException(status_code=404, detail="File not found")
+        filepath, filename = resolved
         
-        app_logger.info(f"Serving download: {filename}")
+        download_logger.info("Serving download: %s", filename)
         
         # Create a simple ASCII-safe filename for Content-Disposition
         safe_filename = "audio_download.mp3"
@@ -212,7 +559,121 @@ def download(
     except HTTPException:
         raise
     except Exception as e:
-        app_logger.error(f"Download error: {e}")
+        download_logger.error("Download error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
+
+@app.get("/peaks")
+def get_peaks(
+    request: Request,
+    f: str = Query(..., description="Filename without extension"),
+    t: str = Query(..., pattern="^[vao]$", description="Track: v=vocal, a=accompaniment, o=original"),
+    width: int = Query(1000, ge=1, le=65536, description="Peaks wanted; the coarsest level with at least this many is served")
+):
+    """Serve one track's precomputed waveform peaks (see waveform_peaks.py) for the player."""
+    clean_filename = decode_filename_param(f)
+    if not clean_filename or os.path.basename(clean_filename) != clean_filename:
+        raise HTTPException(status_code=400, detail="Invalid filename parameter")
+    
+    filepath = os.path.join(OUTPUT_DIR, clean_filename, PEAKS_FILENAME)
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Peaks not found")
+    
+    # Peaks never change once written; the ETag still covers a re-run under the same name
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}-{t}-{width}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        data = read_peaks_level(filepath, t, width)
+    except (OSError, ValueError) as e:
+        download_logger.error("Peaks error: %s", e)
+        raise HTTPException(status_code=500, detail="Invalid peaks file")
+    if data is None:
+        raise HTTPException(status_code=404, detail="Peaks not found")
+    return Response(content=data, media_type="application/octet-stream", headers=headers)
+
+@app.get("/remix")
+def remix(
+    f: str = Query(..., description="Filename without extension"),
+    vocal: float = Query(1.0, ge=0, le=MAX_GAIN, description="Vocal gain (1.0 = as separated)"),
+    inst: float = Query(1.0, ge=0, le=MAX_GAIN, description="Accompaniment gain (1.0 = as separated)")
+):
+    """Mix the stems with the given gains and stream the MP3, served from the cache once encoded."""
+    clean_filename = decode_filename_param(f)
+    if not clean_filename or os.path.basename(clean_filename) != clean_filename:
+        raise HTTPException(status_code=400, detail="Invalid filename parameter")
+    
+    result_dir = os.path.join(OUTPUT_DIR, clean_filename)
+    vocal_mp3_path, inst_mp3_path = stem_mp3_paths(result_dir, clean_filename)
+    if not (os.path.exists(vocal_mp3_path) and os.path.exists(inst_mp3_path)):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    vocal, inst = quantize_gain(vocal), quantize_gain(inst)
+    safe_filename = "audio_remix.mp3"
+    cache_path = remix_cache_path(result_dir, vocal, inst)
+    cached = get_cached_remix(cache_path)
+    if cached:
+        download_logger.info("Serving cached remix: %s", cached)
+        return FileResponse(cached, media_type="audio/mpeg", filename=safe_filename)
+    
+    try:
+        vocal_pcm_path, inst_pcm_path = ensure_stem_pcm(result_dir, vocal_mp3_path, inst_mp3_path)
+    except RemixError as e:
+        download_logger.error("Remix error: %s", e)
+        raise HTTPException(status_code=500, detail="Remix failed")
+    
+    download_logger.info("Streaming remix of %s: vocal %.2f, inst %.2f", clean_filename, vocal, inst)
+    return StreamingResponse(
+        stream_remix(vocal_pcm_path, inst_pcm_path, vocal, inst, cache_path),
+        media_type="audio/mpeg",
+        headers={"Content-Disposition": f'attachment; filename="{safe_filename}"'}
+    )
+
+@app.get("/download/bundle")
+def download_bundle(
+    f: List[str] = Query(..., description="Filenames without extension; repeat for a batch"),
+    t: str = Query("vao", pattern="^[vao]{1,3}$", description="File types to include: v=vocal, a=accompaniment, o=original")
+):
+    """Stream a zip of the requested stems (and originals) straight from disk."""
+    
+    try:
+        clean_filenames = list(dict.fromkeys(decode_filename_param(name) for name in f))
+        if not all(clean_filenames):
+            raise HTTPException(status_code=400, detail="Invalid filename parameter")
+        
+        entries = []
+        for clean_filename in clean_filenames:
+            for file_type in dict.fromkeys(t):
+                resolved = resolve_download_path(clean_filename, file_type)
+                if not resolved:
+                    raise HTTPException(status_code=404, detail=f"File not found: {clean_filename} ({file_type})")
+                filepath, filename = resolved
+                # Batches get one folder per job
+                arcname = f"{clean_filename}/{filename}" if len(clean_filenames) > 1 else filename
+                entries.append(ZipEntry.from_path(filepath, arcname))
+        
+        content_length = zip_size(entries)
+        if content_length > ZIP_MAX_SIZE:
+            raise HTTPException(status_code=413, detail="Bundle too large")
+        
+        download_logger.info("Serving bundle: %s files, %s bytes", len(entries), content_length)
+        
+        return StreamingResponse(
+            stream_zip(entries),
+            media_type="application/zip",
+            headers={
+                "Content-Length": str(content_length),
+                "Content-Disposition": 'attachment; filename="audio_bundle.zip"'
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        download_logger.error("Bundle download error: %s", e)
         raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
 
 # Railway 배포용 서버 시작
@@ -227,6 +688,7 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=port,
+        uds=os.getenv("UNIX_SOCKET") or None,  # 설정하면 PORT 대신 유닉스 소켓에서 대기 (같은 머신의 워커용)
         reload=False,  # 프로덕션에서는 reload 비활성화
         access_log=True
     )
\ No newline at end of file
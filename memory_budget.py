@@ -0,0 +1,188 @@
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple, Any
+
+from logger import app_logger
+from process_stats import ProcessStats
+
+
+CGROUP_V2_MEMORY_MAX = "/sys/fs/cgroup/memory.max"
+CGROUP_V1_MEMORY_LIMIT = "/sys/fs/cgroup/memory/memory.limit_in_bytes"
+MEMINFO = "/proc/meminfo"
+# Share of the container's memory separations may use when no budget is configured
+AUTO_BUDGET_FRACTION = 0.75
+
+MB = 1024 * 1024
+# Starting point before any job has been measured: TensorFlow and the model,
+# plus the decoded waveform and spectrograms, which grow with the audio
+DEFAULT_BASE_MB = 500.0
+DEFAULT_MB_PER_CHANNEL_SECOND = 4.0
+MIN_SAFETY_MARGIN = 0.15
+MAX_SAFETY_MARGIN = 1.0
+# Unknown durations are sized as this many stereo seconds
+FALLBACK_CHANNEL_SECONDS = 2 * 420.0
+
+
+def read_memory_limit() -> Optional[int]:
+    """Get the container memory limit in bytes from cgroup v2 or v1, else the machine's total memory."""
+    for path in (CGROUP_V2_MEMORY_MAX, CGROUP_V1_MEMORY_LIMIT):
+        try:
+            with open(path, "r") as f:
+                value = f.readline().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports "unlimited" as a huge page-aligned number
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    try:
+        with open(MEMINFO, "r") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class MemoryEstimator:
+    """
+    Predicts a separation's peak RSS from its audio size (duration x channels).
+    Every finished job's measured peak is observed; the estimate is a
+    least-squares line through recent observations, padded by the worst
+    underestimate it would have made on them.
+    """
+
+    def __init__(self, history: int = 50):
+        self.observations: Deque[Tuple[float, int]] = deque(maxlen=history)
+        self.base_bytes = DEFAULT_BASE_MB * MB
+        self.bytes_per_unit = DEFAULT_MB_PER_CHANNEL_SECOND * MB
+        self.margin = MIN_SAFETY_MARGIN
+
+    def _predict(self, channel_seconds: float) -> float:
+        return self.base_bytes + self.bytes_per_unit * channel_seconds
+
+    def estimate(self, channel_seconds: Optional[float]) -> int:
+        if channel_seconds is None:
+            channel_seconds = FALLBACK_CHANNEL_SECONDS
+        return int(self._predict(channel_seconds) * (1 + self.margin))
+
+    def observe(self, channel_seconds: float, peak_bytes: int) -> None:
+        if channel_seconds <= 0 or peak_bytes <= 0:
+            return
+        self.observations.append((channel_seconds, peak_bytes))
+        self._fit()
+
+    def _fit(self) -> None:
+        count = len(self.observations)
+        mean_x = sum(x for x, _ in self.observations) / count
+        mean_y = sum(y for _, y in self.observations) / count
+        spread = sum((x - mean_x) ** 2 for x, _ in self.observations)
+        if count >= 3 and spread > 0:
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in self.observations) / spread
+            self.bytes_per_unit = max(slope, 0.0)
+            self.base_bytes = max(mean_y - self.bytes_per_unit * mean_x, 0.0)
+        else:
+            # Too few distinct sizes for a line: keep the slope, move the intercept
+            self.base_bytes = max(mean_y - self.bytes_per_unit * mean_x, 0.0)
+        worst = max(y / max(self._predict(x), 1.0) - 1 for x, y in self.observations)
+        self.margin = min(max(worst, MIN_SAFETY_MARGIN), MAX_SAFETY_MARGIN)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "observations": len(self.observations),
+            "base_mb": round(self.base_bytes / MB, 1),
+            "mb_per_channel_second": round(self.bytes_per_unit / MB, 3),
+            "safety_margin": round(self.margin, 3)
+        }
+
+
+@dataclass
+class MemoryReservation:
+    """One job's claim on the memory budget, sized once its audio has been probed."""
+    task_id: str
+    channel_seconds: Optional[float] = None
+    estimate_bytes: int = 0
+    # Sampled while the separation's child processes run
+    stats: ProcessStats = field(default_factory=ProcessStats)
+
+    @property
+    def in_use_bytes(self) -> int:
+        """The estimate until the job's live RSS overtakes it."""
+        return max(self.estimate_bytes, self.stats.rss_bytes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "channel_seconds": round(self.channel_seconds, 1) if self.channel_seconds is not None else None,
+            "estimated_mb": round(self.estimate_bytes / MB, 1),
+            "peak_mb": round(self.stats.peak_rss_bytes / MB, 1) if self.stats.samples else None
+        }
+
+
+class MemoryBudget:
+    """
+    Memory admission for the separation stage. A job may start only while the
+    memory held by running separations (each one's estimate or live RSS,
+    whichever is larger) plus its own estimate fits the budget; a job alone
+    always runs. A budget of 0 is sized from the container's memory limit; a
+    negative one disables the check but keeps the measurements.
+    """
+
+    def __init__(self, budget_mb: int):
+        if budget_mb == 0:
+            limit = read_memory_limit()
+            budget_mb = int(limit * AUTO_BUDGET_FRACTION / MB) if limit else -1
+        self.budget_bytes = max(budget_mb, 0) * MB
+        self.enabled = self.budget_bytes > 0
+        self.estimator = MemoryEstimator()
+        self.lock = threading.Lock()
+        self.running: Dict[str, MemoryReservation] = {}
+        self.deferrals = 0
+
+        app_logger.info("MemoryBudget initialized - budget: %s",
+                        f"{budget_mb}MB" if self.enabled else "disabled")
+
+    def size(self, reservation: MemoryReservation, duration: Optional[float], channels: Optional[int]) -> MemoryReservation:
+        """Estimate a job's peak memory from its probed duration and channel count."""
+        if duration is not None:
+            reservation.channel_seconds = duration * max(channels or 2, 1)
+        with self.lock:
+            reservation.estimate_bytes = self.estimator.estimate(reservation.channel_seconds)
+        return reservation
+
+    def fits(self, reservation: MemoryReservation) -> bool:
+        if not self.enabled:
+            return True
+        with self.lock:
+            if not self.running:
+                return True
+            fits = sum(r.in_use_bytes for r in self.running.values()) + reservation.estimate_bytes <= self.budget_bytes
+            if not fits:
+                self.deferrals += 1
+            return fits
+
+    def reserve(self, reservation: MemoryReservation) -> None:
+        with self.lock:
+            self.running[reservation.task_id] = reservation
+
+    def release(self, reservation: MemoryReservation) -> None:
+        with self.lock:
+            self.running.pop(reservation.task_id, None)
+
+    def observe(self, channel_seconds: Optional[float], peak_bytes: int) -> None:
+        """Calibrate the estimator with a finished job's measured peak."""
+        if channel_seconds is None:
+            return
+        with self.lock:
+            self.estimator.observe(channel_seconds, peak_bytes)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "budget_mb": round(self.budget_bytes / MB, 1),
+                "in_use_mb": round(sum(r.in_use_bytes for r in self.running.values()) / MB, 1),
+                "running": {task_id: r.to_dict() for task_id, r in self.running.items()},
+                "deferrals": self.deferrals,
+                "estimator": self.estimator.to_dict()
+            }
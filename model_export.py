@@ -0,0 +1,386 @@
+"""
+Export the Spleeter checkpoint for optimized CPU inference and benchmark the result.
+
+    python model_export.py export [--model spleeter:2stems] [--model-dir pretrained_models/2stems] [--no-int8]
+    python model_export.py benchmark [--tracks 3] [--seconds 30] [--json report.json]
+                                     [--fast-model spleeter:2stems] [--fast-backend int8] [--no-tiers]
+
+`export` rebuilds Spleeter's inference graph (waveform in, one waveform per
+instrument out), restores the checkpoint, folds variables and batch norms into
+constants (frozen_graph.pb) and, unless --no-int8, converts that graph to
+TFLite with int8 weight quantization (model_int8.tflite). Both are described
+by optimized_model.json next to the checkpoint, which inference_backend reads.
+
+`benchmark` separates synthetic tracks (known vocal and accompaniment stems)
+with every available backend and reports speed plus SDR, including the SDR
+delta of each optimized backend against stock Spleeter. It then runs each
+quality tier (quality_tiers.py) the way the pipeline does, downmix, separation,
+stem WAVs and MP3 encoding included, and reports its throughput and SDR
+against the full tier.
+
+Requires the separation stack (spleeter, tensorflow, numpy), not the web app's.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple, Any
+
+from inference_backend import MANIFEST_NAME, SAMPLE_RATE, downmix_stereo, load_manifest, load_separator, write_wav
+from quality_tiers import FULL_TIER, QualityTier, build_tiers
+
+
+FROZEN_GRAPH_NAME = "frozen_graph.pb"
+INT8_MODEL_NAME = "model_int8.tflite"
+INPUT_NAME = "waveform"
+
+
+def export(model: str, model_dir: str, int8: bool = True) -> Dict[str, Any]:
+    """Freeze (and optionally quantize) the checkpoint in model_dir; returns the written manifest."""
+    import tensorflow as tf
+    from tensorflow.python.tools import optimize_for_inference_lib
+    from spleeter.model import EstimatorSpecBuilder
+    from spleeter.utils.configuration import load_configuration
+
+    params = load_configuration(model)
+    # Keep the STFT inside the graph so the export takes raw waveforms
+    params["stft_backend"] = "tensorflow"
+    params["MWF"] = False
+    checkpoint = tf.train.latest_checkpoint(model_dir)
+    if not checkpoint:
+        raise RuntimeError(f"No checkpoint found in {model_dir}")
+
+    tf.compat.v1.disable_eager_execution()
+    graph = tf.Graph()
+    with graph.as_default():
+        features = {
+            "waveform": tf.compat.v1.placeholder(tf.float32, shape=(None, 2), name=INPUT_NAME),
+            "audio_id": tf.compat.v1.placeholder(tf.string, name="audio_id")
+        }
+        builder = EstimatorSpecBuilder(features, params)
+        instruments = list(builder.outputs.keys())
+        outputs = [tf.identity(builder.outputs[instrument], name=f"output_{instrument}") for instrument in instruments]
+        saver = tf.compat.v1.train.Saver()
+
+        with tf.compat.v1.Session(graph=graph) as session:
+            saver.restore(session, checkpoint)
+            output_names = [output.op.name for output in outputs]
+            graph_def = tf.compat.v1.graph_util.convert_variables_to_constants(
+                session, graph.as_graph_def(), output_names
+            )
+            # Fold batch norms into the convolutions and drop training-only nodes
+            graph_def = optimize_for_inference_lib.optimize_for_inference(
+                graph_def, [INPUT_NAME], output_names, tf.float32.as_datatype_enum
+            )
+            with open(os.path.join(model_dir, FROZEN_GRAPH_NAME), "wb") as f:
+                f.write(graph_def.SerializeToString())
+            print(f"Wrote {FROZEN_GRAPH_NAME} ({os.path.getsize(os.path.join(model_dir, FROZEN_GRAPH_NAME)) / 1e6:.1f}MB)")
+
+            int8_name = None
+            if int8:
+                converter = tf.compat.v1.lite.TFLiteConverter.from_session(session, [features["waveform"]], outputs)
+                # Dynamic-range quantization: int8 weights, float activations
+                converter.optimizations = [tf.lite.Optimize.DEFAULT]
+                # STFT/ISTFT use complex ops TFLite has no kernels for; those run through the TF delegate
+                converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+                with open(os.path.join(model_dir, INT8_MODEL_NAME), "wb") as f:
+                    f.write(converter.convert())
+                int8_name = INT8_MODEL_NAME
+                print(f"Wrote {INT8_MODEL_NAME} ({os.path.getsize(os.path.join(model_dir, INT8_MODEL_NAME)) / 1e6:.1f}MB)")
+
+    manifest = {
+        "model": model,
+        "sample_rate": SAMPLE_RATE,
+        "instruments": instruments,
+        "input": f"{INPUT_NAME}:0",
+        "outputs": {instrument: f"{name}:0" for instrument, name in zip(instruments, output_names)},
+        "frozen_graph": FROZEN_GRAPH_NAME,
+        "int8_model": int8_name,
+        "checkpoint": os.path.basename(checkpoint),
+        "exported_at": time.time()
+    }
+    with open(os.path.join(model_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def synthetic_track(seed: int, seconds: float, sample_rate: int = SAMPLE_RATE):
+    """
+    Build a mixture with known stems: a sung-like harmonic line with vibrato and
+    formants over chords, bass and drums. Returns (mixture, {"vocals", "accompaniment"}).
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+    scale = 220.0 * 2 ** (np.array([0, 2, 3, 5, 7, 8, 10, 12]) / 12)
+
+    # Vocal: note sequence with vibrato, formant-shaped harmonics and syllable envelopes
+    f0 = np.zeros(n)
+    envelope = np.zeros(n)
+    position = 0
+    while position < n:
+        length = int(rng.uniform(0.25, 0.8) * sample_rate)
+        end = min(position + length, n)
+        f0[position:end] = rng.choice(scale)
+        ramp = np.minimum(np.arange(end - position) / (0.03 * sample_rate), 1.0)
+        decay = np.minimum((end - np.arange(position, end)) / (0.08 * sample_rate), 1.0)
+        envelope[position:end] = ramp * decay * (rng.random() > 0.15)
+        position = end + int(rng.uniform(0.0, 0.15) * sample_rate)
+    f0 *= 1 + 0.02 * np.sin(2 * np.pi * 5.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    vocal = np.zeros(n)
+    for k in range(1, 16):
+        frequency = k * f0
+        formants = sum(np.exp(-((frequency - center) / width) ** 2)
+                       for center, width in ((700, 250), (1200, 300), (2600, 500)))
+        vocal += (0.3 + formants) / k * np.sin(k * phase) * (frequency < sample_rate / 2)
+    vocal *= envelope
+    vocal += 0.01 * rng.standard_normal(n) * envelope
+
+    # Accompaniment: chord pads changing every 2s, bass, kick and hi-hat
+    accompaniment = np.zeros(n)
+    for start in range(0, n, 2 * sample_rate):
+        end = min(start + 2 * sample_rate, n)
+        root = rng.choice(scale[:5]) / 2
+        for ratio in (1.0, 1.25, 1.5):
+            for k in range(1, 8):
+                accompaniment[start:end] += 0.08 / k * np.sin(2 * np.pi * root * ratio * k * t[start:end])
+        accompaniment[start:end] += 0.3 * np.sin(2 * np.pi * root / 2 * t[start:end])
+    beat = int(0.5 * sample_rate)
+    kick_t = np.arange(int(0.15 * sample_rate)) / sample_rate
+    kick = np.sin(2 * np.pi * 60 * kick_t) * np.exp(-kick_t * 30)
+    hat = np.diff(rng.standard_normal(int(0.05 * sample_rate) + 1)) * np.exp(-np.arange(int(0.05 * sample_rate)) / 300)
+    for start in range(0, n, beat):
+        accompaniment[start:start + len(kick)] += 0.8 * kick[:n - start]
+        hat_start = start + beat // 2
+        if hat_start < n:
+            accompaniment[hat_start:hat_start + len(hat)] += 0.15 * hat[:n - hat_start]
+
+    # Slightly different panning so the stems are not trivially mono
+    vocals = np.stack([vocal * 0.95, vocal * 1.0], axis=1)
+    accompaniment = np.stack([accompaniment * 1.0, accompaniment * 0.9], axis=1)
+    scale_factor = 0.9 / np.max(np.abs(vocals + accompaniment))
+    stems = {"vocals": (vocals * scale_factor).astype(np.float32),
+             "accompaniment": (accompaniment * scale_factor).astype(np.float32)}
+    return stems["vocals"] + stems["accompaniment"], stems
+
+
+def sdr(reference, estimate) -> float:
+    """Signal-to-distortion ratio in dB (plain energy ratio, no allowed distortion filter)."""
+    import numpy as np
+
+    length = min(len(reference), len(estimate))
+    reference, estimate = reference[:length], estimate[:length]
+    noise = np.sum((reference - estimate) ** 2)
+    return float(10 * np.log10(np.sum(reference ** 2) / max(noise, 1e-12)))
+
+
+def benchmark(model: str, model_dir: str, tracks: int, seconds: float, threads: int = 0) -> Dict[str, Any]:
+    """Separate synthetic tracks with every available backend; returns per-backend speed and SDR."""
+    import numpy as np
+
+    manifest = load_manifest(model_dir) or {}
+    # Stock Spleeter, in-process, is the accuracy and speed baseline
+    backends: Dict[str, Any] = {"spleeter": load_separator("spleeter", model_dir, threads, model)}
+    if manifest.get("frozen_graph"):
+        backends["frozen"] = load_separator("frozen", model_dir, threads)
+    if manifest.get("int8_model"):
+        backends["int8"] = load_separator("int8", model_dir, threads)
+
+    results: Dict[str, Dict[str, List[float]]] = {name: {"seconds": [], "vocals": [], "accompaniment": [], "vs_spleeter": []}
+                                                  for name in backends}
+    for seed in range(tracks):
+        mixture, stems = synthetic_track(seed, seconds)
+        # One untimed pass per backend so graph setup is not counted
+        baseline = None
+        for name, separator in backends.items():
+            separator.separate(mixture[:SAMPLE_RATE])
+            started = time.perf_counter()
+            estimate = separator.separate(mixture)
+            results[name]["seconds"].append(time.perf_counter() - started)
+            for instrument in ("vocals", "accompaniment"):
+                results[name][instrument].append(sdr(stems[instrument], np.asarray(estimate[instrument])))
+            if name == "spleeter":
+                baseline = estimate
+            else:
+                # How closely the optimized output tracks stock Spleeter's
+                results[name]["vs_spleeter"].append(np.mean([
+                    sdr(np.asarray(baseline[instrument]), np.asarray(estimate[instrument]))
+                    for instrument in ("vocals", "accompaniment")
+                ]))
+
+    report: Dict[str, Any] = {"model": model, "tracks": tracks, "track_seconds": seconds, "backends": {}}
+    for name, values in results.items():
+        mean_sdr = {instrument: float(np.mean(values[instrument])) for instrument in ("vocals", "accompaniment")}
+        report["backends"][name] = {
+            "mean_seconds": float(np.mean(values["seconds"])),
+            "real_time_factor": float(np.mean(values["seconds"]) / seconds),
+            "sdr_db": mean_sdr,
+            "sdr_vs_spleeter_db": float(np.mean(values["vs_spleeter"])) if values["vs_spleeter"] else None
+        }
+    baseline_report = report["backends"]["spleeter"]
+    for entry in report["backends"].values():
+        entry["speedup"] = baseline_report["mean_seconds"] / entry["mean_seconds"]
+        entry["sdr_delta_db"] = {instrument: entry["sdr_db"][instrument] - baseline_report["sdr_db"][instrument]
+                                 for instrument in ("vocals", "accompaniment")}
+    return report
+
+
+def tier_separator(tier: QualityTier, threads: int = 0) -> Tuple[str, Any]:
+    """
+    Load a tier's separator, falling back to stock Spleeter like the server does
+    when the tier's export is missing. Returns (backend, separator).
+    """
+    model_dir = os.path.join(os.getenv("MODEL_PATH", "pretrained_models"), tier.model.split(":")[-1])
+    manifest = load_manifest(model_dir) or {}
+    model_file = manifest.get({"frozen": "frozen_graph", "int8": "int8_model"}.get(tier.backend, ""))
+    backend = tier.backend if model_file and manifest.get("model") == tier.model else "spleeter"
+    return backend, load_separator(backend, model_dir, threads, tier.model)
+
+
+def time_output(work_dir: str, stems: Dict[str, Any], tier: QualityTier) -> Optional[float]:
+    """
+    Seconds to write the stem WAVs (mono for a downmixed tier) and encode them
+    concurrently with the tier's MP3 settings, as the pipeline does; None without ffmpeg.
+    """
+    import numpy as np
+
+    channels = 1 if tier.downmix else 2
+    started = time.perf_counter()
+    processes = []
+    try:
+        for instrument, stem in stems.items():
+            wav_path = os.path.join(work_dir, f"{instrument}.wav")
+            write_wav(wav_path, np.asarray(stem)[:, :channels])
+            processes.append(subprocess.Popen(
+                ["ffmpeg", "-v", "error", "-y", "-i", wav_path, *tier.encoder_args,
+                 os.path.join(work_dir, f"{instrument}.mp3")],
+                stdin=subprocess.DEVNULL
+            ))
+    except FileNotFoundError:
+        return None
+    if any(process.wait() != 0 for process in processes):
+        return None
+    return time.perf_counter() - started
+
+
+def benchmark_tiers(tiers: Dict[str, QualityTier], tracks: int, seconds: float, threads: int = 0) -> Dict[str, Any]:
+    """Run every quality tier on synthetic tracks; returns per-tier time, throughput and SDR."""
+    import numpy as np
+
+    separators = {name: tier_separator(tier, threads) for name, tier in tiers.items()}
+    results: Dict[str, Dict[str, List[float]]] = {
+        name: {"separate": [], "output": [], "vocals": [], "accompaniment": []} for name in tiers
+    }
+    with tempfile.TemporaryDirectory(prefix="tier_benchmark_") as work_dir:
+        for seed in range(tracks):
+            mixture, stems = synthetic_track(seed, seconds)
+            for name, tier in tiers.items():
+                separator = separators[name][1]
+                analysis = downmix_stereo(mixture) if tier.downmix else mixture
+                separator.separate(analysis[:SAMPLE_RATE])
+                started = time.perf_counter()
+                estimate = separator.separate(analysis)
+                results[name]["separate"].append(time.perf_counter() - started)
+                # A downmixed estimate has identical channels; it is scored against the stereo truth
+                for instrument in ("vocals", "accompaniment"):
+                    results[name][instrument].append(sdr(stems[instrument], np.asarray(estimate[instrument])))
+                output_seconds = time_output(work_dir, estimate, tier)
+                if output_seconds is not None:
+                    results[name]["output"].append(output_seconds)
+
+    report: Dict[str, Any] = {}
+    for name, values in results.items():
+        separate_seconds = float(np.mean(values["separate"]))
+        output_seconds = float(np.mean(values["output"])) if values["output"] else None
+        total = separate_seconds + (output_seconds or 0.0)
+        report[name] = {
+            **tiers[name].to_dict(),
+            "resolved_backend": separators[name][0],
+            "separate_seconds": separate_seconds,
+            "output_seconds": output_seconds,
+            "total_seconds": total,
+            "real_time_factor": total / seconds,
+            "sdr_db": {instrument: float(np.mean(values[instrument])) for instrument in ("vocals", "accompaniment")}
+        }
+    full = report.get(FULL_TIER) or next(iter(report.values()))
+    for entry in report.values():
+        entry["speedup"] = full["total_seconds"] / entry["total_seconds"]
+        entry["sdr_delta_db"] = {instrument: entry["sdr_db"][instrument] - full["sdr_db"][instrument]
+                                 for instrument in ("vocals", "accompaniment")}
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{report['tracks']} synthetic tracks x {report['track_seconds']}s, model {report['model']}")
+    print(f"{'backend':<10}{'sec/track':>11}{'RTF':>8}{'speedup':>9}{'SDR voc':>9}{'SDR acc':>9}"
+          f"{'d voc':>8}{'d acc':>8}{'vs stock':>10}")
+    for name, entry in report["backends"].items():
+        vs_stock = entry["sdr_vs_spleeter_db"]
+        print(f"{name:<10}{entry['mean_seconds']:>11.2f}{entry['real_time_factor']:>8.3f}{entry['speedup']:>8.2f}x"
+              f"{entry['sdr_db']['vocals']:>9.2f}{entry['sdr_db']['accompaniment']:>9.2f}"
+              f"{entry['sdr_delta_db']['vocals']:>+8.2f}{entry['sdr_delta_db']['accompaniment']:>+8.2f}"
+              f"{'-' if vs_stock is None else f'{vs_stock:.1f}':>10}")
+    print("SDR in dB against the synthetic ground truth; d = delta against stock Spleeter; "
+          "'vs stock' = SDR of the output against stock Spleeter's output.")
+    if not report.get("tiers"):
+        return
+    print(f"\n{'tier':<6}{'model':<22}{'backend':<10}{'separate':>9}{'output':>8}{'RTF':>8}{'speedup':>9}"
+          f"{'SDR voc':>9}{'SDR acc':>9}{'d voc':>8}{'d acc':>8}")
+    for name, entry in report["tiers"].items():
+        output = entry["output_seconds"]
+        print(f"{name:<6}{entry['model']:<22}{entry['resolved_backend']:<10}{entry['separate_seconds']:>9.2f}"
+              f"{'-' if output is None else f'{output:.2f}':>8}{entry['real_time_factor']:>8.3f}{entry['speedup']:>8.2f}x"
+              f"{entry['sdr_db']['vocals']:>9.2f}{entry['sdr_db']['accompaniment']:>9.2f}"
+              f"{entry['sdr_delta_db']['vocals']:>+8.2f}{entry['sdr_delta_db']['accompaniment']:>+8.2f}")
+    print("Tiers end to end: separate = model time, output = stem WAVs plus MP3 encoding (- without ffmpeg); "
+          "d = SDR delta against the full tier.")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export and benchmark optimized Spleeter inference")
+    parser.add_argument("--model", default=os.getenv("SPLEETER_MODEL", "spleeter:2stems"))
+    parser.add_argument("--model-dir", default=None, help="checkpoint directory (default: MODEL_PATH/<model name>)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="write frozen and int8 exports next to the checkpoint")
+    export_parser.add_argument("--no-int8", action="store_true", help="skip the int8 TFLite conversion")
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="compare backends on synthetic tracks")
+    benchmark_parser.add_argument("--tracks", type=int, default=3)
+    benchmark_parser.add_argument("--seconds", type=float, default=30.0)
+    benchmark_parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = runtime default)")
+    benchmark_parser.add_argument("--json", dest="json_path", help="also write the report as JSON")
+    benchmark_parser.add_argument("--no-tiers", dest="tiers", action="store_false", help="skip the quality tier runs")
+    benchmark_parser.add_argument("--backend", default=os.getenv("SEPARATION_BACKEND", "spleeter"),
+                                  help="full tier backend")
+    benchmark_parser.add_argument("--fast-model", default=os.getenv("FAST_TIER_MODEL", "spleeter:2stems"),
+                                  help="fast tier model")
+    benchmark_parser.add_argument("--fast-backend", default=os.getenv("FAST_TIER_BACKEND", "int8"),
+                                  help="fast tier backend")
+
+    args = parser.parse_args(argv)
+    model_dir = args.model_dir or os.path.join(os.getenv("MODEL_PATH", "pretrained_models"), args.model.split(":")[-1])
+
+    if args.command == "export":
+        manifest = export(args.model, model_dir, int8=not args.no_int8)
+        print(json.dumps(manifest, indent=2))
+    else:
+        report = benchmark(args.model, model_dir, args.tracks, args.seconds, args.threads)
+        if args.tiers:
+            tiers = build_tiers(args.model, args.backend, args.fast_model, args.fast_backend)
+            report["tiers"] = benchmark_tiers(tiers, args.tracks, args.seconds, args.threads)
+        print_report(report)
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import asyncio
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple, Any
+
+from logger import app_logger
+
+
+PROC_DIR = "/proc"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def proc_available() -> bool:
+    return os.path.isdir(os.path.join(PROC_DIR, "self"))
+
+
+def _child_pids(pid: int) -> List[int]:
+    children: List[int] = []
+    task_dir = os.path.join(PROC_DIR, str(pid), "task")
+    try:
+        for tid in os.listdir(task_dir):
+            with open(os.path.join(task_dir, tid, "children"), "r") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def process_tree(pid: int) -> List[int]:
+    """Get pid and all of its descendants (e.g. the ffmpeg that yt-dlp spawns)."""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(_child_pids(current))
+    return pids
+
+
+def read_process_usage(pid: int) -> Tuple[float, int]:
+    """
+    Read one process's CPU time and resident memory from /proc.
+    Returns: (cpu_seconds, rss_bytes)
+    """
+    with open(os.path.join(PROC_DIR, str(pid), "stat"), "r") as f:
+        # The command name may contain spaces; fields after it are fixed
+        fields = f.read().rsplit(")", 1)[1].split()
+    utime, stime, rss_pages = int(fields[11]), int(fields[12]), int(fields[21])
+    return (utime + stime) / CLOCK_TICKS, rss_pages * PAGE_SIZE
+
+
+def read_peak_rss(pid: int) -> int:
+    """Read the high-water mark of a process's resident memory (VmHWM) in bytes."""
+    with open(os.path.join(PROC_DIR, str(pid), "status"), "r") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+@dataclass
+class ProcessStats:
+    """CPU time and peak RSS of a child process tree, sampled while it runs."""
+    cpu_by_pid: Dict[int, float] = field(default_factory=dict)
+    peak_rss_bytes: int = 0
+    # RSS of the whole tree at the latest sample
+    rss_bytes: int = 0
+    samples: int = 0
+
+    @property
+    def cpu_seconds(self) -> float:
+        return sum(self.cpu_by_pid.values())
+
+    def sample(self, pid: int) -> int:
+        """Take one sample of the tree rooted at pid; returns its current RSS in bytes."""
+        tree_rss = 0
+        for member in process_tree(pid):
+            try:
+                cpu_seconds, rss_bytes = read_process_usage(member)
+                peak_rss = read_peak_rss(member)
+            except (OSError, ValueError, IndexError):
+                # The process exited between listing and reading
+                continue
+            self.cpu_by_pid[member] = max(self.cpu_by_pid.get(member, 0.0), cpu_seconds)
+            tree_rss += rss_bytes
+            self.peak_rss_bytes = max(self.peak_rss_bytes, peak_rss)
+        self.peak_rss_bytes = max(self.peak_rss_bytes, tree_rss)
+        self.rss_bytes = tree_rss
+        self.samples += 1
+        return tree_rss
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "peak_rss_mb": round(self.peak_rss_bytes / (1024 * 1024), 1),
+            "samples": self.samples
+        }
+
+
+async def monitor_process(pid: int, stats: ProcessStats, interval: float = 0.1) -> None:
+    """Sample a child process tree until cancelled; a no-op where /proc is unavailable."""
+    if not proc_available():
+        return
+    try:
+        while True:
+            stats.sample(pid)
+            await asyncio.sleep(interval)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        app_logger.debug("Process monitor for pid %s stopped: %s", pid, e)
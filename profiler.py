@@ -0,0 +1,102 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Any
+
+
+class Span:
+    """A timed section of a task's pipeline; children may overlap when stages run concurrently."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.attrs: Dict[str, Any] = {}
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attrs": self.attrs,
+            "children": [child.to_dict(origin) for child in self.children]
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("profile_span", default=None)
+
+
+class TaskProfile:
+    """Wall-clock span tree of one task, with CPU and peak RSS of its child processes."""
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.created_at = time.time()
+        self.root = Span("task")
+
+    def finish(self) -> None:
+        if self.root.end is None:
+            self.root.end = time.perf_counter()
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "created_at": self.created_at,
+            "root": self.root.to_dict(self.root.start)
+        }
+
+    def to_folded(self) -> str:
+        """
+        Render as folded stacks ("task;ingest;proc:yt-dlp 1234"), weighted by
+        self time in microseconds; flamegraph.pl, speedscope and inferno read this.
+        """
+        lines: List[str] = []
+
+        def visit(span: Span, stack: str) -> None:
+            path = f"{stack};{span.name}" if stack else span.name
+            child_time = sum(child.duration for child in span.children)
+            self_us = int(max(span.duration - child_time, 0.0) * 1_000_000)
+            if self_us > 0:
+                lines.append(f"{path} {self_us}")
+            for child in span.children:
+                visit(child, path)
+
+        visit(self.root, "")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def activate_profile(profile: Optional[TaskProfile]):
+    """Make profile the target of span() calls in this (async) context."""
+    if profile is None:
+        yield
+        return
+    token = _current_span.set(profile.root)
+    try:
+        yield
+    finally:
+        _current_span.reset(token)
+        profile.finish()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Record a child span of the current one; yields None when no profile is active."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name)
+    child.attrs.update(attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
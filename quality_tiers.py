@@ -0,0 +1,42 @@
+"""
+Separation quality tiers.
+
+"full" runs the configured model and backend on the stereo input and encodes
+the stems with ffmpeg's default MP3 settings. "fast" trades quality for speed
+when the queue is long: its own model or backend (by default the int8 export),
+one mono downmix through the model and mono stems (half the WAV I/O and
+encoding), and cheaper LAME settings. The downmix and encoder settings alone
+save no model time, so the tier is only worth enabling (DEGRADE_WAIT_SECONDS)
+once its model or an optimized export has been benchmarked.
+"""
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Tuple
+
+FULL_TIER = "full"
+FAST_TIER = "fast"
+
+# LAME VBR around 100kbps with its faster psychoacoustic search
+FAST_ENCODER_ARGS = ("-q:a", "6", "-compression_level", "7")
+
+
+@dataclass(frozen=True)
+class QualityTier:
+    name: str
+    # Spleeter model and the backend asked for; every node resolves the backend against its own exports
+    model: str
+    backend: str
+    # Separate one mono mix and write mono stems
+    downmix: bool = False
+    # libmp3lame options for the stems, on top of ffmpeg's defaults
+    encoder_args: Tuple[str, ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def build_tiers(model: str, backend: str, fast_model: str, fast_backend: str) -> Dict[str, QualityTier]:
+    """The tiers, fastest last."""
+    return {
+        FULL_TIER: QualityTier(FULL_TIER, model, backend),
+        FAST_TIER: QualityTier(FAST_TIER, fast_model, fast_backend, downmix=True, encoder_args=FAST_ENCODER_ARGS)
+    }
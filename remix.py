@@ -0,0 +1,232 @@
+import os
+import subprocess
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from logger import app_logger
+
+
+REMIX_DIRNAME = "remix"
+SAMPLE_RATE = 44100
+CHANNELS = 2
+# Frames mixed per block: 64K stereo frames is 256KB of PCM per stem
+REMIX_BLOCK_FRAMES = 64 * 1024
+REMIX_CHUNK_SIZE = 64 * 1024
+MAX_GAIN = 2.0
+# Encoded mixes kept per job; the least recently served are dropped first
+REMIX_CACHE_ENTRIES = 8
+# Jobs whose decoded PCM (about 50MB per stem for 5 minutes) is kept; the least recently remixed go first
+REMIX_PCM_JOBS = 4
+PCM_SUFFIX = ".s16"
+
+ENCODE_CMD = [
+    "ffmpeg", "-v", "error", "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-i", "pipe:0",
+    "-c:a", "libmp3lame", "-q:a", "2", "-f", "mp3", "pipe:1"
+]
+
+_locks_guard = threading.Lock()
+# result_dir -> (lock, requests using it); an entry lives only while a request decodes or waits
+_decode_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+
+
+class RemixError(Exception):
+    """The stems could not be decoded or mixed."""
+
+
+def quantize_gain(gain: float) -> float:
+    """Clamp a gain to [0, MAX_GAIN] in steps of 0.01, so near-identical requests share a cache entry."""
+    return round(min(max(gain, 0.0), MAX_GAIN), 2)
+
+
+def remix_cache_path(result_dir: str, vocal_gain: float, inst_gain: float) -> str:
+    return os.path.join(result_dir, REMIX_DIRNAME,
+                        f"v{round(vocal_gain * 100):03d}_a{round(inst_gain * 100):03d}.mp3")
+
+
+def get_cached_remix(cache_path: str) -> Optional[str]:
+    """The cached mix if there is one, marked as just used."""
+    try:
+        os.utime(cache_path)
+    except OSError:
+        return None
+    return cache_path
+
+
+@contextmanager
+def _decode_lock(result_dir: str) -> Iterator[None]:
+    with _locks_guard:
+        lock, users = _decode_locks.get(result_dir, (threading.Lock(), 0))
+        _decode_locks[result_dir] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _locks_guard:
+            lock, users = _decode_locks[result_dir]
+            if users == 1:
+                del _decode_locks[result_dir]
+            else:
+                _decode_locks[result_dir] = (lock, users - 1)
+
+
+def _evict_pcm(output_dir: str, keep: int = REMIX_PCM_JOBS) -> None:
+    """
+    Delete the decoded PCM of all but the `keep` most recently remixed jobs.
+    A remix still streaming from an evicted file keeps its open mapping.
+    """
+    jobs = []
+    for job_name in os.listdir(output_dir):
+        remix_dir = os.path.join(output_dir, job_name, REMIX_DIRNAME)
+        try:
+            paths = [os.path.join(remix_dir, name) for name in os.listdir(remix_dir) if name.endswith(PCM_SUFFIX)]
+            if paths:
+                jobs.append((max(os.path.getmtime(path) for path in paths), paths))
+        except OSError:
+            # No remix yet, or evicted by a concurrent request
+            continue
+    jobs.sort(key=lambda job: job[0], reverse=True)
+    for _, paths in jobs[keep:]:
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def ensure_stem_pcm(result_dir: str, vocal_mp3_path: str, inst_mp3_path: str) -> Tuple[str, str]:
+    """
+    Decode a job's MP3 stems once into raw s16le stereo under result_dir/remix,
+    where every later remix memory-maps them. Only the PCM of the
+    REMIX_PCM_JOBS most recently remixed jobs is kept on disk.
+    Returns: (vocal_pcm_path, inst_pcm_path)
+    """
+    remix_dir = os.path.join(result_dir, REMIX_DIRNAME)
+    pcm_paths = (os.path.join(remix_dir, f"vocals{PCM_SUFFIX}"), os.path.join(remix_dir, f"accompaniment{PCM_SUFFIX}"))
+    decoded = False
+    with _decode_lock(result_dir):
+        os.makedirs(remix_dir, exist_ok=True)
+        for mp3_path, pcm_path in zip((vocal_mp3_path, inst_mp3_path), pcm_paths):
+            try:
+                # Mark as just used for the eviction order
+                os.utime(pcm_path)
+                continue
+            except OSError:
+                pass
+            temp_path = f"{pcm_path}.part"
+            cmd = ["ffmpeg", "-v", "error", "-i", mp3_path, "-f", "s16le",
+                   "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE), "-y", temp_path]
+            try:
+                result = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+            except FileNotFoundError:
+                raise RemixError("ffmpeg not found")
+            if result.returncode != 0:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise RemixError(f"decoding {os.path.basename(mp3_path)} failed: {result.stderr.strip()}")
+            os.replace(temp_path, pcm_path)
+            decoded = True
+    if decoded:
+        _evict_pcm(os.path.dirname(os.path.normpath(result_dir)))
+    return pcm_paths
+
+
+def mix_blocks(vocal_pcm_path: str, inst_pcm_path: str, vocal_gain: float, inst_gain: float,
+               block_frames: int = REMIX_BLOCK_FRAMES) -> Iterator[bytes]:
+    """
+    Yield vocal_gain * vocals + inst_gain * accompaniment as s16le, one block
+    at a time from the memory-mapped stems; only one block is ever resident.
+    """
+    import numpy as np
+
+    samples = min(os.path.getsize(vocal_pcm_path), os.path.getsize(inst_pcm_path)) // (2 * CHANNELS) * CHANNELS
+    if samples == 0:
+        return
+    vocals = np.memmap(vocal_pcm_path, dtype="<i2", mode="r", shape=(samples,))
+    accompaniment = np.memmap(inst_pcm_path, dtype="<i2", mode="r", shape=(samples,))
+    block = block_frames * CHANNELS
+    mixed = np.empty(block, dtype=np.float32)
+    scratch = np.empty(block, dtype=np.float32)
+    for start in range(0, samples, block):
+        count = min(block, samples - start)
+        out, tmp = mixed[:count], scratch[:count]
+        np.multiply(vocals[start:start + count], np.float32(vocal_gain), out=out)
+        np.multiply(accompaniment[start:start + count], np.float32(inst_gain), out=tmp)
+        out += tmp
+        np.rint(out, out=out)
+        np.clip(out, -32768, 32767, out=out)
+        yield out.astype("<i2").tobytes()
+
+
+def _prune_cache(remix_dir: str, keep: int = REMIX_CACHE_ENTRIES) -> None:
+    mixes = []
+    for name in os.listdir(remix_dir):
+        if name.endswith(".mp3"):
+            try:
+                mixes.append((os.path.getmtime(os.path.join(remix_dir, name)), name))
+            except OSError:
+                # Pruned by a concurrent request
+                continue
+    mixes.sort(reverse=True)
+    for _, name in mixes[keep:]:
+        path = os.path.join(remix_dir, name)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def stream_remix(vocal_pcm_path: str, inst_pcm_path: str, vocal_gain: float, inst_gain: float,
+                 cache_path: str, chunk_size: int = REMIX_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Mix the stems and yield the MP3 as ffmpeg encodes it. A feeder thread writes
+    mixed blocks to the encoder while this generator reads it, so memory stays
+    at a block plus the pipe buffers whatever the track length. The encoded
+    bytes are also written to cache_path, which is only published once the
+    encode has finished; an abandoned response kills the encoder.
+    """
+    process = subprocess.Popen(ENCODE_CMD, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    feed_errors = []
+
+    def feed():
+        try:
+            for data in mix_blocks(vocal_pcm_path, inst_pcm_path, vocal_gain, inst_gain):
+                process.stdin.write(data)
+        except Exception as e:
+            # BrokenPipeError when the encoder was killed because the client went away
+            feed_errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="remix-feed", daemon=True)
+    feeder.start()
+    temp_path = f"{cache_path}.{uuid.uuid4().hex}.part"
+    complete = False
+    try:
+        with open(temp_path, "wb") as cache:
+            while True:
+                chunk = process.stdout.read1(chunk_size)
+                if not chunk:
+                    break
+                cache.write(chunk)
+                yield chunk
+        complete = process.wait() == 0 and not feed_errors
+        if not complete:
+            app_logger.error("Remix of %s failed: encoder exit %s, %s",
+                             cache_path, process.returncode, feed_errors[0] if feed_errors else "no feed error")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        feeder.join()
+        process.stdout.close()
+        if complete:
+            os.replace(temp_path, cache_path)
+            _prune_cache(os.path.dirname(cache_path))
+        elif os.path.exists(temp_path):
+            os.remove(temp_path)
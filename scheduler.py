@@ -0,0 +1,199 @@
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Any
+
+from cpu_allocation import CpuAllocator, CpuAllotment
+from logger import app_logger
+from memory_budget import MemoryBudget, MemoryReservation
+from profiler import span as profile_span
+
+
+# Virtual time credited per second spent waiting, so long jobs are not starved by short ones
+AGING_RATE = 1.0
+
+
+@dataclass
+class Waiter:
+    task_id: str
+    client_id: str
+    weight: float
+    # Predicted separation seconds
+    cost: float
+    enqueued_at: float
+    sequence: int
+    future: asyncio.Future = field(repr=False)
+    reservation: Optional[MemoryReservation] = None
+
+
+class SeparationScheduler:
+    """
+    Gate for the CPU-heavy separation stage of the pipeline.
+    Downloads, probing and encoding run freely; only separation waits here for
+    one of the CPU slots. All methods must be called on the pipeline event loop.
+
+    Waiting jobs are served by weighted fair queuing across clients: each job
+    costs its predicted separation time / weight of its client's virtual time,
+    so a client with many queued jobs gets its share of the slots instead of
+    all of them. The job with the earliest virtual finish goes first, which is
+    the shortest predicted one among clients level on virtual time and within
+    each client's own backlog. Every second waited takes AGING_RATE off a
+    job's finish, so a long track passed over by short ones still gets its turn.
+
+    With a memory budget, a job also needs its estimated peak memory to fit.
+    The job next in fair-queue order blocks the ones behind it until it fits,
+    so a long track is never starved by a stream of short ones.
+    """
+
+    def __init__(self, cpu_allocator: CpuAllocator, memory_budget: Optional[MemoryBudget] = None):
+        self.cpu_allocator = cpu_allocator
+        self.memory_budget = memory_budget
+        self.capacity = cpu_allocator.slots
+        self.running = 0
+        self.waiters: List[Waiter] = []
+        self.virtual_time = 0.0
+        self.client_finish: Dict[str, float] = {}
+        self.client_running: Dict[str, int] = {}
+        self.sequence = itertools.count()
+
+    def _has_slot(self) -> bool:
+        # Granted waiters take their CPU allotment once they resume; after a resize,
+        # pinned slots can also wait for draining ones to give back their CPUs
+        granted = self.running - self.cpu_allocator.busy_count()
+        return self.running < self.capacity and self.cpu_allocator.free_count() > granted
+
+    def _fits(self, reservation: Optional[MemoryReservation]) -> bool:
+        return self.memory_budget is None or reservation is None or self.memory_budget.fits(reservation)
+
+    def _grant(self, reservation: Optional[MemoryReservation]) -> None:
+        self.running += 1
+        if self.memory_budget and reservation:
+            self.memory_budget.reserve(reservation)
+
+    async def _acquire(self, task_id: str, client_id: str, weight: float,
+                       reservation: Optional[MemoryReservation], cost: float) -> None:
+        if self._has_slot() and not self.waiters and self._fits(reservation):
+            self._grant(reservation)
+            return
+
+        waiter = Waiter(task_id, client_id, max(weight, 0.01), max(cost, 0.0), time.monotonic(), next(self.sequence),
+                        asyncio.get_running_loop().create_future(), reservation)
+        self.waiters.append(waiter)
+        app_logger.info("Task %s waiting for a separation slot (%s waiting, predicted %.1fs)",
+                        task_id, len(self.waiters), cost)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was granted just before cancellation; hand it on
+                self._release(reservation)
+            else:
+                self.waiters = [w for w in self.waiters if w is not waiter]
+                # It may have been the job holding up the queue for memory
+                self._wake_waiters()
+            raise
+
+    def _tags(self, waiter: Waiter, now: float, virtual_time: float,
+              client_finish: Dict[str, float]) -> Tuple[float, float, float]:
+        """Returns: (virtual start, virtual finish, finish less the waiter's aging credit)"""
+        start = max(virtual_time, client_finish.get(waiter.client_id, 0.0))
+        finish = start + waiter.cost / waiter.weight
+        return start, finish, finish - AGING_RATE * (now - waiter.enqueued_at)
+
+    def _dispatch_order(self) -> List[Tuple[Waiter, float, float]]:
+        """Waiters in the order they would be served now, with their (start, finish) tags."""
+        now, virtual_time, client_finish = time.monotonic(), self.virtual_time, dict(self.client_finish)
+        ranked = []
+        for waiter in list(self.waiters):
+            start, finish, key = self._tags(waiter, now, virtual_time, client_finish)
+            ranked.append(((key, waiter.sequence), waiter, start, finish))
+        ranked.sort(key=lambda entry: entry[0])
+        return [(waiter, start, finish) for _, waiter, start, finish in ranked]
+
+    def queued_work(self) -> float:
+        """Predicted separation seconds of every waiting task. Safe to call from other threads."""
+        return sum(waiter.cost for waiter in list(self.waiters))
+
+    def queued_work_ahead(self, task_id: str) -> Optional[float]:
+        """
+        Predicted separation seconds queued ahead of a waiting task, None if it is
+        not waiting. Safe to call from other threads (it works on copies).
+        """
+        ahead = 0.0
+        for waiter, _, _ in self._dispatch_order():
+            if waiter.task_id == task_id:
+                return ahead
+            ahead += waiter.cost
+        return None
+
+    def _release(self, reservation: Optional[MemoryReservation]) -> None:
+        self.running -= 1
+        if self.memory_budget and reservation:
+            self.memory_budget.release(reservation)
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self.waiters and self._has_slot():
+            waiter, start, finish = self._dispatch_order()[0]
+            if waiter.future.done():
+                self.waiters.remove(waiter)
+                continue
+            if not self._fits(waiter.reservation):
+                break
+            self.waiters.remove(waiter)
+            self.virtual_time = max(self.virtual_time, start)
+            self.client_finish[waiter.client_id] = finish
+            self._grant(waiter.reservation)
+            waiter.future.set_result(None)
+        # Clients with no backlog left start again from the current virtual time
+        self.client_finish = {c: t for c, t in self.client_finish.items() if t > self.virtual_time}
+
+    def resize(self, capacity: int) -> None:
+        """
+        Change the number of separation slots. Growing admits waiters right away;
+        shrinking lets running separations finish and holds new ones until
+        running drops below the new capacity.
+        """
+        self.capacity = max(1, capacity)
+        self.cpu_allocator.resize(self.capacity)
+        if self.running > self.capacity:
+            app_logger.info("Draining separation slots: %s running, new capacity %s", self.running, self.capacity)
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def slot(self, task_id: str, client_id: str = "anonymous", weight: float = 1.0,
+                   reservation: Optional[MemoryReservation] = None, cost: float = 1.0):
+        """
+        Hold a separation slot, its CPU allotment and its memory reservation for
+        the duration of the block. cost is the job's predicted separation time.
+        """
+        with profile_span("slot_wait"):
+            await self._acquire(task_id, client_id, weight, reservation, cost)
+        cpu_allotment: CpuAllotment = self.cpu_allocator.acquire()
+        self.client_running[client_id] = self.client_running.get(client_id, 0) + 1
+        try:
+            yield cpu_allotment
+        finally:
+            self.client_running[client_id] -= 1
+            if not self.client_running[client_id]:
+                del self.client_running[client_id]
+            self.cpu_allocator.release(cpu_allotment)
+            self._release(reservation)
+
+    def client_stats(self) -> Dict[str, Dict[str, int]]:
+        """Separations running and waiting per client (copies, so other threads may call it)."""
+        stats = {client_id: {"running": count, "waiting": 0} for client_id, count in dict(self.client_running).items()}
+        for waiter in list(self.waiters):
+            stats.setdefault(waiter.client_id, {"running": 0, "waiting": 0})["waiting"] += 1
+        return stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "capacity": self.capacity,
+            "waiting": len(self.waiters),
+            "queued_seconds": round(self.queued_work(), 1),
+            "draining": max(0, self.running - self.capacity)
+        }
@@ -0,0 +1,203 @@
+import asyncio
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from contextlib import contextmanager
+from typing import Dict, Optional, Set, Any
+
+from logger import app_logger
+
+# A failed warm-up (e.g. a transient model load error) is retried with exponential backoff;
+# after WARMUP_ATTEMPTS failures the service reports itself degraded and keeps retrying
+WARMUP_ATTEMPTS = 4
+WARMUP_BACKOFF_SECONDS = 5.0
+WARMUP_MAX_BACKOFF_SECONDS = 300.0
+
+
+class StartupState:
+    """Track startup phase timings and service readiness."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.ready_at: Optional[float] = None
+        # Warm-up keeps failing and is still being retried; not ready meanwhile
+        self.degraded = False
+        self.warmup_error: Optional[str] = None
+        self.warmup_attempts = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Measure the wall-clock duration of a named startup phase."""
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - phase_start
+            with self.lock:
+                self.phases[name] = round(elapsed, 3)
+            app_logger.info(f"Startup phase '{name}' took {elapsed:.3f} seconds")
+
+    def mark_ready(self) -> None:
+        """Flip the readiness flag once the warm-up has finished."""
+        with self.lock:
+            self.ready = True
+            self.degraded = False
+            self.ready_at = time.time()
+        app_logger.info(f"Service ready after {self.ready_at - self.started_at:.2f} seconds. Phases: {self.phases}")
+
+    def mark_degraded(self) -> None:
+        """Report that the warm-up keeps failing; the service stays not ready."""
+        with self.lock:
+            self.degraded = True
+
+    def record_warmup_attempt(self, error: Optional[str]) -> None:
+        """Count a warm-up attempt and keep its error (None clears it)."""
+        with self.lock:
+            self.warmup_attempts += 1
+            self.warmup_error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "ready": self.ready,
+                "degraded": self.degraded,
+                "phases": dict(self.phases),
+                "seconds_since_start": round(time.time() - self.started_at, 3),
+                "time_to_ready": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+                "warmup_error": self.warmup_error,
+                "warmup_attempts": self.warmup_attempts
+            }
+
+
+def prepare_directories(directories, keep: Optional[Set[str]] = None, clean: bool = True) -> None:
+    """
+    Create the working directories and, if clean, empty them of everything
+    except the paths in keep (files or whole directories).
+    """
+    keep = {os.path.abspath(path) for path in keep or ()}
+    for directory in directories:
+        if os.path.exists(directory):
+            if not clean:
+                continue
+            # .gitkeep 파일을 제외하고 모든 파일 삭제
+            for filename in os.listdir(directory):
+                if filename != '.gitkeep':
+                    file_path = os.path.join(directory, filename)
+                    if os.path.abspath(file_path) in keep:
+                        continue
+                    if os.path.isfile(file_path):
+                        os.remove(file_path)
+                    elif os.path.isdir(file_path):
+                        shutil.rmtree(file_path)
+            app_logger.info(f"Cleaned up directory: {directory}")
+        else:
+            os.makedirs(directory, exist_ok=True)
+            app_logger.info(f"Created directory: {directory}")
+
+
+def prefetch_model_files(model_dir: str) -> int:
+    """
+    Memory-map every file of the pretrained model so the checkpoint is paged in
+    before the first separation restores it.
+    Returns: number of bytes mapped
+    """
+    total_bytes = 0
+    if not os.path.isdir(model_dir):
+        app_logger.warning(f"Model directory not found, skipping prefetch: {model_dir}")
+        return total_bytes
+
+    for filename in os.listdir(model_dir):
+        file_path = os.path.join(model_dir, filename)
+        if not os.path.isfile(file_path) or os.path.getsize(file_path) == 0:
+            continue
+        with open(file_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+                    mapped.madvise(mmap.MADV_WILLNEED)
+                # Touch one byte per page to fault the file into the page cache
+                for offset in range(0, len(mapped), mmap.PAGESIZE):
+                    mapped[offset]
+                total_bytes += len(mapped)
+
+    return total_bytes
+
+
+def write_silent_wav(path: str, seconds: float = 1.0, sample_rate: int = 44100) -> None:
+    """Write a short stereo silent WAV clip used for the warm-up inference."""
+    frame_count = int(seconds * sample_rate)
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(b"\x00\x00\x00\x00" * frame_count)
+
+
+def warm_up_once(state: StartupState, model_dir: str, spleeter_model: str, backend: str = "spleeter") -> None:
+    """Prefetch the model and run one warm-up separation; raises if it fails."""
+    with state.phase("model_prefetch"):
+        prefetched = prefetch_model_files(model_dir)
+        app_logger.info(f"Prefetched {prefetched / (1024 * 1024):.1f}MB of model data from {model_dir}")
+
+    with state.phase("warmup_inference"):
+        # Heavy audio/model code is only imported here, off the request path
+        from audio_utils import separate_audio_with_spleeter
+
+        warmup_dir = tempfile.mkdtemp(prefix="warmup_")
+        try:
+            clip_path = os.path.join(warmup_dir, "warmup.wav")
+            write_silent_wav(clip_path)
+            error = asyncio.run(separate_audio_with_spleeter(clip_path, warmup_dir, spleeter_model,
+                                                             backend=backend, model_dir=model_dir))
+            if error:
+                raise RuntimeError(error)
+        finally:
+            shutil.rmtree(warmup_dir, ignore_errors=True)
+
+
+def run_warmup(state: StartupState, model_dir: str, spleeter_model: str, backend: str = "spleeter",
+               attempts: int = WARMUP_ATTEMPTS, backoff_seconds: float = WARMUP_BACKOFF_SECONDS,
+               max_backoff_seconds: float = WARMUP_MAX_BACKOFF_SECONDS) -> None:
+    """
+    Warm up, retrying with exponential backoff capped at max_backoff_seconds,
+    until it succeeds and the service is marked ready. After `attempts` failures
+    the state is flagged degraded with the last error, but stays not ready: the
+    separator has never run, so the probe must not send traffic here yet.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            warm_up_once(state, model_dir, spleeter_model, backend)
+        except Exception as e:
+            state.record_warmup_attempt(str(e))
+            if attempt == attempts:
+                app_logger.error(f"Warm-up failed {attempts} times, reporting degraded and still retrying: {e}")
+                state.mark_degraded()
+            delay = min(backoff_seconds * 2 ** (attempt - 1), max_backoff_seconds)
+            app_logger.warning(f"Warm-up attempt {attempt} failed, retrying in {delay:.0f}s: {e}")
+            time.sleep(delay)
+        else:
+            state.record_warmup_attempt(None)
+            state.mark_ready()
+            return
+
+
+def start_warmup(state: StartupState, model_dir: str, spleeter_model: str, backend: str = "spleeter") -> threading.Thread:
+    """Run the warm-up in a daemon thread so the server can bind immediately."""
+    thread = threading.Thread(
+        target=run_warmup, args=(state, model_dir, spleeter_model, backend),
+        name="warmup", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+# Global startup state instance
+startup_state = StartupState()
@@ -1,15 +1,34 @@
 import asyncio
+import os
+import random
 import time
 import uuid
 from enum import Enum
-from typing import Dict, Optional, Any
-from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Set, Any
+from dataclasses import asdict, dataclass, field, fields
 import threading
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
+from client_limits import CLIENT_LIMIT_ERROR, client_registry
 from config_manager import config_manager
-from file_handlers import validate_file_upload, validate_youtube_url, process_audio_separation
-from logger import app_logger
+from cost_model import CostModel, JobEstimate
+from cpu_allocation import CpuAllocator
+from scheduler import SeparationScheduler
+from audio_utils import cleanup_file
+from file_handlers import (
+    SavedUpload, validate_file_upload, validate_youtube_url, process_audio_separation,
+    process_youtube_progressive, compute_job_key, encode_stems, stem_mp3_paths, probe_duration
+)
+from inference_backend import resolve_backend
+from job_journal import job_journal
+from logger import app_logger, log_context
+from memory_budget import MemoryBudget, MemoryReservation
+from profiler import TaskProfile, activate_profile, span as profile_span
+from quality_tiers import FAST_TIER, FULL_TIER, QualityTier, build_tiers
+from startup import prepare_directories
+from waveform_peaks import PEAKS_FILENAME
+from work_queue import WorkQueue
 
 
 class TaskStatus(Enum):
@@ -33,24 +52,341 @@ class Task:
     vocal_url: Optional[str] = None
     inst_url: Optional[str] = None
     original_url: Optional[str] = None
+    bundle_url: Optional[str] = None
+    # Waveform peaks for the player; None if the separation left none
+    peaks_url: Optional[str] = None
+    # Base URL of /remix; append &vocal=<gain>&inst=<gain>
+    remix_url: Optional[str] = None
     error_message: Optional[str] = None
+    coalesced_with: Optional[str] = None
+    # How much of the audio went through the model and how much was skipped as silence
+    silence_report: Optional[Dict[str, Any]] = None
+    # Estimated and measured peak memory of the separation
+    memory_report: Optional[Dict[str, Any]] = None
+    # Predicted separation and encoding seconds once the audio length is known, and the seconds left
+    predicted_seconds: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    # Quality tier the separation ran at ("full" or "fast"), chosen when it queued for a slot
+    quality_tier: Optional[str] = None
+    profile: Optional[TaskProfile] = field(default=None, repr=False)
 
     def to_dict(self) -> Dict[str, Any]:
-        data = asdict(self)
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name != 'profile'}
         data['status'] = self.status.value
+        data['profiled'] = self.profile is not None
         return data
 
 
+class WorkClock:
+    """
+    A task's timeout, counted only while the task is working. Waits in the
+    separation queue or for a remote worker pause it, so a job that has not
+    started yet cannot time out behind a long queue.
+    """
+
+    def __init__(self, budget: float, on_expire: Callable[[], Any]):
+        self.loop = asyncio.get_running_loop()
+        self.remaining = budget
+        self.on_expire = on_expire
+        self.expired = False
+        self.stopped = False
+        self.started: Optional[float] = None
+        self.handle: Optional[asyncio.TimerHandle] = None
+        self.resume()
+
+    def pause(self):
+        if self.started is None:
+            return
+        self.remaining -= self.loop.time() - self.started
+        self.started = None
+        self.handle.cancel()
+
+    def resume(self):
+        if self.started is not None or self.expired or self.stopped:
+            return
+        self.started = self.loop.time()
+        self.handle = self.loop.call_later(max(0.0, self.remaining), self._expire)
+
+    def _expire(self):
+        self.expired = True
+        self.started = None
+        self.on_expire()
+
+    def stop(self):
+        """The task is over: later resumes (a late heartbeat) leave the clock stopped."""
+        self.pause()
+        self.stopped = True
+
+
 class TaskManager:
     def __init__(self):
         self.tasks: Dict[str, Task] = {}
         self.max_concurrent_tasks = config_manager.get_max_concurrent_tasks()
+        self.max_queued_tasks = config_manager.get_max_queued_tasks()
         self.task_timeout = config_manager.get_task_timeout_seconds()
-        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_tasks)
+        # Per-job limits, read by the request handlers when a job is admitted
+        self.max_file_size_mb = config_manager.get_max_file_size_mb()
+        self.max_duration_seconds = config_manager.get_max_duration_seconds()
+        self.profile_sample_rate = config_manager.get_profile_sample_rate()
+        self.progressive_ingest = config_manager.get_progressive_ingest()
+        # Remote workers lease separations from here; this node only admits jobs and reports status
+        self.work_queue = None
+        if config_manager.get_remote_separation():
+            self.work_queue = WorkQueue(config_manager.get_worker_lease_seconds(), config_manager.get_worker_max_deliveries())
+            if self.progressive_ingest:
+                app_logger.warning("Progressive ingest needs local separation; disabled with remote workers")
+                self.progressive_ingest = False
+        self.silence_threshold_db = config_manager.get_silence_threshold_db() if config_manager.get_skip_silence() else None
+        # Quality tiers: new jobs drop to the fast one while the predicted wait for a slot is too long
+        self.tiers = build_tiers(config_manager.get_spleeter_model(), config_manager.get_separation_backend(),
+                                 config_manager.get_fast_tier_model(), config_manager.get_fast_tier_backend())
+        self.degrade_wait_seconds = config_manager.get_degrade_wait_seconds()
+        self.tier_model_dirs = {name: config_manager.get_model_dir(tier.model) for name, tier in self.tiers.items()}
+        optimized_enabled = config_manager.get_optimized_backends_enabled()
+        self.tier_backends = {name: resolve_backend(tier.backend, self.tier_model_dirs[name], tier.model, optimized_enabled)
+                              for name, tier in self.tiers.items()}
+        self.tier_jobs = {name: 0 for name in self.tiers}
+        # A downmix still goes through the model as two identical channels, so the fast tier only
+        # saves model time with a different model or an optimized export; otherwise it stays off.
+        # Workers resolve backends against their own exports, so for them only the flag is known here
+        effective_backends = self.tier_backends if not self.work_queue else {
+            name: tier.backend if optimized_enabled else "spleeter" for name, tier in self.tiers.items()
+        }
+        fast_separation = (self.tiers[FAST_TIER].model, effective_backends[FAST_TIER])
+        if self.degrade_wait_seconds > 0 and fast_separation == (self.tiers[FULL_TIER].model, effective_backends[FULL_TIER]):
+            app_logger.warning("Fast quality tier would run the same model and backend as full (%s, %s); "
+                               "degrading disabled. Set FAST_TIER_MODEL, or export an optimized backend "
+                               "and set ENABLE_OPTIMIZED_BACKENDS", *fast_separation)
+            self.degrade_wait_seconds = 0
+        self.model_dir = self.tier_model_dirs[FULL_TIER]
+        self.separation_backend = self.tier_backends[FULL_TIER]
+        # Blocking helpers (file writes, web lookups) run here; subprocess stages run on the loop
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_tasks * 2)
+        self.cpu_allocator = CpuAllocator(self.max_concurrent_tasks, config_manager.get_cpu_pinning())
+        self.memory_budget = MemoryBudget(config_manager.get_memory_budget_mb())
+        self.scheduler = SeparationScheduler(self.cpu_allocator, self.memory_budget)
+        # Stage times learned from past runs order the separation queue and drive the ETA
+        self.cost_model = CostModel()
+        self.estimates: Dict[str, JobEstimate] = {}
+        # Running tasks' timeouts, paused while they queue
+        self.work_clocks: Dict[str, WorkClock] = {}
         self.active_tasks = 0
         self.lock = threading.Lock()
+        # Single-flight bookkeeping: job key -> leader task, leader task -> attached tasks
+        self.inflight: Dict[str, str] = {}
+        self.inflight_keys: Dict[str, str] = {}
+        self.followers: Dict[str, List[str]] = {}
+        # Client that submitted each admitted task, for fair share and per-client caps
+        self.task_clients: Dict[str, str] = {}
+        # Seconds of audio separated and skipped as silence since startup
+        self.separated_audio_seconds = 0.0
+        self.skipped_silence_seconds = 0.0
+        
+        # Pipeline event loop: every admitted job is a coroutine on this loop
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.executor)
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, name="task-pipeline", daemon=True)
+        self.loop_thread.start()
+        if self.work_queue:
+            asyncio.run_coroutine_threadsafe(self._reap_leases(), self.loop)
         
-        app_logger.info(f"TaskManager initialized - max_workers: {self.max_concurrent_tasks}, timeout: {self.task_timeout}s")
+        app_logger.info(f"TaskManager initialized - separation slots: {self.max_concurrent_tasks}, "
+                        f"max queued: {self.max_queued_tasks}, timeout: {self.task_timeout}s, "
+                        f"backend: {self.separation_backend}")
+        
+        self.config_watch_seconds = config_manager.get_config_watch_seconds()
+        if self.config_watch_seconds > 0:
+            threading.Thread(target=self._watch_config, name="config-watch", daemon=True).start()
+
+    def get_runtime_settings(self) -> Dict[str, Any]:
+        """Get the settings that can be changed without a restart."""
+        return {
+            "max_concurrent_tasks": self.max_concurrent_tasks,
+            "max_queued_tasks": self.max_queued_tasks,
+            "task_timeout_seconds": self.task_timeout,
+            "max_file_size_mb": self.max_file_size_mb,
+            "max_duration_seconds": self.max_duration_seconds
+        }
+
+    def reconfigure(self, max_concurrent_tasks: Optional[int] = None, max_queued_tasks: Optional[int] = None,
+                    task_timeout_seconds: Optional[int] = None, max_file_size_mb: Optional[int] = None,
+                    max_duration_seconds: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Apply new capacity and limits at runtime. Admitted jobs keep the limits
+        and timeout they started with; shrinking never interrupts running work.
+        """
+        with self.lock:
+            if max_queued_tasks is not None and max_queued_tasks != self.max_queued_tasks:
+                app_logger.info("Admission limit changed: %s -> %s (%s admitted)",
+                                self.max_queued_tasks, max_queued_tasks, self.active_tasks)
+                self.max_queued_tasks = max_queued_tasks
+            if task_timeout_seconds is not None:
+                self.task_timeout = task_timeout_seconds
+            if max_file_size_mb is not None:
+                self.max_file_size_mb = max_file_size_mb
+            if max_duration_seconds is not None:
+                self.max_duration_seconds = max_duration_seconds
+        
+        if max_concurrent_tasks is not None and max_concurrent_tasks != self.max_concurrent_tasks:
+            # The scheduler belongs to the pipeline loop; resize it there
+            asyncio.run_coroutine_threadsafe(self._resize_workers(max_concurrent_tasks), self.loop).result()
+        
+        return self.get_runtime_settings()
+
+    async def _resize_workers(self, slots: int):
+        """Swap in a helper pool sized for the new slot count and resize the separation slots."""
+        app_logger.info("Separation slots changed: %s -> %s", self.max_concurrent_tasks, slots)
+        old_executor = self.executor
+        self.executor = ThreadPoolExecutor(max_workers=slots * 2)
+        self.loop.set_default_executor(self.executor)
+        # Work already queued on the old pool still runs; its threads exit afterwards
+        old_executor.shutdown(wait=False)
+        self.scheduler.resize(slots)
+        self.max_concurrent_tasks = slots
+
+    def _watch_config(self):
+        """Apply edits to the config file without a restart (env variables still take precedence)."""
+        while True:
+            time.sleep(self.config_watch_seconds)
+            try:
+                if config_manager.reload_if_changed():
+                    app_logger.info("Config file changed, applying runtime settings")
+                    self.reconfigure(
+                        max_concurrent_tasks=config_manager.get_max_concurrent_tasks(),
+                        max_queued_tasks=config_manager.get_max_queued_tasks(),
+                        task_timeout_seconds=config_manager.get_task_timeout_seconds(),
+                        max_file_size_mb=config_manager.get_max_file_size_mb(),
+                        max_duration_seconds=config_manager.get_max_duration_seconds()
+                    )
+            except Exception as e:
+                app_logger.error("Failed to apply config changes: %s", e)
+
+    def recover(self, directories: List[str]) -> Dict[str, int]:
+        """
+        Warm restart from the job journal: restore finished tasks whose files
+        survived, resume interrupted ones from their last finished stage, then
+        clean everything no surviving task refers to out of the working directories.
+        """
+        states, calibration = job_journal.replay()
+        output_dir = config_manager.get_output_dir()
+        # Peaks and stage times measured before the restart calibrate the estimators again,
+        # including those of tasks already removed
+        for memory in calibration["memory"] + [state["memory"] for state in states.values() if state.get("memory")]:
+            self.memory_budget.observe(memory.get("channel_seconds"), memory.get("peak_bytes", 0))
+        for costs in calibration["costs"] + [state["costs"] for state in states.values() if state.get("costs")]:
+            self.cost_model.observe(costs.get("audio_seconds"), costs.get("stages", {}), costs.get("tier", FULL_TIER))
+        keep: Set[str] = set()
+        resumes = []
+        counts = {"restored": 0, "resumed": 0, "dropped": 0}
+
+        leaders = {task_id: state for task_id, state in states.items() if not state.get("coalesced_with")}
+        for task_id, state in sorted(leaders.items(), key=lambda item: item[1].get("created_at", 0)):
+            task = Task(
+                task_id=task_id,
+                status=TaskStatus(state.get("status", TaskStatus.PENDING.value)),
+                progress=0,
+                message=state.get("message") or "",
+                created_at=state.get("created_at", time.time()),
+                updated_at=state.get("updated_at", time.time()),
+                input_path=state.get("input_path"),
+                basename=state.get("basename"),
+                error_message=state.get("error_message"),
+                quality_tier=state.get("quality_tier")
+            )
+
+            if task.status == TaskStatus.COMPLETED:
+                result_dir = os.path.join(output_dir, task.basename or "")
+                artifacts = [task.input_path, *stem_mp3_paths(result_dir, task.basename or "")]
+                if not all(path and os.path.exists(path) for path in artifacts):
+                    job_journal.record(task_id, "removed")
+                    counts["dropped"] += 1
+                    continue
+                task.progress = 100
+                self._set_download_urls(task)
+                keep.update([task.input_path, result_dir])
+                counts["restored"] += 1
+
+            elif task.status in (TaskStatus.FAILED, TaskStatus.TIMEOUT):
+                counts["restored"] += 1
+
+            else:
+                resume = self._plan_resume(task, state, output_dir, keep)
+                if resume:
+                    task.status = TaskStatus.PENDING
+                    task.message = "서버 재시작 후 작업을 이어서 진행합니다."
+                    resumes.append((task, state.get("job_key"), state.get("client_id", "anonymous"), resume))
+                    counts["resumed"] += 1
+                else:
+                    task.status = TaskStatus.FAILED
+                    task.error_message = "Input lost in restart"
+                    task.message = "서버 재시작으로 입력 파일이 사라져 작업을 이어갈 수 없습니다. 다시 시도해주세요."
+                    job_journal.record(task_id, "finished", status=task.status.value, message=task.message,
+                                       error_message=task.error_message)
+                    counts["restored"] += 1
+            self.tasks[task_id] = task
+
+        # Resumed jobs were admitted before the restart, so they bypass the admission limit
+        with self.lock:
+            for task, job_key, client_id, _ in resumes:
+                self.active_tasks += 1
+                self.task_clients[task.task_id] = client_id
+                client_registry.try_admit(client_id, enforce_cap=False)
+                if job_key and job_key not in self.inflight:
+                    self.inflight[job_key] = task.task_id
+                    self.inflight_keys[task.task_id] = job_key
+
+        for task_id, state in states.items():
+            leader = self.tasks.get(state.get("coalesced_with"))
+            if task_id in leaders:
+                continue
+            if not leader:
+                job_journal.record(task_id, "removed")
+                counts["dropped"] += 1
+                continue
+            task = Task(task_id=task_id, status=leader.status, progress=leader.progress, message=leader.message,
+                        created_at=state.get("created_at", time.time()), updated_at=time.time(),
+                        coalesced_with=leader.task_id)
+            self._copy_task_state(leader, task)
+            self.tasks[task_id] = task
+            if leader.task_id in self.inflight_keys:
+                self.followers.setdefault(leader.task_id, []).append(task_id)
+            counts["restored"] += 1
+
+        # Orphaned partial outputs go; the journal shrinks to one snapshot per task
+        prepare_directories(directories, keep=keep)
+        job_journal.compact()
+
+        for task, _, _, resume in resumes:
+            asyncio.run_coroutine_threadsafe(resume, self.loop)
+        app_logger.info("Recovered from job journal: %s restored, %s resumed, %s dropped",
+                        counts["restored"], counts["resumed"], counts["dropped"])
+        return counts
+
+    def _plan_resume(self, task: Task, state: Dict[str, Any], output_dir: str, keep: Set[str]):
+        """Pick the coroutine that continues an interrupted job after its last finished stage, None if its input is gone."""
+        stage = state.get("stage")
+        if stage in ("ingested", "separated") and task.input_path and os.path.exists(task.input_path):
+            keep.add(task.input_path)
+            result_dir = os.path.join(output_dir, task.basename)
+            wavs = [os.path.join(result_dir, name) for name in ("vocals.wav", "accompaniment.wav")]
+            if stage == "separated" and all(os.path.exists(path) for path in wavs):
+                keep.add(result_dir)
+                return self._process_task(task.task_id, encode_only=True)
+            return self._process_task(task.task_id)
+
+        upload = SavedUpload(**state["upload"]) if state.get("upload") else None
+        if upload and not os.path.exists(upload.input_path):
+            return None
+        if not upload and not state.get("youtube_url"):
+            return None
+        if upload:
+            keep.add(upload.input_path)
+        # Not ingested yet: run the whole pipeline again
+        return self._process_task_with_input(
+            task.task_id, upload, state.get("youtube_url"),
+            state.get("max_size_mb", self.max_file_size_mb), state.get("max_duration", self.max_duration_seconds),
+            state.get("upload_dir", config_manager.get_upload_dir())
+        )
 
     def create_task_immediate(self) -> str:
         """Create a new background task immediately without input validation."""
@@ -66,7 +402,7 @@ class TaskManager:
         )
         
         self.tasks[task_id] = task
-        app_logger.info(f"Created immediate task {task_id}")
+        app_logger.info("Created immediate task %s", task_id)
         
         return task_id
     
@@ -86,51 +422,104 @@ class TaskManager:
         )
         
         self.tasks[task_id] = task
-        app_logger.info(f"Created task {task_id} for file: {basename}")
+        app_logger.info("Created task %s for file: %s", task_id, basename)
         
         return task_id
 
     def submit_task(self, task_id: str) -> bool:
-        """Submit task to thread pool if capacity allows."""
+        """Submit task to the pipeline loop if capacity allows."""
         with self.lock:
-            if self.active_tasks >= self.max_concurrent_tasks:
-                app_logger.warning(f"Task queue full, rejecting task {task_id}")
+            if self.active_tasks >= self.max_queued_tasks:
+                app_logger.warning("Task queue full, rejecting task %s", task_id)
                 self.tasks[task_id].status = TaskStatus.FAILED
                 self.tasks[task_id].message = "서버가 바쁩니다. 잠시 후 다시 시도해주세요."
                 self.tasks[task_id].error_message = "Task queue full"
                 return False
             
             self.active_tasks += 1
-            app_logger.info(f"Submitting task {task_id} to thread pool ({self.active_tasks}/{self.max_concurrent_tasks})")
+            self._maybe_attach_profile(task_id, False)
+            app_logger.info("Submitting task %s to pipeline (%s/%s)", task_id, self.active_tasks, self.max_queued_tasks)
         
-        # Submit to thread pool
-        future = self.executor.submit(self._process_task, task_id)
+        task = self.tasks[task_id]
+        job_journal.record(task_id, "submitted", status=TaskStatus.PENDING.value, stage="ingested",
+                           created_at=task.created_at, input_path=task.input_path, basename=task.basename)
+        asyncio.run_coroutine_threadsafe(self._process_task(task_id), self.loop)
         return True
     
-    def submit_task_with_input(self, task_id: str, file, youtube_url: str, max_size_mb: int, max_duration: int, upload_dir: str) -> bool:
-        """Submit task with input data for processing."""
+    def submit_task_with_input(self, task_id: str, upload: Optional[SavedUpload], youtube_url: str, max_size_mb: int, max_duration: int, upload_dir: str,
+                               profile: bool = False, client_id: str = "anonymous") -> bool:
+        """
+        Submit task with input data (a saved upload or a YouTube URL) for processing.
+        A rejected task is marked failed; error_message tells a full queue from a per-client cap.
+        """
+        job_key = compute_job_key(upload, youtube_url)
+        
         with self.lock:
-            if self.active_tasks >= self.max_concurrent_tasks:
-                app_logger.warning(f"Task queue full, rejecting task {task_id}")
+            # Attach to an identical in-flight job instead of taking a worker slot
+            leader_id = self.inflight.get(job_key) if job_key else None
+            if leader_id and leader_id in self.tasks:
+                self.followers.setdefault(leader_id, []).append(task_id)
+                task = self.tasks.get(task_id)
+                if task:
+                    task.coalesced_with = leader_id
+                    self._copy_task_state(self.tasks[leader_id], task)
+                app_logger.info("Task %s attached to in-flight task %s (%s)", task_id, leader_id, job_key)
+                job_journal.record(task_id, "coalesced", coalesced_with=leader_id,
+                                   created_at=task.created_at if task else time.time())
+                if upload:
+                    # The leader already has identical content on disk
+                    cleanup_file(upload.input_path)
+                return True
+            
+            if self.active_tasks >= self.max_queued_tasks:
+                app_logger.warning("Task queue full, rejecting task %s", task_id)
                 task = self.tasks.get(task_id)
                 if task:
                     task.status = TaskStatus.FAILED
                     task.message = "서버가 바쁩니다. 잠시 후 다시 시도해주세요."
                     task.error_message = "Task queue full"
+                if upload:
+                    cleanup_file(upload.input_path)
+                return False
+            
+            if not client_registry.try_admit(client_id):
+                app_logger.warning("Client %s at its task limit, rejecting task %s", client_id, task_id)
+                task = self.tasks.get(task_id)
+                if task:
+                    task.status = TaskStatus.FAILED
+                    task.message = "동시에 처리 중인 작업이 너무 많습니다. 이전 작업이 끝난 뒤 다시 시도해주세요."
+                    task.error_message = CLIENT_LIMIT_ERROR
+                if upload:
+                    cleanup_file(upload.input_path)
                 return False
             
             self.active_tasks += 1
-            app_logger.info(f"Submitting task with input {task_id} to thread pool ({self.active_tasks}/{self.max_concurrent_tasks})")
+            self.task_clients[task_id] = client_id
+            if job_key:
+                self.inflight[job_key] = task_id
+                self.inflight_keys[task_id] = job_key
+            self._maybe_attach_profile(task_id, profile)
+            app_logger.info("Submitting task with input %s to pipeline (%s/%s)", task_id, self.active_tasks, self.max_queued_tasks)
         
-        # Submit to thread pool with input processing
-        future = self.executor.submit(self._process_task_with_input, task_id, file, youtube_url, max_size_mb, max_duration, upload_dir)
+        # Everything needed to rerun the job from scratch after a restart
+        task = self.tasks.get(task_id)
+        job_journal.record(task_id, "submitted", status=TaskStatus.PENDING.value, stage="submitted",
+                           created_at=task.created_at if task else time.time(),
+                           upload=asdict(upload) if upload else None, youtube_url=youtube_url,
+                           max_size_mb=max_size_mb, max_duration=max_duration, upload_dir=upload_dir, job_key=job_key,
+                           client_id=client_id)
+        asyncio.run_coroutine_threadsafe(
+            self._process_task_with_input(task_id, upload, youtube_url, max_size_mb, max_duration, upload_dir),
+            self.loop
+        )
         return True
 
-    def _process_task(self, task_id: str):
-        """Process audio separation task in background thread."""
+    async def _process_task(self, task_id: str, encode_only: bool = False):
+        """Process audio separation task on the pipeline loop (encode_only: separation already done)."""
         task = self.tasks.get(task_id)
         if not task:
             return
+        timeout = self.task_timeout
         
         try:
             # Update status to processing
@@ -139,151 +528,530 @@ class TaskManager:
             task.message = "음성 분리 작업을 시작합니다..."
             task.updated_at = time.time()
             
-            app_logger.info(f"Starting audio separation for task {task_id}")
-            
-            # Simulate progress updates
-            self._update_progress(task_id, 20, "파일 분석 중...")
-            
-            # Get configuration
-            spleeter_model = config_manager.get_spleeter_model()
-            output_dir = config_manager.get_output_dir()
+            app_logger.info("Starting audio separation for task %s", task_id)
             
-            # Process audio separation
-            self._update_progress(task_id, 40, "AI 모델로 음성 분리 중...")
-            
-            vocal_mp3_path, inst_mp3_path, error = process_audio_separation(
-                task.input_path, task.basename, output_dir, spleeter_model
-            )
-            
-            if error:
-                task.status = TaskStatus.FAILED
-                task.error_message = error
-                task.message = f"음성 분리 실패: {error}"
-                app_logger.error(f"Task {task_id} failed: {error}")
-            else:
-                # Success - create download URLs
-                from urllib.parse import quote
-                encoded_basename = quote(task.basename)
-                
-                task.status = TaskStatus.COMPLETED
-                task.progress = 100
-                task.message = "음성 분리가 완료되었습니다!"
-                task.vocal_url = f"/download?f={encoded_basename}&t=v"
-                task.inst_url = f"/download?f={encoded_basename}&t=a"
-                task.original_url = f"/download?f={encoded_basename}&t=o"
-                
-                app_logger.info(f"Task {task_id} completed successfully")
+            with activate_profile(task.profile), log_context(task_id=task_id):
+                stage = self._run_encoding(task) if encode_only else self._run_separation(task, 20)
+                await self._run_timed(task_id, stage, timeout)
                 
+        except asyncio.TimeoutError:
+            self._mark_timeout(task, timeout)
+            
         except Exception as e:
             task.status = TaskStatus.FAILED
             task.error_message = str(e)
             task.message = f"예상치 못한 오류: {e}"
-            app_logger.error(f"Task {task_id} failed with exception: {e}")
+            app_logger.error("Task %s failed with exception: %s", task_id, e)
             
         finally:
-            task.updated_at = time.time()
-            with self.lock:
-                self.active_tasks -= 1
-                app_logger.info(f"Task {task_id} finished. Active tasks: {self.active_tasks}")
+            self._finish_task(task)
 
-    def _process_task_with_input(self, task_id: str, file, youtube_url: str, max_size_mb: int, max_duration: int, upload_dir: str):
-        """Process task with input validation and audio separation in background thread."""
+    async def _process_task_with_input(self, task_id: str, upload: Optional[SavedUpload], youtube_url: str, max_size_mb: int, max_duration: int, upload_dir: str):
+        """Process task with input validation and audio separation on the pipeline loop."""
         task = self.tasks.get(task_id)
         if not task:
             return
+        timeout = self.task_timeout
         
         try:
-            # Update status to processing
-            task.status = TaskStatus.PROCESSING
-            task.progress = 5
-            task.message = "입력 데이터 검증 중..."
-            task.updated_at = time.time()
-            
-            app_logger.info(f"Starting input validation for task {task_id}")
-            
-            # Validate and process input
-            if file and file.filename:
-                app_logger.info(f"Processing file upload: {file.filename}")
-                self._update_progress(task_id, 10, "파일 업로드 검증 중...")
-                
-                input_path, basename, error = validate_file_upload(
-                    file, max_size_mb, max_duration, upload_dir
+            with activate_profile(task.profile), log_context(task_id=task_id):
+                await self._run_timed(
+                    task_id, self._run_input_pipeline(task, upload, youtube_url, max_size_mb, max_duration, upload_dir),
+                    timeout
                 )
-                if error:
-                    task.status = TaskStatus.FAILED
-                    task.error_message = error
-                    task.message = f"파일 검증 실패: {error}"
-                    app_logger.error(f"Task {task_id} file validation failed: {error}")
-                    return
-                    
-            elif youtube_url:
-                app_logger.info(f"Processing YouTube URL: {youtube_url}")
-                self._update_progress(task_id, 10, "YouTube URL 검증 중...")
                 
-                input_path, basename, error = validate_youtube_url(
-                    youtube_url, max_size_mb, max_duration, upload_dir
-                )
-                if error:
-                    task.status = TaskStatus.FAILED
-                    task.error_message = error
-                    task.message = f"YouTube 다운로드 실패: {error}"
-                    app_logger.error(f"Task {task_id} YouTube validation failed: {error}")
-                    return
-            else:
-                task.status = TaskStatus.FAILED
-                task.error_message = "No input provided"
-                task.message = "파일 또는 YouTube URL이 제공되지 않았습니다."
-                app_logger.error(f"Task {task_id} failed: No input provided")
-                return
-            
-            # Update task with validated input data
-            task.input_path = input_path
-            task.basename = basename
+        except asyncio.TimeoutError:
+            self._mark_timeout(task, timeout)
             
-            # Continue with audio separation
-            self._update_progress(task_id, 30, "파일 분석 중...")
+        except Exception as e:
+            task.status = TaskStatus.FAILED
+            task.error_message = str(e)
+            task.message = f"예상치 못한 오류: {e}"
+            app_logger.error("Task %s failed with exception: %s", task_id, e)
             
-            # Get configuration
-            spleeter_model = config_manager.get_spleeter_model()
-            output_dir = config_manager.get_output_dir()
+        finally:
+            self._finish_task(task)
+
+    async def _run_timed(self, task_id: str, stage, timeout: float):
+        """
+        Run a task's pipeline under its timeout, which counts only working time:
+        waits for a slot or a worker stop the clock. Raises asyncio.TimeoutError.
+        """
+        runner = asyncio.ensure_future(stage)
+        clock = WorkClock(timeout, runner.cancel)
+        self.work_clocks[task_id] = clock
+        try:
+            return await runner
+        except asyncio.CancelledError:
+            if clock.expired:
+                raise asyncio.TimeoutError from None
+            raise
+        finally:
+            clock.stop()
+            self.work_clocks.pop(task_id, None)
+
+    @asynccontextmanager
+    async def _slot(self, task_id: str, reservation: Optional[MemoryReservation] = None, cost: float = 1.0):
+        """A scheduler slot for the task's client, with the task's timeout stopped until it is granted."""
+        client_id = self.task_clients.get(task_id, "anonymous")
+        clock = self.work_clocks.get(task_id)
+        if clock:
+            clock.pause()
+        async with self.scheduler.slot(task_id, client_id, client_registry.weight(client_id), reservation,
+                                       cost=cost) as cpu_allotment:
+            if clock:
+                clock.resume()
+            yield cpu_allotment
+
+    async def _run_input_pipeline(self, task: Task, upload: Optional[SavedUpload], youtube_url: str, max_size_mb: int, max_duration: int, upload_dir: str):
+        """Ingest stage (upload save or YouTube download) followed by separation."""
+        task_id = task.task_id
+        
+        # Update status to processing
+        task.status = TaskStatus.PROCESSING
+        task.progress = 5
+        task.message = "입력 데이터 검증 중..."
+        task.updated_at = time.time()
+        
+        app_logger.info("Starting input validation for task %s", task_id)
+        
+        # Validate and process input
+        if upload:
+            app_logger.info("Processing file upload: %s", upload.filename)
+            self._update_progress(task_id, 10, "파일 업로드 검증 중...")
             
-            # Process audio separation
-            self._update_progress(task_id, 50, "AI 모델로 음성 분리 중...")
+            with profile_span("ingest", source="upload"), log_context(stage="ingest"):
+                input_path, basename, error = await validate_file_upload(upload, max_duration)
+            if error:
+                task.status = TaskStatus.FAILED
+                task.error_message = error
+                task.message = f"파일 검증 실패: {error}"
+                app_logger.error("Task %s file validation failed: %s", task_id, error)
+                return
+                
+        elif youtube_url and self.progressive_ingest:
+            app_logger.info("Processing YouTube URL progressively: %s", youtube_url)
+            await self._run_progressive_youtube(task, youtube_url, max_size_mb, max_duration, upload_dir)
+            return
             
-            vocal_mp3_path, inst_mp3_path, error = process_audio_separation(
-                input_path, basename, output_dir, spleeter_model
-            )
+        elif youtube_url:
+            app_logger.info("Processing YouTube URL: %s", youtube_url)
+            self._update_progress(task_id, 10, "YouTube URL 검증 중...")
             
+            with profile_span("ingest", source="youtube"), log_context(stage="ingest"):
+                input_path, basename, error = await validate_youtube_url(
+                    youtube_url, max_size_mb, max_duration, upload_dir,
+                    on_progress=self._stage_progress(task_id, 10, 30, "YouTube에서 오디오 다운로드 중")
+                )
             if error:
                 task.status = TaskStatus.FAILED
                 task.error_message = error
-                task.message = f"음성 분리 실패: {error}"
-                app_logger.error(f"Task {task_id} audio separation failed: {error}")
-            else:
-                # Success - create download URLs
-                from urllib.parse import quote
-                encoded_basename = quote(basename)
-                
-                task.status = TaskStatus.COMPLETED
-                task.progress = 100
-                task.message = "음성 분리가 완료되었습니다!"
-                task.vocal_url = f"/download?f={encoded_basename}&t=v"
-                task.inst_url = f"/download?f={encoded_basename}&t=a"
-                task.original_url = f"/download?f={encoded_basename}&t=o"
-                
-                app_logger.info(f"Task {task_id} completed successfully")
-                
-        except Exception as e:
+                task.message = f"YouTube 다운로드 실패: {error}"
+                app_logger.error("Task %s YouTube validation failed: %s", task_id, error)
+                return
+        else:
             task.status = TaskStatus.FAILED
-            task.error_message = str(e)
-            task.message = f"예상치 못한 오류: {e}"
-            app_logger.error(f"Task {task_id} failed with exception: {e}")
-            
+            task.error_message = "No input provided"
+            task.message = "파일 또는 YouTube URL이 제공되지 않았습니다."
+            app_logger.error("Task %s failed: No input provided", task_id)
+            return
+        
+        # Update task with validated input data
+        task.input_path = input_path
+        task.basename = basename
+        job_journal.record(task_id, "ingested", status=TaskStatus.PROCESSING.value, stage="ingested",
+                           input_path=input_path, basename=basename)
+        
+        # Continue with audio separation
+        await self._run_separation(task, 30)
+
+    async def _run_separation(self, task: Task, start_progress: int):
+        """Separation stage (slot-limited) and encoding stage, then publish download URLs."""
+        task_id = task.task_id
+        
+        # Get configuration
+        tier = self._choose_tier(task)
+        output_dir = config_manager.get_output_dir()
+        
+        self._update_progress(task_id, start_progress, "AI 모델 분리 대기 중...")
+        separating = self._stage_progress(task_id, 50, 80, "AI 모델로 음성 분리 중")
+        encoding = self._stage_progress(task_id, 80, 99, "MP3 파일 생성 중")
+        
+        def on_progress(stage: str, fraction: float):
+            if stage == "separating":
+                separating(fraction)
+                if fraction >= 1.0:
+                    # The stem WAVs are on disk: a restart only has to encode them
+                    job_journal.record(task_id, "separated", stage="separated")
+            elif stage == "encoding":
+                encoding(fraction)
+                self._report_stage(task_id, ("encode",), fraction)
+        
+        if self.work_queue:
+            error = await self._run_remote_separation(task, output_dir, tier, on_progress)
+            self._record_costs(task, error)
+            self._publish_result(task, error)
+            return
+        
+        reservation = MemoryReservation(task_id)
+        with profile_span("separation_pipeline"), log_context(stage="separation"):
+            vocal_mp3_path, inst_mp3_path, error = await process_audio_separation(
+                task.input_path, task.basename, output_dir, tier.model,
+                separation_slot=lambda duration, channels: self._separation_slot(task_id, reservation, duration, channels),
+                on_progress=on_progress, backend=self.tier_backends[tier.name],
+                model_dir=self.tier_model_dirs[tier.name], silence_threshold_db=self.silence_threshold_db,
+                on_silence_report=lambda report: self._record_silence(task, report),
+                process_stats=reservation.stats, downmix=tier.downmix, encoder_args=tier.encoder_args
+            )
+        self._record_memory(task, reservation, error)
+        self._record_costs(task, error)
+        self._publish_result(task, error)
+
+    async def _run_remote_separation(self, task: Task, output_dir: str, tier: QualityTier,
+                                     on_progress: Callable[[str, float], None]) -> Optional[str]:
+        """
+        Queue the separation and encoding for a remote worker and wait until it
+        has uploaded the stems to the task's output directory.
+        Returns: error message if failed
+        """
+        task_id = task.task_id
+        result_dir = os.path.join(output_dir, task.basename)
+        os.makedirs(result_dir, exist_ok=True)
+        # Predicted like a local job, so workers lease short jobs first and the ETA counts the queue
+        duration = await probe_duration(task.input_path)
+        estimate = JobEstimate(duration, self.cost_model.predict(("separate", "encode"), duration, tier.name))
+        self.estimates[task_id] = estimate
+        task.predicted_seconds = round(estimate.total, 1)
+        
+        clock = self.work_clocks.get(task_id)
+        
+        def on_worker_progress(stage: str, fraction: float):
+            # A heartbeat means a worker holds the job: the timeout runs from here.
+            # Heartbeats arrive on the request handlers' loop, the clock lives on the pipeline's
+            if clock:
+                clock.loop.call_soon_threadsafe(clock.resume)
+            # Heartbeats carry the worker's stage; the estimate follows it
+            for name, estimated in (("separating", "separate"), ("encoding", "encode")):
+                if stage == name and estimate.stage != estimated:
+                    estimate.end()
+                    estimate.begin(estimated)
+            estimate.report(("separate",), fraction)
+            on_progress(stage, fraction)
+        
+        params = {
+            "basename": task.basename,
+            "extension": os.path.splitext(task.input_path)[1] or ".mp3",
+            "spleeter_model": tier.model,
+            # The worker resolves the backend against its own model exports
+            "backend": tier.backend,
+            "silence_threshold_db": self.silence_threshold_db,
+            "quality_tier": tier.name,
+            "downmix": tier.downmix,
+            "encoder_args": list(tier.encoder_args)
+        }
+        if clock:
+            clock.pause()
+        future = self.work_queue.submit(task_id, self.task_clients.get(task_id, "anonymous"),
+                                        task.input_path, result_dir, params, on_worker_progress,
+                                        cost=estimate.stages["separate"])
+        try:
+            with profile_span("remote_separation"), log_context(stage="separation"):
+                report = await future
         finally:
-            task.updated_at = time.time()
-            with self.lock:
-                self.active_tasks -= 1
-                app_logger.info(f"Task {task_id} finished. Active tasks: {self.active_tasks}")
+            self.work_queue.discard(task_id)
+        
+        if report.get("silence_report"):
+            self._record_silence(task, report["silence_report"])
+        task.memory_report = report.get("memory_report")
+        # The worker's own stage timings replace the heartbeat-paced ones, which include
+        # transfers and heartbeat delay; a worker that sent none leaves nothing to learn from
+        estimate.stage = None
+        estimate.measured = {stage: float(seconds) for stage, seconds in (report.get("stage_seconds") or {}).items()
+                             if stage in estimate.stages}
+        return report.get("error")
+
+    async def _reap_leases(self):
+        """Re-deliver, or fail, remote jobs whose worker stopped renewing the lease."""
+        while True:
+            await asyncio.sleep(1.0)
+            self.work_queue.reap()
+
+    async def _run_encoding(self, task: Task):
+        """Encoding stage alone, for a job whose separation finished before a restart."""
+        task_id = task.task_id
+        result_dir = os.path.join(config_manager.get_output_dir(), task.basename)
+        tier = self.tiers.get(task.quality_tier or FULL_TIER, self.tiers[FULL_TIER])
+        cost = self.cost_model.predict(("encode",), None, tier.name)["encode"]
+        self._update_progress(task_id, 80, "MP3 파일 생성 대기 중...")
+        
+        with profile_span("separation_pipeline"), log_context(stage="encode"):
+            # A slot's CPU share, as the separation would have had, keeps resumed jobs throttled
+            async with self._slot(task_id, cost=cost) as cpu_allotment:
+                self._update_progress(task_id, 80, "MP3 파일 생성 중...")
+                _, _, error = await encode_stems(result_dir, task.basename, cpu_allotment.threads,
+                                                 encoder_args=tier.encoder_args)
+        self._publish_result(task, error)
+
+    async def _run_progressive_youtube(self, task: Task, youtube_url: str, max_size_mb: int, max_duration: int, upload_dir: str):
+        """Download and separation as one overlapped stage (slot-limited), then encoding."""
+        task_id = task.task_id
+        tier = self._choose_tier(task)
+        output_dir = config_manager.get_output_dir()
+        
+        self._update_progress(task_id, 10, "AI 모델 분리 대기 중...")
+        downloading = self._stage_progress(task_id, 10, 50, "YouTube에서 오디오 다운로드 중")
+        separating = self._stage_progress(task_id, 50, 80, "다운로드와 함께 음성 분리 중")
+        encoding = self._stage_progress(task_id, 80, 99, "MP3 파일 생성 중")
+        separation_started = False
+        
+        def on_progress(stage: str, fraction: float):
+            nonlocal separation_started
+            if stage == "downloading" and not separation_started:
+                downloading(fraction)
+            elif stage == "separating":
+                # Once separation reports, it is the slower half and drives the progress bar
+                separation_started = True
+                separating(fraction)
+                self._report_stage(task_id, ("stream",), fraction)
+            elif stage == "encoding":
+                encoding(fraction)
+                self._report_stage(task_id, ("encode",), fraction)
+        
+        reservation = MemoryReservation(task_id)
+        with profile_span("ingest", source="youtube_progressive"), log_context(stage="separation"):
+            input_path, basename, vocal_mp3_path, inst_mp3_path, error = await process_youtube_progressive(
+                youtube_url, max_size_mb, max_duration, upload_dir, output_dir, tier.model,
+                separation_slot=lambda duration, channels: self._separation_slot(task_id, reservation, duration, channels,
+                                                                                 stage="stream"),
+                on_progress=on_progress, backend=self.tier_backends[tier.name],
+                model_dir=self.tier_model_dirs[tier.name], silence_threshold_db=self.silence_threshold_db,
+                on_silence_report=lambda report: self._record_silence(task, report),
+                process_stats=reservation.stats, downmix=tier.downmix, encoder_args=tier.encoder_args
+            )
+        task.input_path = input_path
+        task.basename = basename
+        self._record_memory(task, reservation, error)
+        self._record_costs(task, error)
+        self._publish_result(task, error)
+
+    def _record_silence(self, task: Task, report: Dict[str, Any]):
+        task.silence_report = report
+        with self.lock:
+            self.separated_audio_seconds += report.get("audio_seconds", 0.0)
+            self.skipped_silence_seconds += report.get("skipped_seconds", 0.0)
+
+    def _record_memory(self, task: Task, reservation: MemoryReservation, error: Optional[str]):
+        """Report the separation's estimated and peak memory; successful runs calibrate the estimator."""
+        if not reservation.stats.samples:
+            return
+        task.memory_report = reservation.to_dict()
+        app_logger.info("Task %s separation peak memory %.0fMB (estimated %.0fMB)", task.task_id,
+                        task.memory_report["peak_mb"], task.memory_report["estimated_mb"])
+        # A failed run may have been killed before reaching its real peak
+        if error or reservation.channel_seconds is None:
+            return
+        self.memory_budget.observe(reservation.channel_seconds, reservation.stats.peak_rss_bytes)
+        job_journal.record(task.task_id, "measured", memory={
+            "channel_seconds": reservation.channel_seconds, "peak_bytes": reservation.stats.peak_rss_bytes
+        })
+
+    def _report_stage(self, task_id: str, stages: tuple, fraction: float):
+        estimate = self.estimates.get(task_id)
+        if estimate:
+            estimate.report(stages, fraction)
+
+    def _record_costs(self, task: Task, error: Optional[str]):
+        """Compare the stage times with their predictions; successful runs calibrate the cost model."""
+        estimate = self.estimates.get(task.task_id)
+        if not estimate:
+            return
+        estimate.end()
+        if error or estimate.audio_seconds is None or not estimate.measured:
+            return
+        app_logger.info("Task %s stage times %s (predicted %s)", task.task_id,
+                        {stage: round(seconds, 1) for stage, seconds in estimate.measured.items()},
+                        {stage: round(seconds, 1) for stage, seconds in estimate.stages.items()})
+        tier = task.quality_tier or FULL_TIER
+        self.cost_model.observe(estimate.audio_seconds, estimate.measured, tier)
+        job_journal.record(task.task_id, "measured", costs={
+            "audio_seconds": estimate.audio_seconds, "stages": estimate.measured, "tier": tier
+        })
+
+    def refresh_eta(self, task: Task):
+        """
+        Update a task's ETA from the predictions: its own remaining stages, plus,
+        while it waits for a slot, the predicted work queued ahead of it and still
+        running, spread over the slots.
+        """
+        task_id = task.coalesced_with or task.task_id
+        estimate = self.estimates.get(task_id)
+        if not estimate or task.status not in (TaskStatus.PENDING, TaskStatus.PROCESSING):
+            task.eta_seconds = None
+            return
+        eta = estimate.remaining()
+        if estimate.stage is None:
+            queue = self.work_queue or self.scheduler
+            eta += self._expected_wait(queue.queued_work_ahead(task_id) or 0.0)
+        task.eta_seconds = round(eta, 1)
+
+    def _expected_wait(self, ahead: Optional[float] = None) -> float:
+        """
+        Predicted seconds until a separation slot frees up for a job with `ahead`
+        seconds of work queued in front of it (default: everything queued now):
+        that work plus what is still running, spread over the slots. A free
+        slot with nobody queued for it means no wait.
+        With remote workers their slot count is unknown, so it is taken as the
+        number of leased jobs: while jobs are pending, every worker slot holds one.
+        """
+        if self.work_queue:
+            if ahead is None and not self.work_queue.has_pending():
+                return 0.0
+            queued, slots = self.work_queue.queued_work(), self.work_queue.leased_count()
+        else:
+            if ahead is None and not self.scheduler.waiters and self.scheduler.running < self.scheduler.capacity:
+                return 0.0
+            queued, slots = self.scheduler.queued_work(), self.scheduler.capacity
+        running = sum(e.stage_remaining() for e in list(self.estimates.values()) if e.stage in ("separate", "stream"))
+        return ((queued if ahead is None else ahead) + running) / max(slots, 1)
+
+    def _choose_tier(self, task: Task) -> QualityTier:
+        """
+        Pick the quality tier of a job about to queue for separation: fast while
+        the predicted wait is over DEGRADE_WAIT_SECONDS, full otherwise.
+        """
+        tier = self.tiers[FULL_TIER]
+        if self.degrade_wait_seconds > 0:
+            wait = self._expected_wait()
+            if wait > self.degrade_wait_seconds:
+                tier = self.tiers[FAST_TIER]
+                app_logger.info("Task %s degraded to the %s tier: predicted wait %.0fs > %ss",
+                                task.task_id, tier.name, wait, self.degrade_wait_seconds)
+        task.quality_tier = tier.name
+        job_journal.record(task.task_id, "tiered", quality_tier=tier.name)
+        with self.lock:
+            self.tier_jobs[tier.name] += 1
+        return tier
+
+    def _publish_result(self, task: Task, error: Optional[str]):
+        """Mark the task failed, or completed with its download URLs."""
+        task_id = task.task_id
+        if error:
+            task.status = TaskStatus.FAILED
+            task.error_message = error
+            task.message = f"음성 분리 실패: {error}"
+            app_logger.error("Task %s audio separation failed: %s", task_id, error)
+        else:
+            task.status = TaskStatus.COMPLETED
+            task.progress = 100
+            task.message = "음성 분리가 완료되었습니다!"
+            self._set_download_urls(task)
+            
+            app_logger.info("Task %s completed successfully", task_id)
+
+    def _set_download_urls(self, task: Task):
+        """Create the download URLs of a completed task."""
+        from urllib.parse import quote
+        encoded_basename = quote(task.basename)
+        
+        task.vocal_url = f"/download?f={encoded_basename}&t=v"
+        task.inst_url = f"/download?f={encoded_basename}&t=a"
+        task.original_url = f"/download?f={encoded_basename}&t=o"
+        task.bundle_url = f"/download/bundle?f={encoded_basename}&t=vao"
+        task.remix_url = f"/remix?f={encoded_basename}"
+        if os.path.exists(os.path.join(config_manager.get_output_dir(), task.basename, PEAKS_FILENAME)):
+            task.peaks_url = f"/peaks?f={encoded_basename}"
+
+    @asynccontextmanager
+    async def _separation_slot(self, task_id: str, reservation: Optional[MemoryReservation] = None,
+                               duration: Optional[float] = None, channels: Optional[int] = None,
+                               stage: str = "separate"):
+        """
+        A separation slot, queued fairly against other clients' jobs by predicted
+        cost and sized against the memory budget. The time spent holding it is
+        measured as `stage`, and encoding is timed from its release.
+        """
+        if reservation:
+            self.memory_budget.size(reservation, duration, channels)
+            app_logger.info("Task %s estimated separation memory: %.0fMB",
+                            task_id, reservation.estimate_bytes / (1024 * 1024))
+        task = self.tasks.get(task_id)
+        tier = task.quality_tier if task and task.quality_tier else FULL_TIER
+        estimate = JobEstimate(duration, self.cost_model.predict((stage, "encode"), duration, tier))
+        self.estimates[task_id] = estimate
+        if task:
+            task.predicted_seconds = round(estimate.total, 1)
+        async with self._slot(task_id, reservation, cost=estimate.stages[stage]) as cpu_allotment:
+            estimate.begin(stage)
+            yield cpu_allotment
+        estimate.end()
+        estimate.begin("encode")
+
+    def _maybe_attach_profile(self, task_id: str, requested: bool):
+        """Profile the task if the request asked for it or it falls in the sampling rate."""
+        task = self.tasks.get(task_id)
+        if task and (requested or random.random() < self.profile_sample_rate):
+            task.profile = TaskProfile(task_id)
+            app_logger.info("Profiling enabled for task %s", task_id)
+
+    def _mark_timeout(self, task: Task, timeout: int):
+        task.status = TaskStatus.TIMEOUT
+        task.error_message = f"Task exceeded {timeout}s"
+        task.message = "작업 시간이 초과되었습니다. 더 짧은 오디오로 다시 시도해주세요."
+        app_logger.error("Task %s timed out after %ss", task.task_id, timeout)
+
+    def _finish_task(self, task: Task):
+        """Release the admission slot and share the final state with attached tasks."""
+        task_id = task.task_id
+        task.updated_at = time.time()
+        job_journal.record(task_id, "finished", status=task.status.value, message=task.message,
+                           error_message=task.error_message, input_path=task.input_path,
+                           basename=task.basename, updated_at=task.updated_at)
+        self.estimates.pop(task_id, None)
+        task.eta_seconds = None
+        with self.lock:
+            self.active_tasks -= 1
+            client_id = self.task_clients.pop(task_id, None)
+            if client_id:
+                client_registry.release(client_id)
+            job_key = self.inflight_keys.pop(task_id, None)
+            if job_key and self.inflight.get(job_key) == task_id:
+                del self.inflight[job_key]
+            follower_ids = self.followers.pop(task_id, [])
+            app_logger.info("Task %s finished. Active tasks: %s", task_id, self.active_tasks)
+        
+        for follower_id in follower_ids:
+            follower = self.tasks.get(follower_id)
+            if follower:
+                self._copy_task_state(task, follower)
+        if follower_ids:
+            app_logger.info("Task %s shared its result with %s attached tasks", task_id, len(follower_ids))
+
+    def _stage_progress(self, task_id: str, start: int, end: int, message: str) -> Callable[[float], None]:
+        """Map a stage's 0..1 progress onto the task's start..end percentage range."""
+        def on_progress(fraction: float):
+            percent = int(fraction * 100)
+            self._update_progress(task_id, start + int((end - start) * fraction), f"{message}... {percent}%")
+        return on_progress
+
+    def _copy_task_state(self, source: Task, target: Task):
+        """Mirror a leader task's progress and results onto an attached task."""
+        target.status = source.status
+        target.progress = source.progress
+        target.message = source.message
+        target.input_path = source.input_path
+        target.basename = source.basename
+        target.vocal_url = source.vocal_url
+        target.inst_url = source.inst_url
+        target.original_url = source.original_url
+        target.bundle_url = source.bundle_url
+        target.peaks_url = source.peaks_url
+        target.remix_url = source.remix_url
+        target.error_message = source.error_message
+        target.silence_report = source.silence_report
+        target.memory_report = source.memory_report
+        target.predicted_seconds = source.predicted_seconds
+        target.quality_tier = source.quality_tier
+        target.updated_at = source.updated_at
 
     def _update_progress(self, task_id: str, progress: int, message: str):
         """Update task progress."""
@@ -292,6 +1060,18 @@ class TaskManager:
             task.progress = progress
             task.message = message
             task.updated_at = time.time()
+            
+            for follower_id in self.followers.get(task_id, []):
+                follower = self.tasks.get(follower_id)
+                if follower:
+                    self._copy_task_state(task, follower)
+
+    def get_profile(self, task_id: str) -> Optional[TaskProfile]:
+        """Get the profile recorded for a task, following coalesced tasks to their leader."""
+        task = self.tasks.get(task_id)
+        if task and not task.profile and task.coalesced_with:
+            task = self.tasks.get(task.coalesced_with)
+        return task.profile if task else None
 
     def get_task(self, task_id: str) -> Optional[Task]:
         """Get task by ID."""
@@ -310,7 +1090,17 @@ class TaskManager:
         
         for task_id in tasks_to_remove:
             del self.tasks[task_id]
-            app_logger.info(f"Cleaned up old task: {task_id}")
+            job_journal.record(task_id, "removed")
+            app_logger.info("Cleaned up old task: %s", task_id)
+        if tasks_to_remove:
+            job_journal.compact()
+
+    def _client_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-client usage: admission counters plus separations running and waiting."""
+        stats = client_registry.get_stats()
+        for client_id, usage in self.scheduler.client_stats().items():
+            stats.setdefault(client_id, {}).update(usage)
+        return stats
 
     def get_stats(self) -> Dict[str, Any]:
         """Get task manager statistics."""
@@ -319,6 +1109,7 @@ class TaskManager:
         processing_tasks = sum(1 for t in self.tasks.values() if t.status == TaskStatus.PROCESSING)
         completed_tasks = sum(1 for t in self.tasks.values() if t.status == TaskStatus.COMPLETED)
         failed_tasks = sum(1 for t in self.tasks.values() if t.status == TaskStatus.FAILED)
+        coalesced_tasks = sum(1 for t in self.tasks.values() if t.coalesced_with)
         
         return {
             "total_tasks": total_tasks,
@@ -326,8 +1117,38 @@ class TaskManager:
             "processing_tasks": processing_tasks,
             "completed_tasks": completed_tasks,
             "failed_tasks": failed_tasks,
-            "active_workers": self.active_tasks,
-            "max_workers": self.max_concurrent_tasks
+            "coalesced_tasks": coalesced_tasks,
+            "inflight_jobs": len(self.inflight),
+            "active_workers": self.scheduler.running,
+            "max_workers": self.max_concurrent_tasks,
+            "separation_backend": self.separation_backend,
+            "progressive_ingest": self.progressive_ingest,
+            "silence": {
+                "threshold_db": self.silence_threshold_db,
+                "separated_audio_seconds": round(self.separated_audio_seconds, 1),
+                "skipped_seconds": round(self.skipped_silence_seconds, 1),
+                "skipped_ratio": round(self.skipped_silence_seconds / self.separated_audio_seconds, 3)
+                                 if self.separated_audio_seconds else 0.0
+            },
+            "admitted_tasks": self.active_tasks,
+            "max_queued_tasks": self.max_queued_tasks,
+            "waiting_for_separation": len(self.scheduler.waiters),
+            "scheduling": {
+                "queued_seconds": self.scheduler.get_stats()["queued_seconds"],
+                "expected_wait_seconds": round(self._expected_wait(), 1),
+                "cost_model": self.cost_model.to_dict()
+            },
+            "quality_tiers": {
+                "degrade_wait_seconds": self.degrade_wait_seconds,
+                "tiers": {name: {**tier.to_dict(), "resolved_backend": self.tier_backends[name],
+                                 "jobs": self.tier_jobs[name]}
+                          for name, tier in self.tiers.items()}
+            },
+            "clients": self._client_stats(),
+            "memory": self.memory_budget.get_stats(),
+            "remote_workers": self.work_queue.get_stats() if self.work_queue else None,
+            "draining_workers": max(0, self.scheduler.running - self.max_concurrent_tasks),
+            "cpu": self.cpu_allocator.report()
         }
 
 
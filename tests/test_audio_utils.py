@@ -0,0 +1,62 @@
+import asyncio
+import os
+
+import pytest
+
+import audio_utils
+
+SIGPIPE_EXIT = -13
+
+
+def fake_pipeline(monkeypatch, ytdlp, ffmpeg, separator):
+    results = {"yt-dlp": ytdlp, "ffmpeg": ffmpeg, "separator": separator}
+
+    async def run_command(cmd, stdin_fd=None, stdout_fd=None, **kwargs):
+        for fd in (stdin_fd, stdout_fd):
+            if fd is not None:
+                os.close(fd)
+        if cmd[0] == "ffmpeg":
+            return results["ffmpeg"]
+        return results["separator" if "inference_backend" in cmd else "yt-dlp"]
+
+    monkeypatch.setattr(audio_utils, "run_command", run_command)
+
+
+def separate(tmp_path):
+    return asyncio.run(audio_utils.stream_youtube_separation(
+        "https://youtu.be/x", str(tmp_path / "original.mp3"), str(tmp_path)
+    ))
+
+
+def test_separator_crash_is_reported_over_upstream_broken_pipes(monkeypatch, tmp_path):
+    fake_pipeline(monkeypatch,
+                  ytdlp=(1, "", "ERROR: [Errno 32] Broken pipe"),
+                  ffmpeg=(1, "", "av_interleaved_write_frame(): Broken pipe"),
+                  separator=(1, "", "MemoryError"))
+    assert separate(tmp_path) == "오디오 분리 중 오류: MemoryError"
+
+
+def test_upstream_failure_is_reported_when_it_is_not_a_broken_pipe(monkeypatch, tmp_path):
+    fake_pipeline(monkeypatch,
+                  ytdlp=(1, "", "ERROR: HTTP Error 403: Forbidden"),
+                  ffmpeg=(0, "", ""),
+                  separator=(0, "", ""))
+    assert separate(tmp_path) == "YouTube 오디오 다운로드 실패: ERROR: HTTP Error 403: Forbidden"
+
+
+def test_broken_pipe_is_reported_when_nothing_else_failed(monkeypatch, tmp_path):
+    fake_pipeline(monkeypatch,
+                  ytdlp=(SIGPIPE_EXIT, "", ""),
+                  ffmpeg=(0, "", ""),
+                  separator=(0, "", ""))
+    assert separate(tmp_path) == f"YouTube 오디오 다운로드 실패: exit code {SIGPIPE_EXIT}"
+
+
+@pytest.mark.parametrize("returncode, stderr, expected", [
+    (SIGPIPE_EXIT, "", True),
+    (141, "", True),
+    (1, "Error writing trailer of pipe:1: Broken pipe", True),
+    (1, "Invalid data found when processing input", False),
+])
+def test_is_broken_pipe(returncode, stderr, expected):
+    assert audio_utils.is_broken_pipe(returncode, stderr) is expected
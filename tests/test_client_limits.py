@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import client_limits
+from client_limits import ClientRegistry, TokenBucket
+
+
+def registry(trusted_proxy_hops=0, weights=None):
+    return ClientRegistry(10, 5, 4, weights or {}, trusted_proxy_hops)
+
+
+def test_forwarded_for_entries_left_of_the_trusted_proxies_are_ignored():
+    # The left-most entries are whatever the client sent; each trusted proxy appends one on the right
+    spoofed = "203.0.113.9, 198.51.100.7"
+
+    assert registry(0).identify("10.0.0.1", forwarded_for=f"{spoofed}, 192.0.2.1") == "ip:10.0.0.1"
+    assert registry(1).identify("10.0.0.1", forwarded_for=f"{spoofed}, 192.0.2.1") == "ip:192.0.2.1"
+    assert registry(2).identify("10.0.0.1", forwarded_for=f"{spoofed}, 192.0.2.1, 10.0.0.2") == "ip:192.0.2.1"
+    # Fewer entries than trusted hops: the left-most one is the proxy's own view of the client
+    assert registry(2).identify("10.0.0.1", forwarded_for="192.0.2.1") == "ip:192.0.2.1"
+    assert registry(1).identify("10.0.0.1", forwarded_for=" , ") == "ip:10.0.0.1"
+
+
+def test_only_configured_api_keys_identify_a_client():
+    clients = registry(weights={"secret-key": 3.0, "10.0.0.5": 2.0})
+
+    keyed = clients.identify("10.0.0.1", api_key="secret-key")
+    assert keyed.startswith("key:") and "secret-key" not in keyed
+    assert clients.weight(keyed) == 3.0
+    assert clients.identify("10.0.0.1", api_key="made-up") == "ip:10.0.0.1"
+    assert clients.weight("ip:10.0.0.5") == 2.0 and clients.weight("ip:10.0.0.1") == 1.0
+
+
+def test_token_bucket_allows_a_burst_then_refills_at_the_rate(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(client_limits, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    bucket = TokenBucket(rate_per_minute=6, burst=2, updated_at=now[0])
+
+    assert bucket.take() is None and bucket.take() is None
+    # One token every 10s
+    assert bucket.take() == 10.0
+    now[0] += 5.0
+    assert bucket.take() == 5.0
+    now[0] += 5.0
+    assert bucket.take() is None
+    # Idle time never banks more than the burst
+    now[0] += 3600.0
+    assert [bucket.take() is None for _ in range(3)] == [True, True, False]
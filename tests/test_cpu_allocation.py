@@ -0,0 +1,53 @@
+import pytest
+
+import cpu_allocation
+from cpu_allocation import CpuAllocator
+
+
+@pytest.fixture
+def eight_cpus(monkeypatch):
+    monkeypatch.setattr(cpu_allocation, "get_affinity_cpus", lambda: list(range(8)))
+    monkeypatch.setattr(cpu_allocation, "read_cgroup_cpu_quota", lambda: None)
+
+
+def test_acquire_beyond_slots_raises_instead_of_sharing(eight_cpus):
+    allocator = CpuAllocator(2)
+    first, second = allocator.acquire(), allocator.acquire()
+    assert {first.slot, second.slot} == {0, 1}
+    assert not allocator.has_free()
+
+    with pytest.raises(RuntimeError):
+        allocator.acquire()
+
+    allocator.release(first)
+    allocator.release(first)
+    assert allocator.free_slots == [first.slot]
+    assert allocator.acquire().slot == first.slot
+    with pytest.raises(RuntimeError):
+        allocator.acquire()
+
+
+def test_resize_never_pins_new_slots_onto_cpus_of_draining_slots(eight_cpus):
+    allocator = CpuAllocator(2, pinning=True)
+    first, second = allocator.acquire(), allocator.acquire()
+    assert first.cpus == [0, 1, 2, 3] and second.cpus == [4, 5, 6, 7]
+
+    allocator.resize(4)
+    # Every CPU is still held by the two running jobs
+    assert not allocator.has_free()
+
+    allocator.release(second)
+    running = [first]
+    while allocator.has_free():
+        running.append(allocator.acquire())
+    assert len(running) == 3
+    pinned = [cpu for allotment in running for cpu in allotment.cpus]
+    assert len(pinned) == len(set(pinned))
+
+    allocator.release(first)
+    running.remove(first)
+    running.append(allocator.acquire())
+    running.append(allocator.acquire())
+    assert len(running) == 4
+    pinned = [cpu for allotment in running for cpu in allotment.cpus]
+    assert sorted(pinned) == list(range(8))
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import wave
+
+import audio_utils
+from file_handlers import encode_stems, stem_mp3_paths
+
+
+def fake_ffmpeg(monkeypatch):
+    """Behaves like ffmpeg's refusal to replace an existing output without -y."""
+    async def run_command(cmd, on_stdout_line=None, **kwargs):
+        output_path = cmd[-1]
+        if os.path.exists(output_path) and "-y" not in cmd:
+            return 1, "", f"File '{output_path}' already exists. Exiting."
+        with open(output_path, "wb") as f:
+            f.write(b"ID3 complete")
+        return 0, "", ""
+
+    monkeypatch.setattr(audio_utils, "run_command", run_command)
+
+
+def write_silent_wav(path):
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(44100)
+        wav_file.writeframes(b"\0" * 4096)
+
+
+def test_encoding_resumed_over_partial_mp3s_replaces_them(monkeypatch, tmp_path):
+    fake_ffmpeg(monkeypatch)
+    write_silent_wav(tmp_path / "vocals.wav")
+    write_silent_wav(tmp_path / "accompaniment.wav")
+    # A crash mid-encode left truncated MP3s behind
+    vocal_mp3_path, inst_mp3_path = stem_mp3_paths(str(tmp_path), "song")
+    for path in (vocal_mp3_path, inst_mp3_path):
+        with open(path, "wb") as f:
+            f.write(b"ID3 trunc")
+
+    vocal, inst, error = asyncio.run(encode_stems(str(tmp_path), "song"))
+
+    assert error is None
+    assert (vocal, inst) == (vocal_mp3_path, inst_mp3_path)
+    for path in (vocal, inst):
+        with open(path, "rb") as f:
+            assert f.read() == b"ID3 complete"
+    assert not (tmp_path / "vocals.wav").exists()
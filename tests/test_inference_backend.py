@@ -0,0 +1,153 @@
+import io
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import inference_backend
+from inference_backend import (
+    POST_ROLL_SECONDS, PRE_ROLL_SECONDS, SAMPLE_RATE, SILENCE_FRAME, find_active_regions,
+    separate_active, separate_file, stream_separate
+)
+from waveform_peaks import PEAKS_FILENAME
+
+
+class IdentitySeparator:
+    """Vocals are half the input, accompaniment the input itself; records each call's length."""
+    instruments = ["vocals", "accompaniment"]
+
+    def __init__(self):
+        self.calls = []
+
+    def separate(self, waveform):
+        self.calls.append(len(waveform))
+        return {"vocals": waveform * 0.5, "accompaniment": waveform.copy()}
+
+
+class WindowTagSeparator(IdentitySeparator):
+    """Every call's stems are a constant: 0.1 for the first window, 0.2 for the second, ..."""
+
+    def separate(self, waveform):
+        self.calls.append(len(waveform))
+        level = 0.1 * len(self.calls)
+        return {instrument: np.full_like(waveform, level) for instrument in self.instruments}
+
+
+def read_wav(path):
+    with wave.open(str(path), "rb") as wav_file:
+        channels = wav_file.getnchannels()
+        pcm = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2")
+    return pcm.reshape(-1, channels).astype(np.float32) / 32767.0
+
+
+def bursts(length, spans, level=0.5):
+    """Stereo silence of length samples with constant-level bursts over (start, end) sample spans."""
+    waveform = np.zeros((length, 2), dtype=np.float32)
+    for start, end in spans:
+        waveform[start:end] = level
+    return waveform
+
+
+def test_silent_input_has_no_regions_and_skips_the_model():
+    waveform = np.zeros((3 * SAMPLE_RATE, 2), dtype=np.float32)
+    separator = IdentitySeparator()
+
+    assert find_active_regions(waveform, -50.0) == []
+    stems, report = separate_active(separator, waveform, -50.0)
+
+    assert separator.calls == []
+    assert all(stem.shape == waveform.shape and not stem.any() for stem in stems.values())
+    assert report == {"audio_seconds": 3.0, "inferred_seconds": 0.0, "skipped_seconds": 3.0, "regions": 0}
+
+
+def test_regions_keep_the_rolls_and_bridge_short_gaps():
+    second = SAMPLE_RATE
+    # The last burst runs to an end that is not a whole number of analysis frames
+    length = 9 * second + 333
+    waveform = bursts(length, [(2 * second, 3 * second), (int(3.5 * second), 4 * second), (6 * second, length)])
+
+    regions = find_active_regions(waveform, -50.0)
+
+    # 0.5s between the first two bursts is bridged, 2s before the third is not
+    assert len(regions) == 2
+    (first_start, first_end), (second_start, second_end) = regions
+    pre, post = PRE_ROLL_SECONDS * second, POST_ROLL_SECONDS * second
+    assert 2 * second - pre - 2 * SILENCE_FRAME <= first_start <= 2 * second - pre
+    assert 4 * second + post <= first_end <= 4 * second + post + 2 * SILENCE_FRAME
+    assert 6 * second - pre - 2 * SILENCE_FRAME <= second_start <= 6 * second - pre
+    assert second_end == length
+
+
+def test_spliced_stems_match_the_input_length_and_the_active_audio():
+    second = SAMPLE_RATE
+    length = 9 * second + 333
+    rng = np.random.default_rng(0)
+    waveform = bursts(length, [])
+    for start, end in [(2 * second, 3 * second), (6 * second, length)]:
+        waveform[start:end] = rng.uniform(-0.5, 0.5, (end - start, 2))
+    separator = IdentitySeparator()
+
+    stems, report = separate_active(separator, waveform, -50.0)
+
+    regions = find_active_regions(waveform, -50.0)
+    assert separator.calls == [end - start for start, end in regions]
+    assert report["regions"] == 2 and report["audio_seconds"] == round(length / second, 3)
+    assert report["inferred_seconds"] + report["skipped_seconds"] == pytest.approx(report["audio_seconds"], abs=0.002)
+    # Inside the regions the model's output, outside them (only silence) zeros: equal to separating it all
+    assert stems["vocals"].shape == waveform.shape
+    np.testing.assert_array_equal(stems["vocals"], waveform * 0.5)
+    np.testing.assert_array_equal(stems["accompaniment"], waveform)
+
+
+@pytest.mark.parametrize("downmix", [False, True])
+def test_separate_file_writes_stems_of_the_input_length(tmp_path, monkeypatch, downmix):
+    rng = np.random.default_rng(1)
+    waveform = rng.uniform(-0.5, 0.5, (SAMPLE_RATE + 77, 2)).astype(np.float32)
+    monkeypatch.setattr(inference_backend, "decode_audio", lambda path, sample_rate: waveform)
+
+    written, report = separate_file(IdentitySeparator(), str(tmp_path / "song.mp3"), str(tmp_path), downmix=downmix)
+
+    assert written == [str(tmp_path / "song" / "vocals.wav"), str(tmp_path / "song" / "accompaniment.wav")]
+    assert report["regions"] == 1
+    expected = waveform.mean(axis=1, keepdims=True) if downmix else waveform
+    accompaniment = read_wav(written[1])
+    assert accompaniment.shape == (len(waveform), 1 if downmix else 2)
+    np.testing.assert_allclose(accompaniment, expected, atol=1e-4)
+    assert (tmp_path / "song" / PEAKS_FILENAME).exists()
+
+
+# Windows of 2000 samples at 1kHz with 500 of overlap: lengths ending mid-window, exactly
+# on a window boundary, exactly where a read fills the window and its overlap, and shorter than one window
+@pytest.mark.parametrize("length", [5300, 6000, 4500, 2000, 700])
+def test_streamed_separation_matches_a_single_pass_across_seams(tmp_path, length):
+    rng = np.random.default_rng(length)
+    waveform = rng.uniform(-0.5, 0.5, (length, 2)).astype(np.float32)
+    separator = IdentitySeparator()
+
+    report = stream_separate(separator, io.BytesIO(waveform.tobytes()), str(tmp_path), sample_rate=1000,
+                             window_seconds=2.0, overlap_seconds=0.5)
+
+    single_pass, _ = separate_active(IdentitySeparator(), waveform, None, 1000)
+    assert report["audio_seconds"] == length / 1000
+    for instrument in ("vocals", "accompaniment"):
+        streamed = read_wav(tmp_path / f"{instrument}.wav")
+        assert streamed.shape == waveform.shape
+        np.testing.assert_allclose(streamed, single_pass[instrument], atol=1e-4)
+
+
+def test_streamed_windows_crossfade_over_the_overlap(tmp_path):
+    waveform = np.zeros((4500, 2), dtype=np.float32)
+    separator = WindowTagSeparator()
+
+    stream_separate(separator, io.BytesIO(waveform.tobytes()), str(tmp_path), sample_rate=1000,
+                    window_seconds=2.0, overlap_seconds=0.5)
+
+    # Windows start at 0, 2000 and 4000 and each also covers the next 500 samples
+    assert separator.calls == [2500, 2500, 500]
+    vocals = read_wav(tmp_path / "vocals.wav")[:, 0]
+    ramp = np.linspace(0.0, 1.0, 500)
+    np.testing.assert_allclose(vocals[:2000], 0.1, atol=1e-4)
+    np.testing.assert_allclose(vocals[2000:2500], 0.1 + 0.1 * ramp, atol=1e-4)
+    np.testing.assert_allclose(vocals[2500:4000], 0.2, atol=1e-4)
+    np.testing.assert_allclose(vocals[4000:], 0.2 + 0.1 * ramp, atol=1e-4)
@@ -0,0 +1,29 @@
+from job_journal import JobJournal
+
+
+def test_records_reach_disk_through_the_writer_thread(tmp_path):
+    journal = JobJournal(str(tmp_path / "jobs.jsonl"))
+    journal.record("a", "submitted", status="pending")
+    journal.record("a", "finished", status="completed")
+    assert journal.flush(timeout=5.0)
+
+    states, _ = JobJournal(journal.path).replay()
+    assert states == {"a": {"status": "completed"}}
+
+
+def test_compaction_keeps_measurements_of_removed_tasks(tmp_path):
+    journal = JobJournal(str(tmp_path / "jobs.jsonl"))
+    memory = {"channel_seconds": 360.0, "peak_bytes": 900_000_000}
+    costs = {"audio_seconds": 180.0, "stages": {"separate": 40.0}, "tier": "full"}
+    journal.record("old", "measured", memory=memory)
+    journal.record("old", "measured", costs=costs)
+    journal.record("old", "removed")
+    journal.record("live", "submitted", status="pending")
+    assert journal.compact() == 1
+    journal.record("newer", "measured", costs=costs)
+    journal.record("newer", "removed")
+    assert journal.compact() == 1
+
+    states, calibration = JobJournal(journal.path).replay()
+    assert list(states) == ["live"]
+    assert calibration == {"memory": [memory], "costs": [costs, costs]}
@@ -0,0 +1,56 @@
+import os
+import threading
+
+import remix
+from remix import PCM_SUFFIX, REMIX_DIRNAME
+
+
+def make_pcm(output_dir, job, mtime):
+    remix_dir = output_dir / job / REMIX_DIRNAME
+    remix_dir.mkdir(parents=True)
+    paths = [remix_dir / f"{stem}{PCM_SUFFIX}" for stem in ("vocals", "accompaniment")]
+    for path in paths:
+        path.write_bytes(b"\0" * 16)
+        os.utime(path, (mtime, mtime))
+    (remix_dir / "v100_a020.mp3").write_bytes(b"mp3")
+    return paths
+
+
+def test_evict_pcm_keeps_the_most_recently_remixed_jobs(tmp_path):
+    jobs = {f"job{index}": make_pcm(tmp_path, f"job{index}", 1000 + index) for index in range(5)}
+    (tmp_path / "not_remixed").mkdir()
+
+    remix._evict_pcm(str(tmp_path), keep=2)
+
+    kept = {job for job, paths in jobs.items() if all(path.exists() for path in paths)}
+    assert kept == {"job3", "job4"}
+    # Encoded mixes stay; they have their own per-job cache limit
+    assert all((tmp_path / job / REMIX_DIRNAME / "v100_a020.mp3").exists() for job in jobs)
+
+
+def test_decode_lock_entries_are_dropped_once_unused(tmp_path):
+    result_dir = str(tmp_path / "job")
+    entered = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def decode(name, wait):
+        with remix._decode_lock(result_dir):
+            order.append(name)
+            entered.set()
+            if wait:
+                release.wait(5)
+
+    first = threading.Thread(target=decode, args=("first", True))
+    first.start()
+    assert entered.wait(5)
+    second = threading.Thread(target=decode, args=("second", False))
+    second.start()
+    while remix._decode_locks[result_dir][1] < 2:
+        pass
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert order == ["first", "second"]
+    assert result_dir not in remix._decode_locks
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import cpu_allocation
+import scheduler as scheduler_module
+from cpu_allocation import CpuAllocator
+from scheduler import SeparationScheduler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A frozen monotonic clock for the scheduler's aging; advance it by adding to clock[0]."""
+    monkeypatch.setattr(cpu_allocation, "get_affinity_cpus", lambda: list(range(2)))
+    monkeypatch.setattr(cpu_allocation, "read_cgroup_cpu_quota", lambda: None)
+    now = [1000.0]
+    # Only the scheduler's clock: the event loop keeps the real one
+    monkeypatch.setattr(scheduler_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+async def job(scheduler, order, task_id, client_id, cost):
+    async with scheduler.slot(task_id, client_id, 1.0, cost=cost):
+        order.append(task_id)
+        await asyncio.sleep(0)
+
+
+def run_queued(scheduler, jobs, clock=None, waits=None):
+    """
+    Hold the only slot while jobs (task_id, client_id, cost) queue in the given
+    order, the clock advancing by waits[task_id] after each; then let them run.
+    Returns: the run order
+    """
+    async def scenario():
+        order, tasks = [], []
+        holder = scheduler.slot("holder")
+        await holder.__aenter__()
+        for task_id, client_id, cost in jobs:
+            tasks.append(asyncio.ensure_future(job(scheduler, order, task_id, client_id, cost)))
+            await asyncio.sleep(0)
+            if waits and task_id in waits:
+                clock[0] += waits[task_id]
+        await holder.__aexit__(None, None, None)
+        await asyncio.wait_for(asyncio.gather(*tasks), 5.0)
+        return order
+
+    return asyncio.run(scenario())
+
+
+def test_one_clients_backlog_does_not_starve_another(clock):
+    jobs = [(f"a{i}", "ip:a", 60.0) for i in range(4)] + [("b0", "ip:b", 60.0)]
+
+    order = run_queued(SeparationScheduler(CpuAllocator(1)), jobs)
+
+    # Arrival order would run b0 last; fair queuing serves it right after a's first job
+    assert order == ["a0", "b0", "a1", "a2", "a3"]
+
+
+def test_shorter_jobs_go_first_until_a_long_one_has_aged(clock):
+    jobs = [("long", "ip:l", 300.0), ("short1", "ip:s1", 20.0), ("short2", "ip:s2", 20.0)]
+
+    assert run_queued(SeparationScheduler(CpuAllocator(1)), jobs) == ["short1", "short2", "long"]
+    # Queued 290s before the short ones arrive: its finish less aging (300 - 290) is now the earliest
+    aged = run_queued(SeparationScheduler(CpuAllocator(1)), jobs, clock, waits={"long": 290.0})
+    assert aged == ["long", "short1", "short2"]
+
+
+def test_cancelled_waiter_hands_an_issued_grant_on(clock):
+    cpus = CpuAllocator(1)
+    scheduler = SeparationScheduler(cpus)
+
+    async def scenario():
+        order = []
+        holder = scheduler.slot("holder")
+        await holder.__aenter__()
+        first = asyncio.ensure_future(job(scheduler, order, "first", "ip:a", 10.0))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(job(scheduler, order, "second", "ip:b", 10.0))
+        await asyncio.sleep(0)
+        # Releasing grants the slot to "first", which is cancelled before it resumes to take it
+        await holder.__aexit__(None, None, None)
+        assert scheduler.running == 1 and [w.task_id for w in scheduler.waiters] == ["second"]
+        first.cancel()
+        results = await asyncio.wait_for(asyncio.gather(first, second, return_exceptions=True), 5.0)
+        assert isinstance(results[0], asyncio.CancelledError)
+        return order
+
+    assert asyncio.run(scenario()) == ["second"]
+    assert scheduler.running == 0 and not scheduler.waiters
+    assert cpus.busy_count() == 0 and cpus.free_count() == 1
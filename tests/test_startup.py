@@ -0,0 +1,24 @@
+import startup
+from startup import StartupState, run_warmup
+
+
+def test_failing_warmup_reports_degraded_but_stays_not_ready(monkeypatch):
+    state = StartupState()
+    delays = []
+    seen = []
+
+    def flaky_warm_up(*args):
+        seen.append((state.ready, state.degraded))
+        if len(seen) <= 6:
+            raise RuntimeError("model load failed")
+
+    monkeypatch.setattr(startup, "warm_up_once", flaky_warm_up)
+    monkeypatch.setattr(startup.time, "sleep", delays.append)
+    run_warmup(state, "model", "spleeter:2stems", attempts=4, backoff_seconds=5.0, max_backoff_seconds=30.0)
+
+    # Degraded from the fourth failure on, never ready until a warm-up succeeds
+    assert seen == [(False, False)] * 4 + [(False, True)] * 3
+    assert delays == [5.0, 10.0, 20.0, 30.0, 30.0, 30.0]
+    report = state.to_dict()
+    assert report["ready"] and not report["degraded"]
+    assert report["warmup_attempts"] == 7 and report["warmup_error"] is None
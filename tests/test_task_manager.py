@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+import cpu_allocation
+from client_limits import ClientRegistry
+import task_manager as task_manager_module
+from cpu_allocation import CpuAllocator
+from file_handlers import SavedUpload
+from scheduler import SeparationScheduler
+from task_manager import Task, TaskStatus, task_manager
+from work_queue import WorkQueue
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    monkeypatch.setattr(cpu_allocation, "get_affinity_cpus", lambda: list(range(2)))
+    monkeypatch.setattr(cpu_allocation, "read_cgroup_cpu_quota", lambda: None)
+    monkeypatch.setattr(task_manager, "scheduler", SeparationScheduler(CpuAllocator(1)))
+    monkeypatch.setattr(task_manager, "work_clocks", {})
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """An empty TaskManager whose jobs are recorded instead of run; returns (dispatched, cleaned up)."""
+    for name, value in [("tasks", {}), ("inflight", {}), ("inflight_keys", {}), ("followers", {}),
+                        ("task_clients", {}), ("estimates", {}), ("active_tasks", 0), ("max_queued_tasks", 1),
+                        ("profile_sample_rate", 0.0)]:
+        monkeypatch.setattr(task_manager, name, value)
+    dispatched, cleaned = [], []
+
+    async def process(task_id, *args):
+        dispatched.append(task_id)
+
+    monkeypatch.setattr(task_manager, "_process_task_with_input", process)
+    monkeypatch.setattr(task_manager_module, "client_registry", ClientRegistry(0, 0, 0, {}, 0))
+    monkeypatch.setattr(task_manager_module, "cleanup_file", cleaned.append)
+    monkeypatch.setattr(task_manager_module.job_journal, "record", lambda *args, **fields: None)
+    return dispatched, cleaned
+
+
+def upload(name, sha256):
+    return SavedUpload(f"/uploads/{name}.mp3", name, f"{name}.mp3", 3.0, sha256)
+
+
+def submit(saved):
+    task_id = task_manager.create_task_immediate()
+    assert task_manager.submit_task_with_input(task_id, saved, "", 50, 600, "/uploads")
+    return task_id
+
+
+async def hold_slot(task_id, seconds):
+    async with task_manager._slot(task_id):
+        await asyncio.sleep(seconds)
+
+
+def test_timeout_does_not_count_the_wait_for_a_slot(one_slot):
+    async def scenario():
+        holder = asyncio.ensure_future(hold_slot("holder", 0.4))
+        await asyncio.sleep(0)
+        # 0.4s queued behind the holder, then 0.1s of work: inside a 0.25s timeout
+        await task_manager._run_timed("queued", hold_slot("queued", 0.1), 0.25)
+        await holder
+
+    asyncio.run(scenario())
+    assert task_manager.work_clocks == {}
+
+
+def test_timeout_still_bounds_the_work_itself(one_slot):
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await task_manager._run_timed("slow", hold_slot("slow", 1.0), 0.1)
+        # The cancelled job gave its slot back
+        await asyncio.wait_for(hold_slot("next", 0), 1.0)
+
+    asyncio.run(scenario())
+
+
+def test_remote_workers_stage_timings_calibrate_the_cost_model(monkeypatch, tmp_path):
+    queue = WorkQueue(lease_seconds=30, max_deliveries=3)
+    monkeypatch.setattr(task_manager, "work_queue", queue)
+    monkeypatch.setattr(task_manager, "estimates", {})
+
+    async def probe_duration(path):
+        return 120.0
+
+    observed, journal = [], []
+    monkeypatch.setattr(task_manager_module, "probe_duration", probe_duration)
+    monkeypatch.setattr(task_manager.cost_model, "observe", lambda *args: observed.append(args))
+    monkeypatch.setattr(task_manager_module.job_journal, "record",
+                        lambda task_id, event, **fields: journal.append((event, fields)))
+    task = Task("remote", TaskStatus.PROCESSING, 0, "", 0.0, 0.0, input_path=str(tmp_path / "in.mp3"),
+                basename="song", quality_tier="full")
+
+    async def scenario():
+        run = asyncio.ensure_future(task_manager._run_remote_separation(
+            task, str(tmp_path), task_manager.tiers["full"], lambda stage, fraction: None))
+        lease = None
+        while not lease:
+            await asyncio.sleep(0)
+            lease = queue.lease("w")
+        queue.heartbeat("remote", lease["lease_id"], "separating", 0.5)
+        queue.complete("remote", lease["lease_id"],
+                       {"error": None, "stage_seconds": {"separate": 40.0, "encode": 5.0, "upload": 9.0}})
+        task_manager._record_costs(task, await run)
+
+    asyncio.run(scenario())
+    # The worker's timings, not the heartbeat-paced ones seen here
+    assert observed == [(120.0, {"separate": 40.0, "encode": 5.0}, "full")]
+    assert journal == [("measured", {"costs": {"audio_seconds": 120.0, "tier": "full",
+                                               "stages": {"separate": 40.0, "encode": 5.0}}})]
+
+
+def test_identical_uploads_attach_to_the_in_flight_job(pipeline):
+    dispatched, cleaned = pipeline
+    leader_id = submit(upload("first", "abc"))
+    task_manager._update_progress(leader_id, 40, "분리 중...")
+
+    # The queue has room for one job, so only an attached task can get in now
+    follower_id = submit(upload("second", "abc"))
+    other_id = task_manager.create_task_immediate()
+    assert not task_manager.submit_task_with_input(other_id, upload("third", "def"), "", 50, 600, "/uploads")
+
+    follower = task_manager.tasks[follower_id]
+    assert follower.coalesced_with == leader_id
+    assert (follower.status, follower.progress, follower.message) == (TaskStatus.PENDING, 40, "분리 중...")
+    assert task_manager.active_tasks == 1 and task_manager.followers == {leader_id: [follower_id]}
+    # The duplicate and the rejected upload are deleted; the leader's stays for its job
+    assert cleaned == ["/uploads/second.mp3", "/uploads/third.mp3"]
+    # Let the pipeline loop run what was dispatched to it
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), task_manager.loop).result(5)
+    assert dispatched == [leader_id]
+
+
+def test_finished_leader_fans_its_result_out_and_frees_the_key(pipeline):
+    dispatched, _ = pipeline
+    leader_id = submit(upload("first", "abc"))
+    follower_ids = [submit(upload(name, "abc")) for name in ("second", "third")]
+    leader = task_manager.tasks[leader_id]
+    leader.status, leader.progress, leader.message = TaskStatus.COMPLETED, 100, "완료되었습니다."
+    leader.vocal_url, leader.inst_url = "/download/first_vocals.mp3", "/download/first_inst.mp3"
+
+    task_manager._finish_task(leader)
+
+    for follower_id in follower_ids:
+        follower = task_manager.tasks[follower_id]
+        assert (follower.status, follower.progress, follower.vocal_url, follower.inst_url) == (
+            TaskStatus.COMPLETED, 100, "/download/first_vocals.mp3", "/download/first_inst.mp3")
+    assert task_manager.active_tasks == 0
+    assert task_manager.inflight == {} and task_manager.inflight_keys == {} and task_manager.followers == {}
+    # The same content submitted afterwards runs as a new job
+    again_id = submit(upload("fourth", "abc"))
+    assert task_manager.tasks[again_id].coalesced_with is None
+    assert task_manager.inflight == {"sha256:abc": again_id}
@@ -0,0 +1,38 @@
+import asyncio
+import os
+import threading
+
+import upload_sessions
+from upload_sessions import UPLOAD_SESSION_LIMIT_ERROR, UploadSessionManager
+
+
+def test_open_sessions_are_capped_per_client(tmp_path):
+    manager = UploadSessionManager(ttl_seconds=3600, max_sessions_per_client=2)
+
+    async def scenario():
+        create = lambda client_id: manager.create("song.mp3", 1024, 50, str(tmp_path), client_id=client_id)
+        # Racing creates from one client still count against its cap
+        results = await asyncio.gather(*(create("ip:a") for _ in range(3)))
+        other, error = await create("ip:b")
+        assert other and not error
+        manager.discard(results[0][0].upload_id)
+        again, error = await create("ip:a")
+        assert again and not error
+        return results
+
+    results = asyncio.run(scenario())
+    assert [error for _, error in results] == [None, None, UPLOAD_SESSION_LIMIT_ERROR]
+    assert all(os.path.getsize(s.part_path) == 1024 for s in manager.sessions.values())
+
+
+def test_part_file_is_reserved_off_the_event_loop(tmp_path, monkeypatch):
+    manager = UploadSessionManager(ttl_seconds=3600, max_sessions_per_client=0)
+    threads = []
+    reserve = upload_sessions._reserve
+    monkeypatch.setattr(upload_sessions, "_reserve",
+                        lambda path, size: (threads.append(threading.current_thread()), reserve(path, size)))
+
+    session, error = asyncio.run(manager.create("song.mp3", 4096, 50, str(tmp_path)))
+
+    assert not error and os.path.getsize(session.part_path) == 4096
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,34 @@
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import waveform_peaks
+from waveform_peaks import BASE_SAMPLES_PER_PEAK, PEAKS_FILENAME, build_peaks, write_peaks_from_stems
+
+
+def write_wav(path, waveform, sample_rate=44100):
+    pcm = np.clip(np.round(waveform * 32768.0), -32768, 32767).astype("<i2")
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(waveform.shape[1])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return pcm.astype(np.float32) / 32768.0
+
+
+def test_streamed_peaks_match_the_whole_file_build(tmp_path, monkeypatch):
+    # Small blocks and a length that is not a whole number of them exercise the seams
+    monkeypatch.setattr(waveform_peaks, "STREAM_BLOCK_FRAMES", BASE_SAMPLES_PER_PEAK * 3)
+    rng = np.random.default_rng(0)
+    frames = BASE_SAMPLES_PER_PEAK * 50 + 77
+    vocals = write_wav(tmp_path / "vocals.wav", rng.uniform(-0.5, 0.5, (frames, 2)))
+    accompaniment = write_wav(tmp_path / "accompaniment.wav", rng.uniform(-0.5, 0.5, (frames, 2)))
+
+    path = write_peaks_from_stems(str(tmp_path))
+
+    assert path == str(tmp_path / PEAKS_FILENAME)
+    expected = build_peaks({"o": vocals + accompaniment, "v": vocals, "a": accompaniment}, 44100)
+    with open(path, "rb") as f:
+        assert f.read() == expected
@@ -0,0 +1,41 @@
+import asyncio
+
+import work_queue
+from work_queue import WorkQueue
+
+
+def submit_all(queue, jobs):
+    async def submit():
+        for job_id, client_id, cost in jobs:
+            queue.submit(job_id, client_id, f"/in/{job_id}", f"/out/{job_id}", {"basename": job_id}, cost=cost)
+    asyncio.run(submit())
+
+
+def test_lease_takes_the_cheapest_job_first_and_counts_work_ahead():
+    queue = WorkQueue(lease_seconds=30, max_deliveries=3)
+    submit_all(queue, [("long", "a", 300.0), ("short", "b", 20.0), ("medium", "c", 60.0)])
+
+    assert queue.queued_work() == 380.0
+    assert queue.queued_work_ahead("short") == 0.0
+    assert queue.queued_work_ahead("long") == 80.0
+    assert queue.queued_work_ahead("missing") is None
+    assert [queue.lease("w")["job_id"] for _ in range(3)] == ["short", "medium", "long"]
+
+
+def test_waiting_ages_a_long_job_ahead(monkeypatch):
+    queue = WorkQueue(lease_seconds=30, max_deliveries=3)
+    now = [1000.0]
+    monkeypatch.setattr(work_queue.time, "monotonic", lambda: now[0])
+    submit_all(queue, [("long", "a", 300.0)])
+    now[0] += 290.0
+    submit_all(queue, [("short", "b", 20.0)])
+
+    assert queue.lease("w")["job_id"] == "long"
+
+
+def test_clients_with_fewer_leases_still_go_first():
+    queue = WorkQueue(lease_seconds=30, max_deliveries=3)
+    submit_all(queue, [("a1", "a", 10.0), ("a2", "a", 10.0), ("b1", "b", 500.0)])
+
+    assert queue.lease("w")["job_id"] == "a1"
+    assert queue.lease("w")["job_id"] == "b1"
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Any
+
+from audio_utils import cleanup_file
+from config_manager import config_manager
+from file_handlers import SavedUpload, make_upload_path
+from logger import app_logger
+
+
+# Chunk size suggested to clients and the largest chunk accepted in one PUT
+RECOMMENDED_CHUNK_SIZE = 4 * 1024 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+HASH_READ_SIZE = 1024 * 1024
+# error_message of a session refused by the per-client cap (the API answers 429)
+UPLOAD_SESSION_LIMIT_ERROR = "동시에 진행 중인 업로드가 너무 많습니다. 진행 중인 업로드를 마치거나 취소한 뒤 다시 시도해주세요."
+
+
+@dataclass
+class UploadSession:
+    """A resumable upload assembled in place from chunks written at their offsets."""
+    upload_id: str
+    filename: str
+    size: int
+    part_path: str
+    input_path: str
+    basename: str
+    created_at: float
+    updated_at: float
+    # Counted against this client's cap on open sessions
+    client_id: str = "anonymous"
+    # Merged, sorted (start, end) byte ranges already written
+    received: List[Tuple[int, int]] = field(default_factory=list)
+    # The SHA-256 covers the contiguous prefix [0, hashed_bytes)
+    hashed_bytes: int = 0
+    digest: Any = field(default_factory=hashlib.sha256, repr=False)
+    hash_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+    finalizing: bool = False
+
+    @property
+    def received_bytes(self) -> int:
+        return sum(end - start for start, end in self.received)
+
+    @property
+    def contiguous_bytes(self) -> int:
+        """Length of the fully received prefix of the file."""
+        if self.received and self.received[0][0] == 0:
+            return self.received[0][1]
+        return 0
+
+    @property
+    def complete(self) -> bool:
+        return self.contiguous_bytes >= self.size
+
+    def mark_received(self, start: int, end: int) -> None:
+        ranges = sorted(self.received + [(start, end)])
+        merged: List[Tuple[int, int]] = []
+        for range_start, range_end in ranges:
+            if merged and range_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+            else:
+                merged.append((range_start, range_end))
+        self.received = merged
+
+    def missing_ranges(self) -> List[Tuple[int, int]]:
+        """Byte ranges the client still has to send."""
+        missing, position = [], 0
+        for start, end in self.received:
+            if start > position:
+                missing.append((position, start))
+            position = end
+        if position < self.size:
+            missing.append((position, self.size))
+        return missing
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "received_bytes": self.received_bytes,
+            "missing_ranges": [list(r) for r in self.missing_ranges()],
+            "complete": self.complete,
+            "recommended_chunk_size": RECOMMENDED_CHUNK_SIZE,
+            "max_chunk_size": MAX_CHUNK_SIZE
+        }
+
+
+def _write_at(path: str, offset: int, data: bytes) -> None:
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    finally:
+        os.close(fd)
+
+
+def _reserve(path: str, size: int) -> None:
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+
+def _read_at(path: str, offset: int, length: int) -> bytes:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.pread(fd, length, offset)
+    finally:
+        os.close(fd)
+
+
+class UploadSessionManager:
+    """
+    Resumable, chunked uploads: create a session, PUT chunks at any offset
+    (in parallel if the client wants), then finalize into a SavedUpload.
+    All methods run on the web server's event loop; file I/O goes to the executor.
+    """
+
+    def __init__(self, ttl_seconds: int, max_sessions_per_client: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions_per_client = max_sessions_per_client
+        self.sessions: Dict[str, UploadSession] = {}
+
+    async def create(self, filename: str, size: int, max_size_mb: int, upload_dir: str,
+                     client_id: str = "anonymous") -> Tuple[Optional[UploadSession], Optional[str]]:
+        """
+        Open a session and reserve the (sparse) part file for it. A client may
+        hold max_sessions_per_client unfinished sessions (UPLOAD_SESSION_LIMIT_ERROR).
+        Returns: (session, error_message)
+        """
+        if size <= 0:
+            return None, "빈 파일은 업로드할 수 없습니다."
+        if size > max_size_mb * 1024 * 1024:
+            app_logger.warning("File size too large: %.2fMB > %sMB", size / (1024 * 1024), max_size_mb)
+            return None, f"파일 크기가 너무 큽니다. 최대 {max_size_mb}MB까지 허용됩니다."
+
+        self.cleanup_expired()
+        open_sessions = sum(1 for s in self.sessions.values() if s.client_id == client_id and not s.finalizing)
+        if self.max_sessions_per_client and open_sessions >= self.max_sessions_per_client:
+            app_logger.warning("Client %s already has %s open upload sessions", client_id, open_sessions)
+            return None, UPLOAD_SESSION_LIMIT_ERROR
+
+        input_path, basename = make_upload_path(filename, upload_dir)
+        now = time.time()
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex, filename=filename, size=size, part_path=f"{input_path}.part",
+            input_path=input_path, basename=basename, created_at=now, updated_at=now, client_id=client_id
+        )
+        # Registered before the file exists, so concurrent creates by one client count against its cap
+        self.sessions[session.upload_id] = session
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _reserve, session.part_path, size)
+        except OSError as e:
+            self.sessions.pop(session.upload_id, None)
+            app_logger.error("Failed to create upload session file: %s", e)
+            return None, f"파일 처리 중 오류가 발생했습니다: {e}"
+        app_logger.info("Upload session %s created for %s (%.2fMB)", session.upload_id, filename, size / (1024 * 1024))
+        return session, None
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        return self.sessions.get(upload_id)
+
+    async def write_chunk(self, session: UploadSession, offset: int, data: bytes) -> Optional[str]:
+        """
+        Write one chunk at its offset and extend the running hash over any newly
+        contiguous prefix. Re-sending a chunk (e.g. after a dropped connection) is harmless.
+        Returns: error_message, None on success
+        """
+        if session.finalizing:
+            return "이미 완료 처리 중인 업로드입니다."
+        if not data:
+            return "빈 청크입니다."
+        if offset < 0 or offset + len(data) > session.size:
+            return f"청크 범위가 파일 크기({session.size} bytes)를 벗어났습니다."
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, _write_at, session.part_path, offset, data)
+            session.mark_received(offset, offset + len(data))
+            session.updated_at = time.time()
+            await self._advance_hash(session, offset, data)
+        except OSError as e:
+            # The session was finalized or discarded while this chunk was in flight
+            app_logger.warning("Upload session %s chunk write failed: %s", session.upload_id, e)
+            return "업로드 세션이 더 이상 유효하지 않습니다."
+        return None
+
+    async def _advance_hash(self, session: UploadSession, offset: int, data: bytes) -> None:
+        async with session.hash_lock:
+            # In-order chunks are hashed straight from memory
+            if offset <= session.hashed_bytes < offset + len(data):
+                session.digest.update(data[session.hashed_bytes - offset:])
+                session.hashed_bytes = offset + len(data)
+
+            # Chunks that arrived early are read back once the gap before them is filled
+            loop = asyncio.get_running_loop()
+            while session.hashed_bytes < session.contiguous_bytes:
+                length = min(HASH_READ_SIZE, session.contiguous_bytes - session.hashed_bytes)
+                block = await loop.run_in_executor(None, _read_at, session.part_path, session.hashed_bytes, length)
+                if not block:
+                    break
+                session.digest.update(block)
+                session.hashed_bytes += len(block)
+
+    async def finalize(self, session: UploadSession, expected_sha256: Optional[str] = None) -> Tuple[Optional[SavedUpload], Optional[str]]:
+        """
+        Verify the upload is complete (and matches the client's checksum, if given)
+        and move it into place for the task pipeline.
+        Returns: (saved_upload, error_message)
+        """
+        if session.finalizing:
+            return None, "이미 완료 처리 중인 업로드입니다."
+        if not session.complete:
+            return None, f"업로드가 완료되지 않았습니다. ({session.received_bytes}/{session.size} bytes)"
+
+        session.finalizing = True
+        try:
+            # Waits for in-flight hashing and catches up on anything not yet hashed
+            await self._advance_hash(session, 0, b"")
+            sha256 = session.digest.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != sha256:
+                app_logger.warning("Upload session %s checksum mismatch", session.upload_id)
+                self.discard(session.upload_id)
+                return None, "업로드된 파일의 체크섬이 일치하지 않습니다. 다시 업로드해주세요."
+            os.replace(session.part_path, session.input_path)
+        except OSError as e:
+            app_logger.error("Upload session %s finalize failed: %s", session.upload_id, e)
+            self.discard(session.upload_id)
+            return None, f"파일 처리 중 오류가 발생했습니다: {e}"
+
+        self.sessions.pop(session.upload_id, None)
+        size_mb = session.size / (1024 * 1024)
+        app_logger.info("File uploaded: %s (%.2fMB, %s)", session.filename, size_mb, session.upload_id)
+        return SavedUpload(session.input_path, session.basename, session.filename, size_mb, sha256), None
+
+    def discard(self, upload_id: str) -> bool:
+        """Drop a session and its partial file."""
+        session = self.sessions.pop(upload_id, None)
+        if not session:
+            return False
+        cleanup_file(session.part_path)
+        return True
+
+    def cleanup_expired(self) -> int:
+        """Garbage-collect sessions that have not received a chunk within the TTL."""
+        cutoff = time.time() - self.ttl_seconds
+        expired = [upload_id for upload_id, session in self.sessions.items()
+                   if session.updated_at < cutoff and not session.finalizing]
+        for upload_id in expired:
+            self.discard(upload_id)
+            app_logger.info("Expired upload session %s", upload_id)
+        return len(expired)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "reserved_bytes": sum(s.size for s in self.sessions.values()),
+            "received_bytes": sum(s.received_bytes for s in self.sessions.values())
+        }
+
+
+# Global upload session manager
+upload_sessions = UploadSessionManager(config_manager.get_upload_session_ttl_seconds(),
+                                       config_manager.get_max_upload_sessions_per_client())
@@ -0,0 +1,183 @@
+"""
+Multi-resolution min/max waveform peaks for the original and each stem.
+
+All tracks are downmixed and reduced together, block by block; each
+coarser level merges PEAKS_LEVEL_FACTOR peaks of the level below. The result
+is one small binary file per job:
+
+    header   "RVPK" | version u8 | pad 3 | sample_rate u32 | samples u64 | entries u16
+    entries  track u8 (ASCII o/v/a) | samples_per_peak u32 | peaks u32 | offset u64
+    data     int8 (min, max) pairs, scaled to +-127
+
+served per track and level by /peaks, so the player draws from a few KB.
+"""
+import os
+import struct
+import wave
+from typing import Dict, List, Optional, Tuple
+
+PEAKS_FILENAME = "waveform.peaks"
+PEAKS_MAGIC = b"RVPK"
+PEAKS_VERSION = 1
+BASE_SAMPLES_PER_PEAK = 256
+PEAKS_LEVEL_FACTOR = 4
+# Levels stop once they get this coarse
+MIN_LEVEL_PEAKS = 256
+# Frames read from the stem WAVs at a time (a whole number of base peaks)
+STREAM_BLOCK_FRAMES = BASE_SAMPLES_PER_PEAK * 1024
+
+HEADER = struct.Struct("<4sB3xIQH")
+ENTRY = struct.Struct("<BIIQ")
+LEVEL_HEADER = struct.Struct("<4sBIII")
+
+# Track codes, as in the /download t= parameter
+TRACK_CODES = {"original": "o", "vocals": "v", "accompaniment": "a"}
+
+
+def build_peaks(tracks: Dict[str, "object"], sample_rate: int) -> bytes:
+    """
+    Build the peaks file for {track code: float (samples, channels) array};
+    every track must have the same length.
+    """
+    import numpy as np
+
+    codes = list(tracks)
+    length = min(len(waveform) for waveform in tracks.values())
+    lows, highs = base_peaks([np.asarray(tracks[code][:length], dtype=np.float32) for code in codes])
+    return encode_peaks(codes, lows, highs, length, sample_rate)
+
+
+def base_peaks(waveforms: List["object"]) -> Tuple["object", "object"]:
+    """
+    Min and max of every BASE_SAMPLES_PER_PEAK samples of each equally long
+    float (samples, channels) or (samples,) waveform, mixed to mono and padded
+    with silence to whole blocks. Returns: (lows, highs), each (tracks, blocks)
+    """
+    import numpy as np
+
+    length = len(waveforms[0])
+    blocks = max(1, -(-length // BASE_SAMPLES_PER_PEAK))
+    mono = np.zeros((len(waveforms), blocks * BASE_SAMPLES_PER_PEAK), dtype=np.float32)
+    for index, waveform in enumerate(waveforms):
+        mono[index, :length] = waveform.mean(axis=1) if waveform.ndim == 2 else waveform
+    blocked = mono.reshape(len(waveforms), blocks, BASE_SAMPLES_PER_PEAK)
+    return blocked.min(axis=2), blocked.max(axis=2)
+
+
+def encode_peaks(codes: List[str], lows: "object", highs: "object", length: int, sample_rate: int) -> bytes:
+    """Build the coarser levels over the base peaks of the tracks and pack the peaks file."""
+    import numpy as np
+
+    levels: List[Tuple[int, "object", "object"]] = []
+    samples_per_peak = BASE_SAMPLES_PER_PEAK
+    while True:
+        levels.append((samples_per_peak, lows, highs))
+        count = lows.shape[1]
+        if count <= MIN_LEVEL_PEAKS:
+            break
+        merged = -(-count // PEAKS_LEVEL_FACTOR)
+        pad = merged * PEAKS_LEVEL_FACTOR - count
+        # Edge padding keeps the last partial group's min/max unchanged
+        lows = np.pad(lows, ((0, 0), (0, pad)), mode="edge").reshape(len(codes), merged, PEAKS_LEVEL_FACTOR).min(axis=2)
+        highs = np.pad(highs, ((0, 0), (0, pad)), mode="edge").reshape(len(codes), merged, PEAKS_LEVEL_FACTOR).max(axis=2)
+        samples_per_peak *= PEAKS_LEVEL_FACTOR
+
+    entries, chunks = [], []
+    offset = HEADER.size + ENTRY.size * len(codes) * len(levels)
+    for index, code in enumerate(codes):
+        for samples_per_peak, level_lows, level_highs in levels:
+            pairs = np.empty((level_lows.shape[1], 2), dtype=np.float32)
+            pairs[:, 0], pairs[:, 1] = level_lows[index], level_highs[index]
+            data = np.clip(np.round(pairs * 127.0), -127, 127).astype(np.int8).tobytes()
+            entries.append(ENTRY.pack(ord(code), samples_per_peak, len(pairs), offset))
+            chunks.append(data)
+            offset += len(data)
+    header = HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, sample_rate, length, len(entries))
+    return header + b"".join(entries) + b"".join(chunks)
+
+
+def write_peaks(path: str, tracks: Dict[str, "object"], sample_rate: int) -> None:
+    """Build and atomically write a peaks file."""
+    _write_atomically(path, build_peaks(tracks, sample_rate))
+
+
+def _write_atomically(path: str, data: bytes) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _open_pcm16(path: str) -> wave.Wave_read:
+    wav_file = wave.open(path, "rb")
+    if wav_file.getsampwidth() != 2:
+        wav_file.close()
+        raise ValueError(f"{path}: only 16-bit PCM is supported")
+    return wav_file
+
+
+def _read_block(wav_file: wave.Wave_read, frames: int) -> "object":
+    """Up to `frames` frames of a 16-bit PCM WAV as a float (frames, channels) array."""
+    import numpy as np
+
+    pcm = np.frombuffer(wav_file.readframes(frames), dtype="<i2")
+    return pcm.reshape(-1, wav_file.getnchannels()).astype(np.float32) / 32768.0
+
+
+def write_peaks_from_stems(result_dir: str) -> str:
+    """
+    Build the peaks file from the stem WAVs in result_dir, for separators that
+    only leave files behind. The original is taken as the sum of the stems,
+    which the separation masks reconstruct up to rounding. The WAVs are read
+    STREAM_BLOCK_FRAMES at a time, so memory stays flat whatever the length.
+    Returns: path of the peaks file
+    """
+    import numpy as np
+
+    vocals = _open_pcm16(os.path.join(result_dir, "vocals.wav"))
+    try:
+        accompaniment = _open_pcm16(os.path.join(result_dir, "accompaniment.wav"))
+        try:
+            sample_rate = vocals.getframerate()
+            length = min(vocals.getnframes(), accompaniment.getnframes())
+            lows, highs = [], []
+            for start in range(0, max(length, 1), STREAM_BLOCK_FRAMES):
+                frames = min(STREAM_BLOCK_FRAMES, length - start)
+                vocal_block = _read_block(vocals, frames)
+                accompaniment_block = _read_block(accompaniment, frames)
+                block_lows, block_highs = base_peaks([vocal_block + accompaniment_block, vocal_block, accompaniment_block])
+                lows.append(block_lows)
+                highs.append(block_highs)
+        finally:
+            accompaniment.close()
+    finally:
+        vocals.close()
+    path = os.path.join(result_dir, PEAKS_FILENAME)
+    _write_atomically(path, encode_peaks(["o", "v", "a"], np.concatenate(lows, axis=1),
+                                         np.concatenate(highs, axis=1), length, sample_rate))
+    return path
+
+
+def read_peaks_level(path: str, track: str, min_peaks: int) -> Optional[bytes]:
+    """
+    Get one track at the coarsest level that still has min_peaks peaks (or the
+    finest level if none has), as a standalone blob:
+        "RVPL" | version u8 | sample_rate u32 | samples_per_peak u32 | peaks u32 | int8 (min, max) pairs
+    Returns: None if the file has no such track
+    """
+    with open(path, "rb") as f:
+        magic, version, sample_rate, _, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+            raise ValueError(f"{path}: not a peaks file")
+        entries = [ENTRY.unpack(f.read(ENTRY.size)) for _ in range(count)]
+        levels = sorted((e for e in entries if e[0] == ord(track)), key=lambda e: e[1])
+        if not levels:
+            return None
+        chosen = levels[0]
+        for entry in levels:
+            if entry[2] >= min_peaks:
+                chosen = entry
+        _, samples_per_peak, peaks, offset = chosen
+        f.seek(offset)
+        data = f.read(peaks * 2)
+    return LEVEL_HEADER.pack(b"RVPL", PEAKS_VERSION, sample_rate, samples_per_peak, peaks) + data
@@ -0,0 +1,221 @@
+import asyncio
+import itertools
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Any
+
+from logger import app_logger
+from scheduler import AGING_RATE
+
+
+# error_message of a job no worker finished within its deliveries
+WORKER_LOST_ERROR = "분리 워커가 응답하지 않아 작업을 완료하지 못했습니다. 다시 시도해주세요."
+# Workers not heard from for this many lease periods are dropped from the stats
+WORKER_IDLE_LEASES = 3
+
+
+@dataclass
+class WorkItem:
+    """A separation job waiting for, or leased to, a remote worker."""
+    job_id: str
+    client_id: str
+    input_path: str
+    result_dir: str
+    # Sent to the worker with the lease: basename, model, backend, silence threshold
+    params: Dict[str, Any]
+    sequence: int
+    future: asyncio.Future = field(repr=False)
+    loop: asyncio.AbstractEventLoop = field(repr=False)
+    on_progress: Optional[Callable[[str, float], None]] = field(default=None, repr=False)
+    # Predicted separation seconds, and when the job was first queued (monotonic) for aging
+    cost: float = 1.0
+    enqueued_at: float = 0.0
+    deliveries: int = 0
+    lease_id: Optional[str] = None
+    worker_id: Optional[str] = None
+    lease_expires: float = 0.0
+
+    def to_lease(self, lease_seconds: float) -> Dict[str, Any]:
+        return {"job_id": self.job_id, "lease_id": self.lease_id, "lease_seconds": lease_seconds,
+                "delivery": self.deliveries, **self.params}
+
+
+class WorkQueue:
+    """
+    Separation jobs handed out to pull-based workers under expiring leases.
+    A worker leases a job, renews the lease with heartbeats while it works and
+    completes it with the lease ID; a lease that expires is re-delivered to the
+    next worker, up to max_deliveries times. Completions and heartbeats from a
+    superseded lease are refused, so a worker that stalled cannot overwrite the
+    result of the one that took over.
+
+    Pending jobs go to the client with the fewest jobs leased first, then by
+    predicted cost, shortest first. As in the local scheduler, every second a
+    job waits takes AGING_RATE off its cost, so a long track passed over by
+    short ones still gets its turn. Request handlers and the pipeline loop both call in, so
+    every method locks; job futures are resolved on the loop that awaits them.
+    """
+
+    def __init__(self, lease_seconds: float, max_deliveries: int):
+        self.lease_seconds = lease_seconds
+        self.max_deliveries = max(1, max_deliveries)
+        self.lock = threading.Lock()
+        self.pending: List[WorkItem] = []
+        self.leased: Dict[str, WorkItem] = {}
+        self.workers: Dict[str, Dict[str, Any]] = {}
+        self.sequence = itertools.count()
+        self.completed = 0
+        self.expired_leases = 0
+        self.redeliveries = 0
+
+    def submit(self, job_id: str, client_id: str, input_path: str, result_dir: str, params: Dict[str, Any],
+               on_progress: Optional[Callable[[str, float], None]] = None, cost: float = 1.0) -> asyncio.Future:
+        """
+        Queue a job with its predicted separation seconds; the returned future
+        (on the calling loop) resolves to the worker's completion report.
+        """
+        loop = asyncio.get_running_loop()
+        item = WorkItem(job_id, client_id, input_path, result_dir, params, next(self.sequence),
+                        loop.create_future(), loop, on_progress, cost, time.monotonic())
+        with self.lock:
+            self.pending.append(item)
+        app_logger.info("Queued job %s for remote separation (%s pending)", job_id, len(self.pending))
+        return item.future
+
+    def discard(self, job_id: str) -> None:
+        """Forget a job whose task gave up on it (timeout or shutdown); its lease stops renewing."""
+        with self.lock:
+            self.pending = [item for item in self.pending if item.job_id != job_id]
+            self.leased.pop(job_id, None)
+
+    def _seen(self, worker_id: str) -> Dict[str, Any]:
+        worker = self.workers.setdefault(worker_id, {"jobs": 0})
+        worker["last_seen"] = time.time()
+        return worker
+
+    def _lease_order(self) -> List[WorkItem]:
+        """Pending jobs in the order they would be leased now; call with the lock held."""
+        now = time.monotonic()
+        leased_by_client: Dict[str, int] = {}
+        for item in self.leased.values():
+            leased_by_client[item.client_id] = leased_by_client.get(item.client_id, 0) + 1
+        return sorted(self.pending, key=lambda i: (leased_by_client.get(i.client_id, 0),
+                                                   i.cost - AGING_RATE * (now - i.enqueued_at), i.sequence))
+
+    def queued_work(self) -> float:
+        """Predicted separation seconds of every pending job."""
+        with self.lock:
+            return sum(item.cost for item in self.pending)
+
+    def queued_work_ahead(self, job_id: str) -> Optional[float]:
+        """Predicted separation seconds of the pending jobs leased before this one; None if it is not pending."""
+        with self.lock:
+            ahead = 0.0
+            for item in self._lease_order():
+                if item.job_id == job_id:
+                    return ahead
+                ahead += item.cost
+        return None
+
+    def has_pending(self) -> bool:
+        with self.lock:
+            return bool(self.pending)
+
+    def leased_count(self) -> int:
+        with self.lock:
+            return len(self.leased)
+
+    def lease(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Lease the next pending job to a worker, None if there is nothing to do."""
+        self.reap()
+        with self.lock:
+            self._seen(worker_id)
+            if not self.pending:
+                return None
+            item = self._lease_order()[0]
+            self.pending.remove(item)
+            item.deliveries += 1
+            item.lease_id = uuid.uuid4().hex
+            item.worker_id = worker_id
+            item.lease_expires = time.monotonic() + self.lease_seconds
+            self.leased[item.job_id] = item
+            lease = item.to_lease(self.lease_seconds)
+        app_logger.info("Leased job %s to worker %s (delivery %s)", item.job_id, worker_id, item.deliveries)
+        return lease
+
+    def get_leased(self, job_id: str, lease_id: str) -> Optional[WorkItem]:
+        """The job if lease_id still holds it."""
+        with self.lock:
+            item = self.leased.get(job_id)
+            return item if item and item.lease_id == lease_id else None
+
+    def heartbeat(self, job_id: str, lease_id: str, stage: Optional[str] = None, fraction: Optional[float] = None) -> bool:
+        """Renew a lease and pass on the worker's progress; False if the lease is gone."""
+        with self.lock:
+            item = self.leased.get(job_id)
+            if not item or item.lease_id != lease_id:
+                return False
+            item.lease_expires = time.monotonic() + self.lease_seconds
+            self._seen(item.worker_id)
+        if stage and fraction is not None and item.on_progress:
+            item.on_progress(stage, fraction)
+        return True
+
+    def complete(self, job_id: str, lease_id: str, report: Dict[str, Any]) -> bool:
+        """Finish a leased job with the worker's report; False if the lease is gone."""
+        with self.lock:
+            item = self.leased.get(job_id)
+            if not item or item.lease_id != lease_id:
+                return False
+            del self.leased[job_id]
+            self._seen(item.worker_id)["jobs"] += 1
+            self.completed += 1
+        self._resolve(item, report)
+        app_logger.info("Worker %s completed job %s", item.worker_id, job_id)
+        return True
+
+    @staticmethod
+    def _resolve(item: WorkItem, report: Dict[str, Any]) -> None:
+        def resolve():
+            if not item.future.done():
+                item.future.set_result(report)
+        item.loop.call_soon_threadsafe(resolve)
+
+    def reap(self) -> None:
+        """Re-deliver jobs whose lease expired, failing those out of deliveries."""
+        now = time.monotonic()
+        failed: List[WorkItem] = []
+        with self.lock:
+            for item in [i for i in self.leased.values() if i.lease_expires < now]:
+                del self.leased[item.job_id]
+                self.expired_leases += 1
+                app_logger.warning("Lease of job %s by worker %s expired (delivery %s)",
+                                   item.job_id, item.worker_id, item.deliveries)
+                if item.deliveries >= self.max_deliveries:
+                    failed.append(item)
+                else:
+                    self.redeliveries += 1
+                    item.lease_id = None
+                    item.worker_id = None
+                    self.pending.append(item)
+            idle_cutoff = time.time() - self.lease_seconds * WORKER_IDLE_LEASES
+            self.workers = {w: s for w, s in self.workers.items() if s["last_seen"] >= idle_cutoff}
+        for item in failed:
+            self._resolve(item, {"error": WORKER_LOST_ERROR})
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            now = time.time()
+            return {
+                "pending": len(self.pending),
+                "leased": {job_id: {"worker": item.worker_id, "delivery": item.deliveries}
+                           for job_id, item in self.leased.items()},
+                "workers": {worker_id: {"jobs": stats["jobs"], "last_seen_seconds": round(now - stats["last_seen"], 1)}
+                            for worker_id, stats in self.workers.items()},
+                "completed": self.completed,
+                "expired_leases": self.expired_leases,
+                "redeliveries": self.redeliveries,
+                "lease_seconds": self.lease_seconds
+            }
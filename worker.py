@@ -0,0 +1,317 @@
+"""
+Standalone separation worker for an API node running with REMOTE_SEPARATION=true.
+
+    python worker.py --server http://api-host:8000 --token SECRET --concurrency 2
+    python worker.py --server unix:///run/removevocal.sock
+
+Leases jobs from the API node, downloads their input, runs the separation and
+MP3 encoding locally and uploads the stems and waveform peaks. Heartbeats keep
+the lease alive; if the worker dies, the lease expires and the API node hands
+the job to another worker. Several workers can run on one machine or many.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import urllib.parse
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple, Any
+
+from config_manager import config_manager
+from cpu_allocation import CpuAllocator
+from file_handlers import process_audio_separation
+from inference_backend import resolve_backend
+from logger import app_logger
+from memory_budget import MemoryBudget, MemoryReservation
+from scheduler import SeparationScheduler
+from waveform_peaks import PEAKS_FILENAME
+
+
+# How long a lease request waits on the API node for a job to arrive
+LEASE_WAIT_SECONDS = 10.0
+# Pause after the API node could not be reached
+RETRY_SECONDS = 5.0
+# Block size for streaming inputs and stems to and from disk
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+
+
+class LeaseLost(Exception):
+    """The API node gave the job to another worker or dropped it."""
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP over a Unix domain socket (uvicorn --uds)."""
+
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class HttpTransport:
+    """Requests to the API node over http(s)://host:port or unix:///path/to.sock."""
+
+    def __init__(self, server: str, token: Optional[str] = None, timeout: float = 120.0):
+        parsed = urllib.parse.urlsplit(server)
+        if parsed.scheme not in ("http", "https", "unix"):
+            raise ValueError(f"Unsupported server URL: {server}")
+        self.parsed = parsed
+        self.base_path = "" if parsed.scheme == "unix" else parsed.path.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self.parsed.scheme == "unix":
+            return UnixHTTPConnection(self.parsed.path, self.timeout)
+        if self.parsed.scheme == "https":
+            return http.client.HTTPSConnection(self.parsed.netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self.parsed.netloc, timeout=self.timeout)
+
+    def _request(self, method: str, path: str, body: bytes, headers: Dict[str, str],
+                 body_file: Optional[str], response_file: Optional[str]) -> Tuple[int, Dict[str, str], bytes]:
+        connection = self._connection()
+        connection.blocksize = TRANSFER_CHUNK_SIZE
+        try:
+            if body_file:
+                with open(body_file, "rb") as f:
+                    headers["Content-Length"] = str(os.fstat(f.fileno()).st_size)
+                    connection.request(method, self.base_path + path, body=f, headers=headers)
+            else:
+                connection.request(method, self.base_path + path, body=body, headers=headers)
+            response = connection.getresponse()
+            if response_file and response.status == 200:
+                with open(response_file, "wb") as f:
+                    shutil.copyfileobj(response, f, TRANSFER_CHUNK_SIZE)
+                return response.status, dict(response.getheaders()), b""
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            connection.close()
+
+    async def request(self, method: str, path: str, body: bytes = b"",
+                      headers: Optional[Dict[str, str]] = None, body_file: Optional[str] = None,
+                      response_file: Optional[str] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        One request; body_file streams the body from a file, and response_file
+        receives a 200 response's body instead of it being returned.
+        """
+        headers = dict(headers or {})
+        if self.token:
+            headers["X-Worker-Token"] = self.token
+        return await asyncio.to_thread(self._request, method, path, body, headers, body_file, response_file)
+
+
+class SeparationWorker:
+    """
+    Pulls separation jobs from the API node, `concurrency` at a time. Jobs run
+    through the same pipeline as on the API node, with this machine's CPU
+    slots and memory budget.
+    """
+
+    def __init__(self, transport, work_dir: str, concurrency: int = 1, worker_id: Optional[str] = None,
+                 lease_wait: float = LEASE_WAIT_SECONDS):
+        self.transport = transport
+        self.work_dir = work_dir
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_wait = lease_wait
+        self.memory_budget = MemoryBudget(config_manager.get_memory_budget_mb())
+        self.scheduler = SeparationScheduler(
+            CpuAllocator(self.concurrency, config_manager.get_cpu_pinning()), self.memory_budget
+        )
+        self.stopping = asyncio.Event()
+        self.jobs_done = 0
+
+    async def _post_json(self, path: str, payload: Dict[str, Any]) -> Tuple[int, bytes]:
+        status, _, body = await self.transport.request(
+            "POST", path, json.dumps(payload).encode(), {"content-type": "application/json"}
+        )
+        return status, body
+
+    async def run(self) -> None:
+        """Lease and process jobs until stop() is called; jobs in progress are finished first."""
+        os.makedirs(self.work_dir, exist_ok=True)
+        app_logger.info("Worker %s started - concurrency: %s", self.worker_id, self.concurrency)
+        await asyncio.gather(*(self._lease_loop() for _ in range(self.concurrency)))
+        app_logger.info("Worker %s stopped after %s jobs", self.worker_id, self.jobs_done)
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+    async def _lease_loop(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                status, body = await self._post_json("/api/worker/lease", {"worker_id": self.worker_id,
+                                                                          "wait": self.lease_wait})
+            except OSError as e:
+                app_logger.warning("Worker %s cannot reach the API node: %s", self.worker_id, e)
+                await self._pause(RETRY_SECONDS)
+                continue
+            if status == 200:
+                await self.process(json.loads(body))
+            elif status != 204:
+                app_logger.error("Worker %s lease request refused: HTTP %s %s", self.worker_id, status,
+                                 body[:200].decode("utf-8", errors="replace"))
+                await self._pause(RETRY_SECONDS)
+
+    async def _pause(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self.stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def process(self, job: Dict[str, Any]) -> None:
+        """Run one leased job, heartbeating until it is done, and report the result."""
+        job_id, lease_id = job["job_id"], job["lease_id"]
+        job_dir = os.path.join(self.work_dir, job_id)
+        progress: Dict[str, Any] = {}
+        work = asyncio.ensure_future(self._separate(job, job_dir, progress))
+        heartbeat = asyncio.ensure_future(self._heartbeat(job, progress, work))
+        try:
+            report = await work
+            status, _ = await self._post_json(f"/api/worker/jobs/{job_id}/complete", {"lease_id": lease_id, **report})
+            if status == 409:
+                raise LeaseLost()
+            if status != 200:
+                app_logger.error("Worker %s could not complete job %s: HTTP %s", self.worker_id, job_id, status)
+            self.jobs_done += 1
+        except (LeaseLost, asyncio.CancelledError):
+            # Cancelled by the heartbeat: the job now belongs to another worker
+            app_logger.warning("Worker %s lost the lease on job %s", self.worker_id, job_id)
+        except Exception as e:
+            # Not completing lets the lease expire, so another worker retries the job
+            app_logger.error("Worker %s failed job %s: %s", self.worker_id, job_id, e)
+        finally:
+            heartbeat.cancel()
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    async def _heartbeat(self, job: Dict[str, Any], progress: Dict[str, Any], work: asyncio.Future) -> None:
+        path = f"/api/worker/jobs/{job['job_id']}/heartbeat"
+        interval = max(job["lease_seconds"] / 3, 0.5)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                status, _ = await self._post_json(path, {"lease_id": job["lease_id"], **progress})
+            except OSError as e:
+                # The lease survives a missed heartbeat or two
+                app_logger.warning("Worker %s heartbeat for job %s failed: %s", self.worker_id, job["job_id"], e)
+                continue
+            if status == 409:
+                work.cancel()
+                return
+
+    async def _separate(self, job: Dict[str, Any], job_dir: str, progress: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Download the input, separate and encode it, upload the stems.
+        Returns: the completion report; a failure of the job itself is its "error"
+        """
+        job_id, lease_id, basename = job["job_id"], job["lease_id"], job["basename"]
+        query = urllib.parse.urlencode({"lease_id": lease_id})
+        os.makedirs(job_dir, exist_ok=True)
+        input_path = os.path.join(job_dir, f"{basename}{job.get('extension', '.mp3')}")
+        status, _, _ = await self.transport.request("GET", f"/api/worker/jobs/{job_id}/input?{query}",
+                                                    response_file=input_path)
+        if status == 409:
+            raise LeaseLost()
+        if status != 200:
+            raise RuntimeError(f"input download failed: HTTP {status}")
+
+        def on_progress(stage: str, fraction: float) -> None:
+            progress.update(stage=stage, fraction=fraction)
+
+        reservation = MemoryReservation(job_id)
+        silence_report: Dict[str, Any] = {}
+        # Measured like the API node does locally: holding the slot is "separate",
+        # the rest of the pipeline after it is "encode"; the API node's cost model learns from them
+        stage_seconds: Dict[str, float] = {}
+        separated_at: Optional[float] = None
+
+        @asynccontextmanager
+        async def timed_slot(duration: Optional[float], channels: Optional[int]):
+            nonlocal separated_at
+            async with self.scheduler.slot(job_id, "remote", 1.0,
+                                           self.memory_budget.size(reservation, duration, channels)) as cpu_allotment:
+                started = time.monotonic()
+                yield cpu_allotment
+            separated_at = time.monotonic()
+            stage_seconds["separate"] = separated_at - started
+
+        # The job's quality tier may name another model than this worker's default
+        model_dir = config_manager.get_model_dir(job["spleeter_model"])
+        backend = resolve_backend(job["backend"], model_dir, job["spleeter_model"],
+                                  config_manager.get_optimized_backends_enabled())
+        vocal_mp3_path, inst_mp3_path, error = await process_audio_separation(
+            input_path, basename, job_dir, job["spleeter_model"],
+            separation_slot=timed_slot,
+            on_progress=on_progress, backend=backend, model_dir=model_dir,
+            silence_threshold_db=job.get("silence_threshold_db"), on_silence_report=silence_report.update,
+            process_stats=reservation.stats, downmix=job.get("downmix", False),
+            encoder_args=job.get("encoder_args") or ()
+        )
+        if error:
+            return {"error": error}
+        if separated_at is not None:
+            stage_seconds["encode"] = time.monotonic() - separated_at
+        if reservation.stats.samples:
+            self.memory_budget.observe(reservation.channel_seconds, reservation.stats.peak_rss_bytes)
+
+        uploads = [("vocal", vocal_mp3_path), ("inst", inst_mp3_path)]
+        peaks_path = os.path.join(os.path.dirname(vocal_mp3_path), PEAKS_FILENAME)
+        if os.path.exists(peaks_path):
+            uploads.append(("peaks", peaks_path))
+        for stem, path in uploads:
+            status, _, _ = await self.transport.request(
+                "PUT", f"/api/worker/jobs/{job_id}/stems/{stem}?{query}",
+                headers={"content-type": "application/octet-stream" if stem == "peaks" else "audio/mpeg"},
+                body_file=path
+            )
+            if status == 409:
+                raise LeaseLost()
+            if status != 200:
+                raise RuntimeError(f"{stem} upload failed: HTTP {status}")
+        return {
+            "error": None,
+            "silence_report": silence_report or None,
+            "memory_report": reservation.to_dict() if reservation.stats.samples else None,
+            "stage_seconds": stage_seconds or None
+        }
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Remote separation worker")
+    parser.add_argument("--server", default=os.getenv("WORKER_SERVER", "http://127.0.0.1:8000"),
+                        help="API node as http(s)://host:port or unix:///path/to.sock")
+    parser.add_argument("--token", default=config_manager.get_worker_token(), help="shared WORKER_TOKEN")
+    parser.add_argument("--concurrency", type=int, default=config_manager.get_max_concurrent_tasks(),
+                        help="jobs separated at once")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), f"removevocal-worker-{os.getpid()}"))
+    parser.add_argument("--worker-id", default=None)
+    args = parser.parse_args(argv)
+
+    worker = SeparationWorker(HttpTransport(args.server, args.token), args.work_dir, args.concurrency, args.worker_id)
+
+    async def serve():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+    try:
+        asyncio.run(serve())
+    finally:
+        shutil.rmtree(args.work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
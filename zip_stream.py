@@ -0,0 +1,101 @@
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, List
+
+
+ZIP_CHUNK_SIZE = 256 * 1024
+# Classic (non-zip64) zip fields are 32-bit
+ZIP_MAX_SIZE = 0xFFFFFFFF
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+DATA_DESCRIPTOR = struct.Struct("<IIII")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+
+VERSION = 20
+# Bit 3: CRC follows the data in a descriptor; bit 11: names are UTF-8
+FLAGS = 0x0008 | 0x0800
+METHOD_STORED = 0
+
+
+@dataclass
+class ZipEntry:
+    """A file on disk and the name it gets inside the archive."""
+    path: str
+    arcname: str
+    size: int = 0
+    dos_time: int = 0
+    dos_date: int = 0
+
+    @classmethod
+    def from_path(cls, path: str, arcname: str) -> "ZipEntry":
+        stat = os.stat(path)
+        year, month, day, hour, minute, second = time.localtime(stat.st_mtime)[:6]
+        year = max(year, 1980)
+        return cls(
+            path=path,
+            arcname=arcname,
+            size=stat.st_size,
+            dos_time=(hour << 11) | (minute << 5) | (second // 2),
+            dos_date=((year - 1980) << 9) | (month << 5) | day
+        )
+
+
+def zip_size(entries: List[ZipEntry]) -> int:
+    """Exact byte length of the archive stream_zip() produces for these entries."""
+    total = END_OF_CENTRAL_DIR.size
+    for entry in entries:
+        name_length = len(entry.arcname.encode("utf-8"))
+        total += LOCAL_HEADER.size + name_length + entry.size + DATA_DESCRIPTOR.size
+        total += CENTRAL_HEADER.size + name_length
+    return total
+
+
+def stream_zip(entries: List[ZipEntry], chunk_size: int = ZIP_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield a stored (uncompressed) zip of the entries, reading each file once in
+    chunks. Sizes come from the entries up front, so only the CRC has to wait for
+    the data descriptor; memory use does not depend on the file sizes.
+    """
+    if len(entries) > 0xFFFF:
+        raise ValueError("too many entries for a zip archive")
+    if zip_size(entries) > ZIP_MAX_SIZE:
+        raise ValueError("archive too large without zip64")
+
+    central_directory: List[bytes] = []
+    offset = 0
+    for entry in entries:
+        name = entry.arcname.encode("utf-8")
+        header = LOCAL_HEADER.pack(
+            0x04034B50, VERSION, FLAGS, METHOD_STORED, entry.dos_time, entry.dos_date,
+            0, entry.size, entry.size, len(name), 0
+        ) + name
+        yield header
+
+        crc, remaining = 0, entry.size
+        with open(entry.path, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+                yield chunk
+        if remaining:
+            # The Content-Length already went out; a short file would corrupt the archive
+            raise IOError(f"{entry.path} shrank while being archived")
+
+        yield DATA_DESCRIPTOR.pack(0x08074B50, crc, entry.size, entry.size)
+
+        central_directory.append(CENTRAL_HEADER.pack(
+            0x02014B50, VERSION, VERSION, FLAGS, METHOD_STORED, entry.dos_time, entry.dos_date,
+            crc, entry.size, entry.size, len(name), 0, 0, 0, 0, 0, offset
+        ) + name)
+        offset += len(header) + entry.size + DATA_DESCRIPTOR.size
+
+    directory = b"".join(central_directory)
+    yield directory
+    yield END_OF_CENTRAL_DIR.pack(0x06054B50, 0, 0, len(entries), len(entries), len(directory), offset, 0)